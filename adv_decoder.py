@@ -0,0 +1,72 @@
+#dekodovani manufacturer data z reklam podle company ID (tabulka predkompilovanych struct layoutu)
+import os
+import struct
+from collections import namedtuple
+
+# Company ID, pod kterym aplikace vysila ID uzivatele (0xFFFF = testovaci/interni pouziti dle SIG)
+ATTENTID_COMPANY_ID = int(os.environ.get("ATTENTID_COMPANY_ID", "0xFFFF"), 0)
+
+
+class Layout:
+    """Precompiled layout of one company's manufacturer data."""
+
+    __slots__ = ("company_id", "unpack_from", "size", "offset", "prefix", "make")
+
+    def __init__(self, company_id, fmt, record, offset=0, prefix=b""):
+        compiled = struct.Struct(fmt)
+        self.company_id = company_id
+        self.unpack_from = compiled.unpack_from
+        self.size = offset + compiled.size
+        self.offset = offset
+        self.prefix = prefix
+        self.make = record._make
+
+
+# company ID -> Layout; callbacks may test membership before calling decode()
+LAYOUTS = {}
+
+
+def register(company_id, fmt, name, fields, offset=0, prefix=b""):
+    """Register a layout; returns the namedtuple class of its decoded records.
+
+    ``fmt`` is a struct format applied at ``offset``; ``prefix`` (bytes at
+    the start of the data) must match, which lets one company ID carry
+    several frame types. Decoded records are ``(company_id, *fields)``.
+    """
+    record = namedtuple(name, ("company_id",) + tuple(fields))
+    LAYOUTS[company_id] = Layout(company_id, fmt, record, offset, prefix)
+    return record
+
+
+def unregister(company_id):
+    LAYOUTS.pop(company_id, None)
+
+
+def decode(company_id, data):
+    """Decode one manufacturer-data value, or None if it is not ours.
+
+    Unknown company IDs cost a single dict miss and too-short payloads are
+    rejected before anything is allocated. ``data`` may be bytes, bytearray
+    or a memoryview, it is never copied.
+    """
+    layout = LAYOUTS.get(company_id)
+    if layout is None or len(data) < layout.size:
+        return None
+    if layout.prefix and data[:len(layout.prefix)] != layout.prefix:
+        return None
+    return layout.make((company_id,) + layout.unpack_from(data, layout.offset))
+
+
+def decode_all(manufacturer_data):
+    """Decoded records of an AdvertisementData.manufacturer_data dict."""
+    records = []
+    for company_id, data in manufacturer_data.items():
+        if company_id in LAYOUTS:
+            record = decode(company_id, data)
+            if record is not None:
+                records.append(record)
+    return records
+
+
+# 32bitove ID uzivatele, little endian (stejne jako drive int.from_bytes(...) & 0xFFFFFFFF)
+UserMessage = register(ATTENTID_COMPANY_ID, "<I", "UserMessage", ("uuid_uzivatele",))
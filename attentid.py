@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""AttentID Raspberry node - one entry point for all services.
+
+    attentid.py scan [--script sigma|vypis|fake] [--stream]   BLE scan -> MQTT
+    attentid.py receive                                      user IDs from advertisements (prijimac)
+    attentid.py gatt                                         GATT server (gatt_server)
+    attentid.py simulate [--devices N] [--local-broker]      scan pipeline on the synthetic scanner
+    attentid.py history presence|sightings MAC | top         queries over the local sighting store
+    attentid.py users list | add USER [--device MAC] | remove USER   registered users (user_registry)
+
+Only argparse is imported up front; bleak, paho and NumPy are imported by
+the selected mode, so a service restart does not pay for the others.
+"""
+import argparse
+import importlib
+import os
+import sys
+from functools import partial
+
+SCRIPTS = {"sigma": "sigma", "vypis": "vypis", "fake": "fake_ferified"}
+
+
+def load_scan(args):
+    module = importlib.import_module(SCRIPTS[args.script])
+    return module.stream_and_send if args.stream else module.scan_and_send
+
+
+def load_receive(args):
+    import prijimac
+    return prijimac.main
+
+
+def load_gatt(args):
+    import gatt_server
+    return gatt_server.run_server
+
+
+def load_simulate(args):
+    # modules read their configuration at import time, so it is set before the import
+    os.environ["ATTENTID_SCANNER"] = "synthetic"
+    os.environ["ATTENTID_SYNTH_DEVICES"] = str(args.devices)
+    os.environ["ATTENTID_SYNTH_ADV_RATE"] = str(args.adv_rate)
+    os.environ["ATTENTID_SYNTH_ROTATION"] = str(args.rotation)
+    if args.local_broker:
+        from mqtt_standin import StandInBroker
+        broker = StandInBroker().start()
+        os.environ.update(ATTENTID_MQTT_HOST=broker.host, ATTENTID_MQTT_PORT=str(broker.port),
+                          ATTENTID_MQTT_TLS="0", ATTENTID_MQTT_USERNAME="")
+    module = importlib.import_module(SCRIPTS[args.script])
+    return module.stream_and_send if args.stream else module.scan_and_send
+
+
+def load_history(args):
+    import sighting_query
+    return partial(sighting_query.run_query, args)
+
+
+def load_users(args):
+    import user_registry
+    return partial(user_registry.run_command, args)
+
+
+MODES = {
+    "scan": load_scan,
+    "receive": load_receive,
+    "gatt": load_gatt,
+    "simulate": load_simulate,
+    "history": load_history,
+    "users": load_users,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    modes = parser.add_subparsers(dest="mode", required=True)
+
+    scan = modes.add_parser("scan", help="scan BLE devices and publish them to MQTT")
+    scan.add_argument("--script", choices=SCRIPTS, default="sigma")
+    scan.add_argument("--stream", action="store_true", help="continuous scanning instead of 10 s cycles")
+
+    modes.add_parser("receive", help="receive user IDs from advertisements and verify them")
+    modes.add_parser("gatt", help="run the GATT server")
+
+    simulate = modes.add_parser("simulate", help="scan pipeline on synthetic advertisements")
+    simulate.add_argument("--script", choices=SCRIPTS, default="fake")
+    simulate.add_argument("--stream", action="store_true")
+    simulate.add_argument("--devices", type=int, default=200)
+    simulate.add_argument("--adv-rate", type=float, default=1.0, help="advertisements per device per second")
+    simulate.add_argument("--rotation", type=float, default=0.0, help="seconds between MAC changes, 0 = never")
+    simulate.add_argument("--local-broker", action="store_true", help="publish to an in-process stand-in broker")
+
+    history = modes.add_parser("history", help="query the local sighting history (ATTENTID_STORE_PATH)")
+    history.add_argument("query", choices=("presence", "sightings", "top"))
+    history.add_argument("mac", nargs="?", help="MAC address for presence and sightings")
+    history.add_argument("--store", default=os.environ.get("ATTENTID_STORE_PATH", ""))
+    history.add_argument("--from", help="HH:MM today, ISO date/time or epoch seconds")
+    history.add_argument("--to", help="same formats as --from, default now")
+    history.add_argument("--last", type=float, help="seconds before --to (or now)")
+    history.add_argument("--min-rssi", type=int, help="only sightings at least this strong [dBm]")
+    history.add_argument("-n", type=int, default=10, help="devices listed by top")
+    history.add_argument("--gap", type=float, default=120.0, help="seconds without a sighting that end a visit")
+
+    users = modes.add_parser("users", help="list, add or remove registered users (ATTENTID_REGISTRY_PATH)")
+    users.add_argument("command", choices=("list", "add", "remove"))
+    users.add_argument("user", nargs="?", help="user ID for add and remove")
+    users.add_argument("--device", action="append", default=[], help="MAC address to bind (add, repeatable)")
+    users.add_argument("--registry", default=os.environ.get("ATTENTID_REGISTRY_PATH", os.path.join("production", "registry.bin")))
+    users.add_argument("--compact", action="store_true", help="also write a new snapshot and empty the journal")
+    return parser
+
+
+def load(mode, argv=()):
+    """Import what ``mode`` needs and return its main coroutine function."""
+    args = build_parser().parse_args([mode, *argv])
+    return MODES[mode](args)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    run = MODES[args.mode](args)
+    import asyncio
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
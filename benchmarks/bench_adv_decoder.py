@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Advertisements/sec the prijimac detection callback can decode.
+
+Feeds a mix of manufacturer-data dicts (mostly foreign company IDs, some of
+ours) through the old int.from_bytes path and through adv_decoder.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adv_decoder import ATTENTID_COMPANY_ID, LAYOUTS, UserMessage, decode
+
+
+def make_advertisements(count, ours_ratio, rng):
+    foreign = [0x004C, 0x0006, 0x0075, 0x00E0, 0x0059]
+    advertisements = []
+    for _ in range(count):
+        data = {}
+        if rng.random() < ours_ratio:
+            data[ATTENTID_COMPANY_ID] = rng.randbytes(4)
+        for company in rng.sample(foreign, rng.randint(0, 2)):
+            data[company] = rng.randbytes(rng.randint(2, 27))
+        advertisements.append(data)
+    return advertisements
+
+
+def legacy(advertisements):
+    found = 0
+    for manufacturer_data in advertisements:
+        for key, value in manufacturer_data.items():
+            message = int.from_bytes(value, byteorder='little')
+            uuid_uzivatele = message & 0xFFFFFFFF
+            found += 1
+    return found
+
+
+def table_driven(advertisements):
+    found = 0
+    for manufacturer_data in advertisements:
+        for key, value in manufacturer_data.items():
+            if key not in LAYOUTS:
+                continue
+            record = decode(key, value)
+            if record is not None and type(record) is UserMessage:
+                found += 1
+    return found
+
+
+def run(name, function, advertisements, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        found = function(advertisements)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<15} {len(advertisements) / best:12,.0f} adv/s   {found} messages")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--advertisements", type=int, default=200000)
+    parser.add_argument("--ours", type=float, default=0.05, help="share of advertisements carrying a user ID")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    advertisements = make_advertisements(args.advertisements, args.ours, random.Random(1))
+    run("int.from_bytes", legacy, advertisements, args.repeat)
+    run("adv_decoder", table_driven, advertisements, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Uplink bytes with and without delta encoding on a stable scene.
+
+``--devices`` synthetic devices are formatted by sigma's format_device_data
+once per cycle for ``--cycles`` cycles (RSSI noise only, unless
+``--rotation`` changes MACs). Every payload is serialized in each format
+as a plain record and through DeltaEncoder, and the delta stream is fed
+to DeltaDecoder, which must rebuild every record exactly. With ``--loss``
+that share of messages is dropped before decoding, to see how many
+records are lost until the next keyframe.
+"""
+import argparse
+import contextlib
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ble_stream import Sighting
+from ble_synthetic import SyntheticScanner
+from delta_decoder import DeltaDecoder
+from delta_format import DeltaEncoder
+from sigma import format_device_data
+from wire_format import encode_payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--cycles", type=int, default=60)
+    parser.add_argument("--keyframe", type=int, default=10, help="deltas between keyframes")
+    parser.add_argument("--rotation", type=float, default=0.0, help="seconds between MAC changes, 0 = never")
+    parser.add_argument("--cycle-seconds", type=float, default=40.0, help="simulated time per cycle")
+    parser.add_argument("--loss", type=float, default=0.0, help="share of delta-mode messages lost")
+    args = parser.parse_args()
+
+    sightings = []
+    scanner = SyntheticScanner(lambda d, a: sightings.append(Sighting.from_advertisement(d, a)),
+                               devices=args.devices, rotation_interval=args.rotation, seed=1)
+    encoder = DeltaEncoder(args.keyframe)
+    decoder = DeltaDecoder()
+    rng = random.Random(1)
+    sizes = {(fmt, mode): 0 for fmt in ("repr", "json", "binary") for mode in ("plain", "delta")}
+    rebuilt = mismatched = lost = 0
+    encode_time = 0.0
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.monotonic()
+        for cycle in range(args.cycles):
+            sightings.clear()
+            scanner.advertise(args.devices, now=start + cycle * args.cycle_seconds)
+            timestamp = datetime.now().isoformat()
+            for sighting in sightings:
+                payload = {"data": format_device_data(sighting), "timestamp": timestamp}
+                t0 = time.perf_counter()
+                encoded = encoder.encode(payload)
+                encode_time += time.perf_counter() - t0
+                for fmt in ("repr", "json", "binary"):
+                    sizes[(fmt, "plain")] += len(encode_payload(payload, fmt))
+                    sizes[(fmt, "delta")] += len(encode_payload(encoded, fmt))
+
+                if rng.random() < args.loss:
+                    continue
+                message = encode_payload(encoded, "binary")
+                decoded = decoder.decode_bytes(message.encode() if isinstance(message, str) else message)
+                if not decoded:
+                    lost += 1
+                elif decoded[0]["data"] == payload["data"] and abs(
+                        datetime.fromisoformat(decoded[0]["timestamp"]) - datetime.fromisoformat(payload["timestamp"])
+                ) <= timedelta(milliseconds=1):
+                    rebuilt += 1
+                else:
+                    mismatched += 1
+
+    messages = args.devices * args.cycles
+    print(f"{messages} messages, {encoder.stats['keyframes']} keyframes, {encoder.stats['deltas']} deltas, "
+          f"encode {encode_time / messages * 1e6:.2f} us/message")
+    for fmt in ("repr", "json", "binary"):
+        plain, delta = sizes[(fmt, "plain")], sizes[(fmt, "delta")]
+        print(f"{fmt:<8} plain {plain / messages:7.1f} B/msg   delta {delta / messages:7.1f} B/msg   "
+              f"{plain / delta:5.2f}x smaller")
+    print(f"decoder: {rebuilt} rebuilt, {lost} waiting for a keyframe, {mismatched} mismatched; {decoder.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""GATT write ingestion throughput without a BLE stack.
+
+``--threads`` writer threads (the way BlueZ/D-Bus callbacks arrive) call
+GattIngest.on_write as fast as they can, ``--writes`` times each, with
+frames of ``--phones`` distinct phones; with ``--in-loop`` the writes come
+from the event loop instead. The ring is drained into the real
+CoalescingWorkerPool whose handler stands in for verify_user and costs
+``--verify-us`` of CPU. Reports accepted and drained writes per second,
+drops, coalescing and the latency of the write callback itself.
+"""
+import argparse
+import asyncio
+import os
+import struct
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gatt_ingest import GattIngest
+from worker_pool import CoalescingWorkerPool
+
+
+def frames(phones):
+    return [struct.pack("<I", 1000 + index) + index.to_bytes(6, "big") for index in range(phones)]
+
+
+def write(ingest, values, count, latencies):
+    perf = time.perf_counter_ns
+    on_write = ingest.on_write
+    for index in range(count):
+        t0 = perf()
+        on_write(values[index % len(values)])
+        if not index & 63:
+            latencies.append(perf() - t0)
+
+
+async def run(args):
+    verified = 0
+    spin = args.verify_us / 1e6
+
+    async def verify(address, uuid_uzivatele):
+        nonlocal verified
+        end = time.perf_counter() + spin
+        while time.perf_counter() < end:
+            pass
+        verified += 1
+
+    pool = CoalescingWorkerPool(verify, workers=args.workers, max_queue=args.queue,
+                                window=args.coalesce_ms / 1000.0).start()
+    ingest = GattIngest(pool, capacity=args.ring, batch_size=args.batch, on_full=args.on_full)
+    drain = asyncio.create_task(ingest.run())
+    values = frames(args.phones)
+    latencies = []
+
+    start = time.perf_counter()
+    if args.in_loop:
+        for _ in range(args.threads):
+            write(ingest, values, args.writes, latencies)
+            await asyncio.sleep(0)
+    else:
+        threads = [threading.Thread(target=write, args=(ingest, values, args.writes, latencies))
+                   for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            await asyncio.sleep(0.001)
+    written = time.perf_counter() - start
+    while len(ingest.ring) or pool.qsize():
+        await asyncio.sleep(0.001)
+    drained = time.perf_counter() - start
+    drain.cancel()
+    await pool.close()
+
+    stats = ingest.ring.stats
+    total = args.threads * args.writes
+    latencies.sort()
+    print(f"{total} writes from {args.threads} {'loop batches' if args.in_loop else 'threads'}, "
+          f"{args.phones} phones, ring {args.ring}, batch {args.batch}")
+    print(f"offered {total / written:,.0f}/s, accepted {stats['pushed']}, dropped {stats['dropped']}, "
+          f"drained {stats['taken']} in {stats['batches']} batches ({stats['taken'] / drained:,.0f}/s)")
+    print(f"callback latency p50 {latencies[len(latencies) // 2] / 1000:.2f} us, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] / 1000:.2f} us, max {latencies[-1] / 1000:.2f} us")
+    print(f"verification pool: {pool.stats}, verified {verified}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=50_000, help="writes per thread")
+    parser.add_argument("--phones", type=int, default=500)
+    parser.add_argument("--in-loop", action="store_true", help="write from the event loop instead of threads")
+    parser.add_argument("--ring", type=int, default=8192)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--on-full", default="drop_new", choices=("drop_new", "drop_oldest"))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queue", type=int, default=1000)
+    parser.add_argument("--coalesce-ms", type=float, default=2000.0)
+    parser.add_argument("--verify-us", type=float, default=50.0, help="CPU cost of one stand-in verification")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Cost of the metrics on the hot path.
+
+Times ``Counter.inc`` and ``Histogram.observe`` per call against an empty
+loop, then one Prometheus scrape and one node-health snapshot of a
+registry with the pipeline's metrics plus ``--extra`` filler metrics.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import DURATION_BUCKETS, Registry
+
+
+def per_call(function, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--extra", type=int, default=20, help="additional histograms in the scraped registry")
+    args = parser.parse_args()
+
+    registry = Registry()
+    counter = registry.counter("bench_total", "")
+    histogram = registry.histogram("bench_seconds", "", DURATION_BUCKETS)
+    registry.gauge("bench_queue", "", lambda: 42)
+    for index in range(args.extra):
+        extra = registry.histogram(f"bench_extra_{index}_seconds", "")
+        for value in range(1000):
+            extra.observe(value / 1000)
+
+    empty = per_call(lambda: None, args.count)
+    inc = per_call(counter.inc, args.count) - empty
+    observe = per_call(lambda: histogram.observe(0.0003), args.count) - empty
+    print(f"Counter.inc        {inc * 1e9:7.0f} ns")
+    print(f"Histogram.observe  {observe * 1e9:7.0f} ns")
+
+    start = time.perf_counter()
+    text = registry.render()
+    render = time.perf_counter() - start
+    start = time.perf_counter()
+    registry.snapshot()
+    snapshot = time.perf_counter() - start
+    print(f"render             {render * 1000:7.2f} ms  ({len(registry.metrics)} metrics, {len(text)} bytes)")
+    print(f"snapshot           {snapshot * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Occupancy aggregation: cost per record, accuracy and uplink bytes.
+
+Synthetic devices with rotating MACs are formatted by sigma's
+format_device_data once per ``--cycle-seconds`` for ``--minutes`` minutes
+and fed to OccupancyAggregator. Reports the cost of ``add`` per record,
+the HyperLogLog estimate against the exact number of distinct MACs per
+minute and the bytes per minute of the raw records versus the summaries.
+A second pass under tracemalloc shows that memory does not grow with the
+rotating addresses.
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ble_stream import Sighting
+from ble_synthetic import SyntheticScanner
+from occupancy import OccupancyAggregator
+from sigma import format_device_data
+from wire_format import encode_payload
+
+
+def run(args, trace=False):
+    """One pass over the scene; returns (add time, records, raw bytes, summary bytes, memory samples)."""
+    sightings = []
+    scanner = SyntheticScanner(lambda d, a: sightings.append(Sighting.from_advertisement(d, a)),
+                               devices=args.devices, rotation_interval=args.rotation, seed=1)
+    if trace:
+        tracemalloc.start()
+    aggregator = OccupancyAggregator(p=args.p)
+    memory = []
+    exact, raw_bytes, summary_bytes, add_time, records = set(), 0, 0, 0.0, 0
+    start = 1_800_000_000.0  # a minute boundary
+    cycles = int(args.minutes * 60 / args.cycle_seconds)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for cycle in range(cycles + 1):
+            now = start + cycle * args.cycle_seconds
+            sightings.clear()
+            scanner.advertise(args.devices, now=time.monotonic() + cycle * args.cycle_seconds)
+            for sighting in sightings:
+                record = format_device_data(sighting)
+                if not trace:
+                    payload = {"data": record, "timestamp": datetime.now().isoformat()}
+                    raw_bytes += len(encode_payload(payload, args.format))
+                t0 = time.perf_counter()
+                summary = aggregator.add(record, now)
+                add_time += time.perf_counter() - t0
+                records += 1
+                if summary is not None:
+                    summary_bytes += len(encode_payload(summary, args.format))
+                    if trace:
+                        memory.append(tracemalloc.get_traced_memory()[0])
+                    else:
+                        error = (summary["unique_devices"] - len(exact)) / len(exact)
+                        print(f"{summary['timestamp']}  estimate {summary['unique_devices']:6}  "
+                              f"exact {len(exact):6}  error {error:+6.2%}", file=sys.stderr)
+                    exact.clear()
+                exact.add(record["mac"])
+    if trace:
+        tracemalloc.stop()
+    return add_time, records, raw_bytes, summary_bytes, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--minutes", type=int, default=10)
+    parser.add_argument("--cycle-seconds", type=float, default=10.0)
+    parser.add_argument("--rotation", type=float, default=120.0, help="seconds between MAC changes")
+    parser.add_argument("--p", type=int, default=12, help="HyperLogLog precision")
+    parser.add_argument("--format", choices=("repr", "json", "binary"), default="json")
+    args = parser.parse_args()
+
+    add_time, records, raw_bytes, summary_bytes, _ = run(args)
+    memory = run(args, trace=True)[4]
+    minutes = len(memory)
+    print(f"add(): {add_time / records * 1e6:.2f} us/record over {records} records")
+    print(f"traced memory after each summary: {memory[0] / 1024:.0f} KiB first, {memory[-1] / 1024:.0f} KiB last")
+    print(f"{args.format}: raw {raw_bytes / minutes / 1024:.1f} KiB/min, "
+          f"summaries {summary_bytes / minutes / 1024:.2f} KiB/min ({raw_bytes / summary_bytes:.0f}x less)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""End-to-end pipeline load test with the synthetic BLE scanner.
+
+SyntheticScanner -> AdvertisementStream -> sigma's format_device_data and
+topic selection -> mqttportabo -> MqttPublisher -> local StandInBroker.
+First the per-call cost of the formatting and topic stages is measured on
+the synthetic population, then the whole chain runs for ``--seconds`` and
+reports throughput, advertisement-to-broker latency percentiles and peak
+RSS. The scripts' console output goes to /dev/null while measuring.
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import resource
+import sys
+import time
+from collections import defaultdict, deque
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mqttportabo
+from ble_stream import AdvertisementStream, Sighting
+from ble_synthetic import SyntheticScanner
+from mqtt_standin import StandInBroker
+from pipeline import Uplink
+from sigma import format_device_data, make_topic_selector
+from user_registry import UserRegistry
+
+RASPBERRY_UUID = "bench-raspberry"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100.0 * len(values)))]
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def bench_stages(args, devnull):
+    sightings = []
+    scanner = SyntheticScanner(lambda d, a: sightings.append(Sighting.from_advertisement(d, a)),
+                               devices=args.devices, user_ratio=args.user_ratio, seed=1)
+    scanner.advertise(max(args.devices, 20000))
+    registry = UserRegistry("")
+    registry.add_default_user(sightings[0].address)
+    select_topic = make_topic_selector(RASPBERRY_UUID, registry)
+
+    for name, function in (("format_device_data", format_device_data),
+                           ("select_topic", lambda s: select_topic(s.address))):
+        with contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            for sighting in sightings:
+                function(sighting)
+            elapsed = time.perf_counter() - start
+        print(f"{name:<20} {elapsed / len(sightings) * 1e6:8.2f} us/call {len(sightings) / elapsed:12,.0f} calls/s")
+
+
+async def run_pipeline(args, broker, devnull):
+    uplink = Uplink(format_device_data, make_topic_selector(RASPBERRY_UUID, UserRegistry("")),
+                    node_topic=f"ble_devices/{RASPBERRY_UUID}/batch", batch_size=args.batch_size)
+    factory = partial(SyntheticScanner, devices=args.devices, adv_rate=args.adv_rate,
+                      rotation_interval=args.rotation, user_ratio=args.user_ratio, seed=2,
+                      coverage=args.coverage if args.adapters > 1 else 1.0)
+    adapters = [f"hci{index}" for index in range(args.adapters)] if args.adapters > 1 else []
+    stream = AdvertisementStream(maxsize=args.queue, min_interval=args.min_interval, scanner_factory=factory,
+                                 adapters=adapters)
+    sent = defaultdict(deque)  # topic -> advertisement timestamps, in send order
+    submitted = 0
+
+    async def consume():
+        nonlocal submitted
+        async for sighting in stream:
+            topic = "/rv-catcher/" + uplink.select_topic(sighting.address)
+            sent[topic].append(sighting.timestamp)
+            await uplink.submit(sighting, sighting.timestamp)
+            submitted += 1
+
+    with contextlib.redirect_stdout(devnull):
+        mqttportabo.get_publisher().wait_connected()
+        async with stream:
+            scanners = list(stream.scanners)
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(consume(), args.seconds)
+            except asyncio.TimeoutError:
+                pass
+            elapsed = time.perf_counter() - start
+        await uplink.flush()
+        await mqttportabo.get_async_publisher().join()
+        await asyncio.get_running_loop().run_in_executor(None, mqttportabo.get_publisher().flush, 30)
+
+    latencies = []
+    for received_at, topic, _, _ in list(broker.received):
+        if sent[topic]:
+            latencies.append(received_at - sent[topic].popleft())
+
+    print(f"{args.devices} devices @ {args.adv_rate:g} adv/s, rotation {args.rotation:g} s, "
+          f"{args.seconds:g} s, batch size {args.batch_size}")
+    emitted = sum(scanner.emitted for scanner in scanners)
+    print(f"advertisements       {emitted / elapsed:12,.0f} /s  ({emitted} total, "
+          f"{scanners[0].rotations} MAC rotations)")
+    if adapters:
+        heard = len(set().union(*(scanner.addresses for scanner in scanners)))
+        print(f"adapters             {', '.join(f'{name} {count}' for name, count in stream.received_by_adapter.items())}"
+              f"  ({heard} distinct devices heard, {stream.duplicates} cross-adapter duplicates merged)")
+    print(f"records submitted    {submitted / elapsed:12,.0f} /s  ({stream.dropped} dropped by the stream queue)")
+    print(f"MQTT messages        {len(broker.received) / elapsed:12,.0f} /s  ({len(broker.received)} at broker)")
+    if latencies:
+        print(f"adv -> broker        p50 {percentile(latencies, 50) * 1000:8.2f} ms   "
+              f"p95 {percentile(latencies, 95) * 1000:8.2f} ms   p99 {percentile(latencies, 99) * 1000:8.2f} ms")
+    else:
+        print("adv -> broker        n/a (batched records are not matched per advertisement)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--adv-rate", type=float, default=2.0, help="advertisements per device per second")
+    parser.add_argument("--rotation", type=float, default=0.0, help="seconds between MAC changes, 0 = never")
+    parser.add_argument("--user-ratio", type=float, default=0.01, help="share of devices carrying a user ID")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--min-interval", type=float, default=1.0, help="AdvertisementStream throttle")
+    parser.add_argument("--queue", type=int, default=1000, help="AdvertisementStream queue size")
+    parser.add_argument("--batch-size", type=int, default=0)
+    parser.add_argument("--adapters", type=int, default=1, help="concurrent synthetic adapters")
+    parser.add_argument("--coverage", type=float, default=0.7, help="share of devices each adapter hears")
+    parser.add_argument("--rtt-ms", type=float, default=20.0, help="simulated broker round trip")
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull:
+        bench_stages(args, devnull)
+        with StandInBroker(ack_delay=args.rtt_ms / 1000.0) as broker:
+            mqttportabo.configure(broker.host, broker.port, tls=None, auth=None)
+            asyncio.run(run_pipeline(args, broker, devnull))
+            mqttportabo.get_publisher().stop()
+    print(f"peak RSS             {peak_rss_mb():8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Overhead of the profiling modes on the formatting stage.
+
+Runs sigma's format_device_data over synthetic sightings with profiling
+off, with the CPU sampler, with tracemalloc and with both, and reports
+calls/s and the slowdown against the run without profiling. Also times
+one memory report of the resulting heap.
+"""
+import argparse
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ble_stream import Sighting
+from ble_synthetic import SyntheticScanner
+from profiling import Profiler
+from sigma import format_device_data
+
+
+def throughput(sightings, seconds, devnull):
+    calls, start = 0, time.perf_counter()
+    with contextlib.redirect_stdout(devnull):
+        while time.perf_counter() - start < seconds:
+            for sighting in sightings:
+                format_device_data(sighting)
+            calls += len(sightings)
+    return calls / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each run")
+    parser.add_argument("--hz", type=float, default=50.0)
+    args = parser.parse_args()
+
+    sightings = []
+    SyntheticScanner(lambda d, a: sightings.append(Sighting.from_advertisement(d, a)),
+                     devices=args.devices, seed=1).advertise(args.devices)
+    profiler = Profiler(directory=tempfile.mkdtemp(prefix="attentid-profile-"), hz=args.hz)
+
+    with open(os.devnull, "w") as devnull:
+        baseline = None
+        for mode in ("off", "cpu", "memory", "cpu+memory"):
+            if "cpu" in mode:
+                profiler.cpu.start()
+            if "memory" in mode:
+                profiler.memory.start()
+            rate = throughput(sightings, args.seconds, devnull)
+            baseline = baseline or rate
+            print(f"{mode:<12} {rate:12,.0f} calls/s  {baseline / rate:5.2f}x")
+            if profiler.memory.active:
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(devnull):
+                    profiler.dump_memory()
+                print(f"{'':<12} memory report {time.perf_counter() - start:.2f} s")
+            profiler.cpu.stop()
+            profiler.memory.stop()
+
+
+if __name__ == "__main__":
+    main()
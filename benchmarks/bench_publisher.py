@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Compare publish.single per message with the pooled MqttPublisher.
+
+Both run against the local StandInBroker. ``--rtt-ms`` delays every ack and
+``--handshake-rtts`` delays the CONNACK by that many round trips, which
+models the TCP+TLS handshake each publish.single call pays on the real link.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import paho.mqtt.client as mqtt
+import paho.mqtt.publish as publish
+
+from mqtt_publisher import MqttPublisher
+from mqtt_standin import StandInBroker
+
+PAYLOAD = str({
+    "data": {"name": "Unknown", "mac": "AA:BB:CC:DD:EE:FF", "rssi": -70, "uuids": [],
+             "device_types": ["Unknown Device"], "manufacturer_data": {"76": "0215"},
+             "manufacturer_info": ["Apple"]},
+    "timestamp": "2024-01-01T12:00:00",
+})
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100.0 * len(values)))]
+
+
+def bench_single(broker, count, qos):
+    latencies = []
+    start = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        publish.single(f"bench/{i}", PAYLOAD, qos=qos, hostname=broker.host, port=broker.port,
+                       client_id="bench-single", protocol=mqtt.MQTTv311)
+        latencies.append(time.perf_counter() - t0)
+    return count / (time.perf_counter() - start), latencies
+
+
+def bench_pooled(broker, count, qos, connections, inflight):
+    publisher = MqttPublisher(broker.host, broker.port, client_id="bench-pool",
+                              connections=connections, qos=qos, max_inflight=inflight,
+                              max_queued=count + 1).start()
+    publisher.wait_connected()
+    latencies = []
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def acked(t0):
+        def callback(error):
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+                if len(latencies) == count:
+                    done.set()
+        return callback
+
+    start = time.perf_counter()
+    for i in range(count):
+        publisher.publish(f"bench/{i}", PAYLOAD, callback=acked(time.perf_counter()))
+    done.wait(60)
+    elapsed = time.perf_counter() - start
+    publisher.stop()
+    return count / elapsed, latencies
+
+
+def report(name, rate, latencies):
+    print(f"{name:<10} {rate:10.1f} msg/s   p50 {percentile(latencies, 50) * 1000:8.2f} ms"
+          f"   p99 {percentile(latencies, 99) * 1000:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--qos", type=int, default=1)
+    parser.add_argument("--rtt-ms", type=float, default=20.0)
+    parser.add_argument("--handshake-rtts", type=float, default=3.0)
+    parser.add_argument("--connections", type=int, default=1)
+    parser.add_argument("--inflight", type=int, default=20)
+    args = parser.parse_args()
+
+    rtt = args.rtt_ms / 1000.0
+    with StandInBroker(connect_delay=rtt * args.handshake_rtts, ack_delay=rtt) as broker:
+        report("single", *bench_single(broker, args.messages, args.qos))
+        report("pooled", *bench_pooled(broker, args.messages, args.qos,
+                                       args.connections, args.inflight))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""User registry lookups, snapshot load and incremental reload.
+
+Builds a registry of ``--users`` users with ``--devices`` bound MACs each
+in a temporary directory, saves a snapshot and appends ``--journal``
+bindings to its journal. Times loading it (mmap snapshot + journal),
+``user_of`` for bound and unknown addresses, ``verify_device``, and a
+``reload()`` that only has to parse newly appended journal lines.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_registry import UserRegistry
+
+
+def random_mac(rng):
+    return ":".join(f"{rng.randrange(256):02X}" for _ in range(6))
+
+
+def per_call(function, arguments):
+    start = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+    return (time.perf_counter() - start) / len(arguments)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--devices", type=int, default=4, help="bound MACs per user")
+    parser.add_argument("--journal", type=int, default=1000, help="bindings appended after the snapshot")
+    parser.add_argument("--lookups", type=int, default=200_000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "registry.bin")
+        writer = UserRegistry(path)
+        users = [str(1000 + index) for index in range(args.users)]
+        bound = []
+        for user in users:
+            macs = [random_mac(rng) for _ in range(args.devices)]
+            writer.add_user(user, macs, persist=False)
+            bound.extend(macs)
+        writer.save()
+        for _ in range(args.journal):
+            writer.bind(random_mac(rng), rng.choice(users))
+        size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        registry = UserRegistry(path).load()
+        load = time.perf_counter() - start
+        assert len(registry) == args.users and registry.stats["journal_entries"] == args.journal
+
+        known = [rng.choice(bound) for _ in range(args.lookups)]
+        unknown = [random_mac(rng) for _ in range(args.lookups)]
+        pairs = [(rng.choice(bound), rng.choice(users)) for _ in range(args.lookups // 10)]
+        hit = per_call(registry.user_of, known)
+        miss = per_call(registry.user_of, unknown)
+        registry.path = registry.journal_path = None  # overeni bez zapisu do zurnalu
+        verify = per_call(lambda pair: registry.verify_device(*pair), pairs)
+        registry.path, registry.journal_path = path, path + ".log"
+
+        for _ in range(args.journal):
+            writer.bind(random_mac(rng), rng.choice(users))
+        start = time.perf_counter()
+        registry.reload()
+        reload = time.perf_counter() - start
+        unchanged = per_call(lambda _: registry.reload(), range(1000))
+        writer.close()
+
+    print(f"{args.users} users, {len(bound)} snapshot bindings ({size / 1024:.0f} KiB), "
+          f"{args.journal} journal entries")
+    print(f"load {load * 1000:.1f} ms, reload of {args.journal} new entries {reload * 1000:.2f} ms, "
+          f"reload without changes {unchanged * 1e6:.1f} us")
+    print(f"user_of bound {hit * 1e9:.0f} ns, unknown {miss * 1e9:.0f} ns, verify_device {verify * 1e9:.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
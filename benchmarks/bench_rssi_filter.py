@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""RssiTracker throughput: N devices each reporting at R Hz.
+
+Every tick feeds one reading per device in a single batch, then reads the
+smoothed RSSI and distance of all devices. The tick budget at R Hz is
+1000 / R ms; the report shows how much of it the tracker uses.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from rssi_filter import RssiTracker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--rate", type=float, default=10.0, help="readings per device per second")
+    parser.add_argument("--seconds", type=float, default=5.0, help="simulated duration")
+    parser.add_argument("--method", choices=("ema", "kalman"), default="kalman")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    macs = [":".join(f"{b:02X}" for b in rng.integers(0, 256, 6)) for _ in range(args.devices)]
+    true_rssi = rng.uniform(-95, -40, args.devices)
+    tracker = RssiTracker(capacity=max(16384, 2 * args.devices), method=args.method)
+
+    ticks = int(args.seconds * args.rate)
+    update_times, read_times = [], []
+    for tick in range(ticks):
+        readings = true_rssi + rng.normal(0, 4, args.devices)
+        t0 = time.perf_counter()
+        tracker.update(macs, readings, np.full(args.devices, tick / args.rate))
+        t1 = time.perf_counter()
+        tracker.distances()
+        t2 = time.perf_counter()
+        update_times.append(t1 - t0)
+        read_times.append(t2 - t1)
+
+    budget = 1000.0 / args.rate
+    update_ms = np.array(update_times) * 1000
+    read_ms = np.array(read_times) * 1000
+    total = update_ms + read_ms
+    slots = np.array([tracker._slots[mac] for mac in macs])
+    error = np.mean(np.abs(tracker.smoothed_all()[slots] - true_rssi))
+    print(f"{args.devices} devices @ {args.rate:g} Hz, {ticks} ticks, method {args.method}")
+    print(f"update   mean {update_ms.mean():7.2f} ms   p99 {np.percentile(update_ms, 99):7.2f} ms")
+    print(f"read     mean {read_ms.mean():7.2f} ms   p99 {np.percentile(read_ms, 99):7.2f} ms")
+    print(f"tick     mean {total.mean():7.2f} ms of {budget:.0f} ms budget "
+          f"({100 * total.mean() / budget:.1f} %), {args.devices * args.rate / (total.mean() / budget):,.0f} readings/s sustainable")
+    print(f"mean abs error of smoothed RSSI {error:.2f} dB (raw reading noise sigma 4 dB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Manufacturer and device-type lookups per advertisement.
+
+The old scripts rebuilt a 14-entry dict on every get_manufacturer_info
+call (and sigma/vypis passed str keys, so nothing ever matched); sig_tables
+keeps the full SIG lists in uint16-indexed arrays built once.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sig_tables import company_table, get_device_type, get_manufacturer_info, service_table
+
+KNOWN_DEVICE_UUIDS = {
+    "0000180f-0000-1000-8000-00805f9b34fb": "Battery Service",
+    "0000180a-0000-1000-8000-00805f9b34fb": "Device Information",
+    "0000fe9f-0000-1000-8000-00805f9b34fb": "Google Fast Pair",
+    "0000fd6f-0000-1000-8000-00805f9b34fb": "Windows Device",
+    "9fa480e0-4967-4542-9390-d343dc5d04ae": "Apple Device"
+}
+
+
+def legacy_manufacturer_info(manufacturer_data):
+    manufacturer_info = []
+    manufacturer_mapping = {
+        76: "Apple", 6: "Microsoft", 117: "Samsung", 224: "Google", 89: "Sony", 15: "Intel", 2: "IBM",
+        48: "Nokia", 85: "Qualcomm", 72: "Broadcom", 112: "Huawei", 208: "Xiaomi", 240: "Oppo", 200: "Vivo",
+    }
+    for key, value in manufacturer_data.items():
+        manufacturer_info.append(manufacturer_mapping.get(key, f"Unknown Manufacturer (ID: {key})"))
+    return manufacturer_info
+
+
+def legacy_device_type(uuids):
+    device_types = []
+    for uuid_str in uuids:
+        uuid_lower = uuid_str.lower()
+        if uuid_lower in KNOWN_DEVICE_UUIDS:
+            device_types.append(KNOWN_DEVICE_UUIDS[uuid_lower])
+    return device_types if device_types else ["Unknown Device"]
+
+
+def make_advertisements(count, rng):
+    companies = [76, 6, 117, 224, 89, 0x0157, 0x038F, 0x0822, rng.randrange(65536)]
+    services = list(KNOWN_DEVICE_UUIDS) + ["0000fe2c-0000-1000-8000-00805f9b34fb",
+                                           "0000feaa-0000-1000-8000-00805f9b34fb"]
+    advertisements = []
+    for _ in range(count):
+        manufacturer_data = {company: b"\x00" for company in rng.sample(companies, rng.randint(0, 2))}
+        uuids = rng.sample(services, rng.randint(0, 2))
+        advertisements.append((manufacturer_data, uuids))
+    return advertisements
+
+
+def run(name, manufacturer_info, device_type, advertisements, repeat, str_keys=False):
+    best, hits = float("inf"), 0
+    inputs = [({str(k): v for k, v in m.items()} if str_keys else m, u) for m, u in advertisements]
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hits = 0
+        for manufacturer_data, uuids in inputs:
+            info = manufacturer_info(manufacturer_data)
+            device_type(uuids)
+            hits += sum(1 for item in info if not item.startswith("Unknown"))
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<22} {len(advertisements) / best:12,.0f} adv/s   {hits} manufacturer names resolved")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--advertisements", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    companies, services = company_table(), service_table()
+    print(f"tables built in {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"({len(companies)} company IDs, {len(services)} 16-bit services)")
+
+    advertisements = make_advertisements(args.advertisements, random.Random(1))
+    run("legacy (str keys)", legacy_manufacturer_info, legacy_device_type, advertisements, args.repeat, True)
+    run("legacy (int keys)", legacy_manufacturer_info, legacy_device_type, advertisements, args.repeat)
+    run("sig_tables", get_manufacturer_info, get_device_type, advertisements, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Range queries over a month of recorded sightings.
+
+Writes a synthetic store the way SightingStore leaves it after a month:
+``--days - 1`` days of segments downsampled to ``--resolution`` seconds
+plus one day of raw sightings at ``--raw-rate`` advertisements per second,
+one segment per hour. Each of ``--devices`` devices is present in a random
+``--presence`` share of the hours. Then times building the indexes, and
+each query against a full scan of the same segments that does not use
+the indexes. The first run of each query includes opening the saved
+indexes, as in a fresh ``attentid.py history`` process.
+
+    presence   when was one MAC near the node between 09:00 and 11:00
+    month      all sightings of one MAC over the whole month
+    top        10 strongest devices in the last 5 minutes
+    hour       every row of one hour of the raw day
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sighting_query import SightingHistory
+from sighting_store import ROW, Segment
+
+
+def write_hour(directory, hour_start, macs, present, rng, resolution, rate):
+    """One hour segment: per-bucket rows of present devices, or raw rows at ``rate``/s."""
+    devices = macs[present]
+    if resolution:
+        buckets = np.arange(hour_start, hour_start + 3600, resolution)
+        mac = np.tile(devices, len(buckets))
+        timestamp = np.repeat(buckets, len(devices)) + rng.random(len(mac)) * resolution
+        count = rng.integers(1, resolution * 10, len(mac), dtype=np.uint32)
+    else:
+        rows = int(rate * 3600)
+        mac = devices[rng.integers(0, len(devices), rows)]
+        timestamp = hour_start + np.sort(rng.random(rows)) * 3600
+        count = None
+    rows = np.empty(len(mac), dtype=ROW.descr + ([("count", "<u4")] if resolution else []))
+    rows["timestamp"], rows["mac"] = timestamp, mac
+    rows["rssi"] = rng.integers(-100, -30, len(mac))
+    rows["company_id"] = np.where(mac % 3 == 0, 0x004C, 0)
+    rows["flags"] = np.where(mac % 3 == 0, 0x04, 0)
+    if count is not None:
+        rows["count"] = count
+    order = np.argsort(rows["timestamp"], kind="stable")
+    segment = Segment.create(directory, float(hour_start), len(rows), resolution)
+    segment.write(rows[order])
+    segment.close()
+    return len(rows)
+
+
+def scan(directory, start, end, mac=None):
+    """The same selection without indexes: read every column of every segment."""
+    total = 0
+    for name in sorted(os.listdir(directory)):
+        segment = Segment(os.path.join(directory, name))
+        timestamps = np.asarray(segment.column("timestamp"))
+        mask = (timestamps >= start) & (timestamps < end)
+        if mac is not None:
+            mask &= np.asarray(segment.column("mac")) == mac
+        rows = np.flatnonzero(mask)
+        for column in ("rssi", "company_id", "flags", "count"):
+            segment.column(column)[rows]
+        total += len(rows)
+    return total
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--devices", type=int, default=300)
+    parser.add_argument("--presence", type=float, default=0.4, help="share of hours a device is present")
+    parser.add_argument("--resolution", type=int, default=60)
+    parser.add_argument("--raw-rate", type=float, default=200.0, help="advertisements per second on the raw day")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    macs = rng.integers(0, 1 << 48, args.devices, dtype=np.uint64)
+    end = 1_700_006_400.0  # konec dne (pulnoc UTC)
+    start = end - args.days * 86400
+    hours = args.days * 24
+    present = rng.random((hours, args.devices)) < args.presence
+    present[:, 0] = True  # sledovane zarizeni je videt kazdou hodinu
+
+    with tempfile.TemporaryDirectory() as directory:
+        t0 = time.perf_counter()
+        rows = sum(write_hour(directory, start + hour * 3600, macs, present[hour], rng,
+                              args.resolution if hour < hours - 24 else 0, args.raw_rate)
+                   for hour in range(hours))
+        size = sum(entry.stat().st_size for path in os.scandir(directory) for entry in os.scandir(path))
+        print(f"{args.days} days, {hours} segments, {rows:,} rows, {size / 2**20:.0f} MiB "
+              f"(written in {time.perf_counter() - t0:.1f} s)")
+
+        history = SightingHistory(directory)
+        build, _ = timed(history.build_indexes, 1)
+        indexed = sum(entry.stat().st_size for path in os.scandir(directory) for entry in os.scandir(path))
+        print(f"indexes built in {build:.1f} s, {(indexed - size) / 2**20:.0f} MiB")
+
+        history = SightingHistory(directory)  # indexy z disku (memmap), jako novy proces
+        mac = int(macs[0])
+        morning = end - 86400 - 15 * 3600  # 09:00 predposledniho dne
+        queries = {
+            "presence": (lambda: history.presence(mac, morning, morning + 7200),
+                         lambda: scan(directory, morning, morning + 7200, mac)),
+            "month": (lambda: history.sightings(mac), lambda: scan(directory, 0, np.inf, mac)),
+            "top": (lambda: history.top(end - 300, end, 10), lambda: scan(directory, end - 300, end)),
+            "hour": (lambda: history.range(end - 7200, end - 3600), lambda: scan(directory, end - 7200, end - 3600)),
+        }
+        for name, (query, baseline) in queries.items():
+            cold, result = timed(query, 1)
+            warm, _ = timed(query, args.repeat)
+            scan_time, _ = timed(baseline, max(1, args.repeat // 2))
+            print(f"{name:<9} {len(result):>9,} results  first {cold * 1000:8.2f} ms  then {warm * 1000:8.2f} ms   "
+                  f"full scan {scan_time * 1000:8.1f} ms ({scan_time / warm:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Startup cost of every attentid.py mode.
+
+Each mode is loaded (imports done, nothing run) in a fresh interpreter
+``--runs`` times; the median wall time is reported next to a bare
+``python -c pass``. With ``--top`` the slowest imports of each mode are
+listed from ``python -X importtime``.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ("scan", "receive", "gatt", "simulate")
+
+LOAD = """
+import time
+start = time.perf_counter()
+import attentid
+attentid.load({mode!r})
+print(time.perf_counter() - start)
+"""
+
+
+def run(code, importtime=False):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    return subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+
+
+def wall_time(code, runs):
+    import time
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = run(code)
+        times.append(time.perf_counter() - start)
+        if result.returncode:
+            return None, result.stderr.strip().splitlines()[-1]
+    return statistics.median(times), None
+
+
+def slowest_imports(code, count):
+    imports = []
+    for line in run(code, importtime=True).stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # nested imports are indented further
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="list the N slowest top-level imports per mode")
+    args = parser.parse_args()
+
+    baseline, _ = wall_time("pass", args.runs)
+    print(f"{'interpreter':<10} {baseline * 1000:8.1f} ms")
+    for mode in MODES:
+        code = LOAD.format(mode=mode)
+        elapsed, error = wall_time(code, args.runs)
+        if elapsed is None:
+            print(f"{mode:<10} failed: {error}")
+            continue
+        print(f"{mode:<10} {elapsed * 1000:8.1f} ms   ({(elapsed - baseline) * 1000:7.1f} ms over the interpreter)")
+        for cumulative, name in slowest_imports(code, args.top):
+            print(f"{'':<12}{cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
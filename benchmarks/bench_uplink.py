@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Publish rate, ack latency and reconnect cost of mqttportabo's send paths.
+
+mqttportabo is pointed at a local StandInBroker through configure(), so
+the numbers are repeatable offline. Every mode sends ``--messages``
+device records:
+
+  sync        send_payload(wait=False), then a flush
+  sync-wait   send_payload(wait=True), one message at a time
+  async       async_send_payload(wait=False), acks collected from the futures
+  async-wait  await async_send_payload(wait=True), one message at a time
+
+Latency is publish -> broker ack, except for ``sync``, where paho does not
+hand the ack back and publish -> broker receive is reported instead. The
+reconnect test drops all connections at the broker and measures how long
+until the publisher is connected again and the first message is acked.
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mqttportabo
+from mqtt_standin import StandInBroker
+
+RECORD = {
+    "data": {"name": "Unknown", "mac": "AA:BB:CC:DD:EE:FF", "rssi": -70, "uuids": [],
+             "device_types": ["Unknown Device"], "manufacturer_data": {"76": "0215"},
+             "manufacturer_info": ["Apple"]},
+    "timestamp": "2024-01-01T12:00:00",
+}
+MODES = ("sync", "sync-wait", "async", "async-wait")
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100.0 * len(values)))]
+
+
+def topic(i):
+    return f"ble_devices/bench/{i}"
+
+
+def bench_sync(broker, count):
+    sent = {}
+    start = time.perf_counter()
+    for i in range(count):
+        sent["/rv-catcher/" + topic(i)] = time.time()
+        mqttportabo.send_payload(topic(i), RECORD)
+    mqttportabo.get_publisher().flush(60)
+    elapsed = time.perf_counter() - start
+    broker.wait_for(count)
+    return elapsed, [received_at - sent[name] for received_at, name, _, _ in broker.received if name in sent]
+
+
+def bench_sync_wait(broker, count):
+    latencies = []
+    start = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        mqttportabo.send_payload(topic(i), RECORD, wait=True)
+        latencies.append(time.perf_counter() - t0)
+    return time.perf_counter() - start, latencies
+
+
+async def bench_async(broker, count):
+    loop = asyncio.get_running_loop()
+    latencies = []
+
+    def acked(t0):
+        return lambda ack: latencies.append(loop.time() - t0)
+
+    start = time.perf_counter()
+    acks = []
+    for i in range(count):
+        ack = await mqttportabo.async_send_payload(topic(i), RECORD, wait=False)
+        ack.add_done_callback(acked(loop.time()))
+        acks.append(ack)
+    await asyncio.gather(*acks)
+    return time.perf_counter() - start, latencies
+
+
+async def bench_async_wait(broker, count):
+    latencies = []
+    start = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        await mqttportabo.async_send_payload(topic(i), RECORD, wait=True)
+        latencies.append(time.perf_counter() - t0)
+    return time.perf_counter() - start, latencies
+
+
+async def bench_reconnect(broker, rounds):
+    publisher = mqttportabo.get_publisher()
+    reconnects, first_acks = [], []
+    for _ in range(rounds):
+        before = publisher.stats["connects"]
+        t0 = time.perf_counter()
+        broker.drop_connections()
+        while publisher.stats["connects"] == before:
+            await asyncio.sleep(0.005)
+        reconnects.append(time.perf_counter() - t0)
+        await mqttportabo.async_send_payload(topic(0), RECORD, wait=True)
+        first_acks.append(time.perf_counter() - t0)
+    return reconnects, first_acks
+
+
+def run_mode(mode, broker, count):
+    if mode == "sync":
+        return bench_sync(broker, count)
+    if mode == "sync-wait":
+        return bench_sync_wait(broker, count)
+    if mode == "async":
+        return asyncio.run(bench_async(broker, count))
+    return asyncio.run(bench_async_wait(broker, count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--modes", default=",".join(MODES), help="comma separated subset of " + ", ".join(MODES))
+    parser.add_argument("--rtt-ms", type=float, default=20.0, help="simulated broker round trip")
+    parser.add_argument("--handshake-rtts", type=float, default=3.0, help="CONNACK delay in round trips")
+    parser.add_argument("--reconnects", type=int, default=3)
+    args = parser.parse_args()
+
+    rtt = args.rtt_ms / 1000.0
+    with StandInBroker(connect_delay=rtt * args.handshake_rtts, ack_delay=rtt) as broker, \
+            open(os.devnull, "w") as devnull:
+        mqttportabo.configure(broker.host, broker.port, tls=None, auth=None)
+        mqttportabo.get_publisher().wait_connected()
+        print(f"{args.messages} messages, rtt {args.rtt_ms:g} ms, payload format {mqttportabo.PAYLOAD_FORMAT}")
+        for mode in args.modes.split(","):
+            broker.received.clear()
+            with contextlib.redirect_stdout(devnull):
+                elapsed, latencies = run_mode(mode, broker, args.messages)
+            print(f"{mode:<11} {args.messages / elapsed:10.1f} msg/s   p50 {percentile(latencies, 50) * 1000:8.2f} ms"
+                  f"   p99 {percentile(latencies, 99) * 1000:8.2f} ms")
+
+        if args.reconnects:
+            with contextlib.redirect_stdout(devnull):
+                reconnects, first_acks = asyncio.run(bench_reconnect(broker, args.reconnects))
+            print(f"reconnect   mean {sum(reconnects) / len(reconnects) * 1000:8.1f} ms to CONNACK, "
+                  f"{sum(first_acks) / len(first_acks) * 1000:8.1f} ms to first ack "
+                  f"({len(reconnects)} drops)")
+        mqttportabo.get_publisher().stop()
+
+
+if __name__ == "__main__":
+    main()
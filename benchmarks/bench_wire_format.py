@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Size and encode/decode throughput of repr, JSON and the binary wire format.
+
+Before measuring, every generated payload and a set of edge cases (no
+RSSI, RSSI outside int8, naive timestamps with and without microseconds,
+a time zone, float extras) are checked to decode to exactly what was encoded.
+"""
+import argparse
+import ast
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wire_decoder import decode_payload, is_binary
+from wire_format import encode_payload
+
+UUIDS = [
+    "0000180f-0000-1000-8000-00805f9b34fb",
+    "0000fe9f-0000-1000-8000-00805f9b34fb",
+    "0000fd6f-0000-1000-8000-00805f9b34fb",
+    "9fa480e0-4967-4542-9390-d343dc5d04ae",
+]
+COMPANIES = {76: "Apple", 6: "Microsoft", 117: "Samsung", 224: "Google"}
+
+
+def make_record(rng):
+    uuids = rng.sample(UUIDS, rng.randint(0, 2))
+    companies = rng.sample(sorted(COMPANIES), rng.randint(0, 2))
+    return {
+        "name": rng.choice(["Unknown", "Galaxy Buds", "iPhone"]),
+        "mac": ":".join(f"{rng.randrange(256):02X}" for _ in range(6)),
+        "rssi": rng.randint(-100, -30),
+        "uuids": uuids,
+        "device_types": ["Unknown Device"] if not uuids else ["Battery Service"] * len(uuids),
+        "manufacturer_data": {str(c): rng.randbytes(rng.randint(4, 24)).hex() for c in companies},
+        "manufacturer_info": [COMPANIES[c] for c in companies],
+    }
+
+
+def make_payloads(count, batch, rng):
+    now = datetime(2024, 5, 1, 12, 0, 0)
+    if batch:
+        records = [{"topic": f"ble_devices/node/{r['mac']}", "data": r,
+                    "timestamp": (now + timedelta(milliseconds=i)).isoformat()}
+                   for i, r in enumerate(make_record(rng) for _ in range(batch))]
+        return [{"timestamp": now.isoformat(), "records": records} for _ in range(max(1, count // batch))]
+    return [{"data": make_record(rng), "timestamp": (now + timedelta(seconds=i)).isoformat()}
+            for i in range(count)]
+
+
+def edge_cases(rng):
+    """(payload, expected to stay binary) pairs the format must round-trip exactly."""
+    now = datetime(2024, 5, 1, 12, 0, 0, 123456)
+    cases = []
+    for rssi, binary in ((None, True), (-127, True), (127, True), (-128, False), (-130, False),
+                         (200, False), (-60.5, False)):
+        record = dict(make_record(rng), rssi=rssi)
+        cases.append(({"data": record, "timestamp": now.isoformat()}, binary))
+    for timestamp in (now, now.replace(microsecond=0), datetime(2024, 3, 31, 2, 30), datetime(1999, 12, 31, 23, 59, 59, 1)):
+        cases.append(({"data": make_record(rng), "timestamp": timestamp.isoformat()}, True))
+    cases.append(({"data": make_record(rng), "timestamp": "2024-05-01T12:00:00+02:00"}, False))
+    # extras as added by rssi_filter.annotate: floats that float32 cannot hold exactly, and ones it can
+    for smoothed, distance in ((-61.3, 2.71), (-60.5, 0.25), (-75.1, 1e300)):
+        record = dict(make_record(rng), rssi_smoothed=smoothed, distance_m=distance, adapter="hci1")
+        cases.append(({"data": record, "timestamp": now.isoformat()}, True))
+    records = [{"topic": f"ble_devices/node/{r['mac']}", "data": r,
+                "timestamp": (now + timedelta(microseconds=337 * i)).isoformat()}
+               for i, r in enumerate(make_record(rng) for _ in range(20))]
+    cases.append(({"timestamp": now.isoformat(), "records": records}, True))
+    return cases
+
+
+def check_round_trip(payloads, rng):
+    cases = [(payload, True) for payload in payloads] + edge_cases(rng)
+    for payload, binary in cases:
+        encoded = encode_payload(payload, "binary")
+        assert is_binary(encoded) == binary, f"expected {'binary' if binary else 'JSON'} for {payload}"
+        decoded = decode_payload(encoded)
+        assert decoded == payload, f"round trip changed the payload:\n{payload}\n{decoded}"
+    print(f"round trip: {len(cases)} payloads decoded exactly")
+
+
+DECODERS = {
+    "repr": ast.literal_eval,
+    "json": json.loads,
+    "binary": decode_payload,
+}
+
+
+def bench(fmt, payloads):
+    start = time.perf_counter()
+    encoded = [encode_payload(p, fmt) for p in payloads]
+    encode_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for data in encoded:
+        DECODERS[fmt](data)
+    decode_time = time.perf_counter() - start
+    size = sum(len(e.encode("utf-8") if isinstance(e, str) else e) for e in encoded)
+    return size / len(payloads), len(payloads) / encode_time, len(payloads) / decode_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=0, help="records per message (0 = single)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.messages, args.batch, random.Random(args.seed))
+    check_round_trip(payloads, random.Random(args.seed))
+    baseline = None
+    print(f"{'format':<8} {'bytes/msg':>10} {'ratio':>7} {'encode msg/s':>14} {'decode msg/s':>14}")
+    for fmt in ("repr", "json", "binary"):
+        size, encode_rate, decode_rate = bench(fmt, payloads)
+        baseline = baseline or size
+        print(f"{fmt:<8} {size:10.1f} {size / baseline:7.2f} {encode_rate:14.0f} {decode_rate:14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Crash of a full spool between overwriting the oldest records and the commit.
+
+A child process fills a small spool until it wraps, then is killed
+(os._exit, no msync, like a power cut with the page cache written back)
+inside an append that overwrites the oldest records, right before the
+append's final commit. The parent reopens the file and checks that the
+records the header still points to come back intact, in order, and that
+the spool keeps working. ``--damage`` additionally corrupts the head
+record, which must be skipped instead of emptying the spool.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spool import HEADER_SIZE, SLOT, SLOT_SIZE, Spool
+
+
+def child(path, capacity, messages):
+    spool = Spool(path, capacity=capacity, sync_interval=3600.0)
+    index = 0
+    while not spool.overwritten:
+        spool.append("t", f"message {index:06d}")
+        index += 1
+    for _ in range(messages):
+        spool.append("t", f"message {index:06d}")
+        index += 1
+    tail = spool.tail
+    commit = spool._commit
+
+    def crash():
+        if spool.tail != tail:  # novy zaznam uz je zapsany, zbyva jen commit
+            os._exit(9)
+        commit()
+
+    spool._commit = crash
+    spool.append("t", f"message {index:06d}-{'x' * 200}")  # delsi zaznam prepise vic starych
+    os._exit(1)  # sem se nedojde
+
+
+def header(path):
+    """(count, head) of the newest valid header slot, read without Spool."""
+    with open(path, "rb") as file:
+        data = file.read(2 * SLOT_SIZE)
+    slots = []
+    for offset in (0, SLOT_SIZE):
+        raw = data[offset:offset + SLOT.size]
+        if zlib.crc32(raw) == int.from_bytes(data[offset + SLOT.size:offset + SLOT_SIZE], "big"):
+            slots.append(SLOT.unpack(raw))
+    _, _, _, head, _, count = max(slots, key=lambda slot: slot[2])
+    return count, head
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--capacity", type=int, default=16 * 1024)
+    parser.add_argument("--messages", type=int, default=37, help="appends after the first wrap")
+    parser.add_argument("--damage", action="store_true", help="also corrupt the head record before reopening")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "spool.bin")
+        pid = os.fork()
+        if pid == 0:
+            child(path, args.capacity, args.messages)
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 9, "child did not stop at the commit"
+
+        committed, head = header(path)
+        if args.damage:
+            with open(path, "r+b") as file:
+                file.seek(HEADER_SIZE + head + 12)
+                file.write(b"\xff\xff")
+
+        spool = Spool(path, capacity=args.capacity)
+        records = spool.peek(len(spool))
+        numbers = [int(payload.split()[1].split("-")[0]) for _, payload in records]
+        assert len(records) >= committed - args.damage, f"only {len(records)} of {committed} records survived"
+        assert numbers == list(range(numbers[0], numbers[0] + len(numbers))), "records out of order"
+        spool.append("t", "after restart")
+        assert spool.peek(len(spool))[-1] == ("t", "after restart")
+        print(f"header committed {committed} records, reopened with {len(records)} "
+              f"(messages {numbers[0]}..{numbers[-1]}), appending works again")
+        spool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#kontinualni BLE skenovani - misto discover(10s) + sleep(30s)
+import asyncio
+import os
+import time
+
+from metrics import REGISTRY
+
+# "bleak" = skutecne radio, "synthetic" = generator zateze (ble_synthetic.py)
+SCANNER_BACKEND = os.environ.get("ATTENTID_SCANNER", "bleak")
+# HCI adaptery pro soubezne skenovani, napr. "hci0,hci1" (prazdne = jen vychozi adapter)
+ADAPTERS = [name for name in os.environ.get("ATTENTID_ADAPTERS", "").split(",") if name]
+
+
+def get_scanner_backend(name=None):
+    """Scanner class selected by ATTENTID_SCANNER; has start/stop and discover()."""
+    name = SCANNER_BACKEND if name is None else name
+    if name == "bleak":
+        from bleak import BleakScanner  # heavy (D-Bus backend), only when really scanning
+        return BleakScanner
+    if name == "synthetic":
+        from ble_synthetic import SyntheticScanner
+        return SyntheticScanner
+    raise ValueError(f"unknown scanner backend {name!r}")
+
+
+class Sighting:
+    """One received advertisement, shaped like the BLEDevice format_device_data() expects."""
+
+    __slots__ = ("address", "name", "rssi", "metadata", "timestamp", "adapter")
+
+    def __init__(self, address, name, rssi, uuids, manufacturer_data, timestamp, adapter=None):
+        self.address = address
+        self.name = name
+        self.rssi = rssi
+        self.metadata = {"uuids": uuids, "manufacturer_data": manufacturer_data}
+        self.timestamp = timestamp
+        self.adapter = adapter
+
+    @classmethod
+    def from_advertisement(cls, device, advertisement_data, timestamp=None, adapter=None):
+        return cls(device.address,
+                   advertisement_data.local_name or device.name,
+                   advertisement_data.rssi,
+                   advertisement_data.service_uuids,
+                   advertisement_data.manufacturer_data,
+                   time.time() if timestamp is None else timestamp,
+                   adapter)
+
+    def __repr__(self):
+        if self.adapter is not None:
+            return f"Sighting({self.address}, {self.name}, {self.rssi}, {self.adapter})"
+        return f"Sighting({self.address}, {self.name}, {self.rssi})"
+
+
+class AdvertisementStream:
+    """Persistent BleakScanner feeding an async queue of Sightings.
+
+    The scanner never stops, so there is no blind window between cycles.
+    A device that advertises again while it is still queued only refreshes
+    its queued sighting, and a device is emitted at most once per
+    ``min_interval`` seconds, so a 10 Hz phone cannot flood the uplink. If
+    consumers fall behind, new devices beyond ``maxsize`` are dropped and
+    counted in ``dropped``. Callables in ``listeners`` see every single
+    advertisement before throttling.
+
+    With ``adapters`` (default: ATTENTID_ADAPTERS) one scanner runs per HCI
+    adapter, all feeding the same queue, so the merged stream stays in
+    arrival order. Sightings carry the adapter name; when another adapter
+    hears a queued device within ``dedup_window`` seconds, that is the same
+    advertisement and only the stronger copy is kept (``duplicates``).
+
+        async with AdvertisementStream() as stream:
+            async for sighting in stream:
+                ...
+    """
+
+    def __init__(self, maxsize=1000, min_interval=1.0, scanner_factory=None, adapters=None,
+                 dedup_window=0.2, **scanner_kwargs):
+        self.maxsize = maxsize
+        self.min_interval = min_interval
+        self.scanner_factory = get_scanner_backend() if scanner_factory is None else scanner_factory
+        self.adapters = list(ADAPTERS if adapters is None else adapters)
+        self.dedup_window = dedup_window
+        self.scanner_kwargs = scanner_kwargs
+        self.received = 0
+        self.dropped = 0
+        self.duplicates = 0
+        self.received_by_adapter = dict.fromkeys(self.adapters, 0)
+        self.listeners = []
+        self.scanners = []
+        self._queue = None
+        self._latest = {}
+        self._last_emit = {}
+        self._prune_at = 4 * maxsize
+        REGISTRY.counter_function("attentid_advertisements_total", "Advertisements received by the scanners",
+                                  lambda: self.received)
+        REGISTRY.counter_function("attentid_stream_dropped_total", "Sightings dropped because the stream queue was full",
+                                  lambda: self.dropped)
+        REGISTRY.counter_function("attentid_stream_duplicates_total", "Same advertisement heard by another adapter",
+                                  lambda: self.duplicates)
+        REGISTRY.gauge("attentid_stream_queue", "Sightings waiting to be published", self.qsize)
+
+    def _make_scanner(self, adapter):
+        if adapter is None:
+            return self.scanner_factory(detection_callback=self._on_detect, **self.scanner_kwargs)
+
+        def callback(device, advertisement_data):
+            self._on_detect(device, advertisement_data, adapter)
+        return self.scanner_factory(detection_callback=callback, adapter=adapter, **self.scanner_kwargs)
+
+    async def start(self):
+        self._queue = asyncio.Queue(self.maxsize)
+        self.scanners = [self._make_scanner(adapter) for adapter in self.adapters or [None]]
+        await asyncio.gather(*(scanner.start() for scanner in self.scanners))
+        return self
+
+    async def stop(self):
+        scanners, self.scanners = self.scanners, []
+        await asyncio.gather(*(scanner.stop() for scanner in scanners), return_exceptions=True)
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        address = await self._queue.get()
+        return self._latest.pop(address)
+
+    def qsize(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _on_detect(self, device, advertisement_data, adapter=None):
+        self.received += 1
+        sighting = Sighting.from_advertisement(device, advertisement_data, adapter=adapter)
+        if adapter is not None:
+            self.received_by_adapter[adapter] += 1
+        for listener in self.listeners:
+            listener(sighting)
+        address = sighting.address
+        queued = self._latest.get(address)
+        if queued is not None:
+            if queued.adapter != adapter and sighting.timestamp - queued.timestamp < self.dedup_window:
+                self.duplicates += 1
+                if (sighting.rssi or -128) <= (queued.rssi or -128):
+                    return
+            self._latest[address] = sighting
+            return
+        if sighting.timestamp - self._last_emit.get(address, 0.0) < self.min_interval:
+            return
+        try:
+            self._queue.put_nowait(address)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        self._latest[address] = sighting
+        self._last_emit[address] = sighting.timestamp
+        if len(self._last_emit) > self._prune_at:
+            self._prune(sighting.timestamp)
+
+    def _prune(self, now):
+        horizon = now - self.min_interval
+        self._last_emit = {a: t for a, t in self._last_emit.items() if t >= horizon}
+        self._prune_at = max(4 * self.maxsize, 2 * len(self._last_emit))
@@ -0,0 +1,175 @@
+#synteticky BLE skener - generator zateze misto skutecneho radia (mereni, testy bez hardwaru)
+import asyncio
+import os
+import random
+import struct
+import time
+from collections import namedtuple
+
+from adv_decoder import ATTENTID_COMPANY_ID
+from ble_stream import Sighting
+
+# Vychozi populace pro ATTENTID_SCANNER=synthetic
+SYNTH_DEVICES = int(os.environ.get("ATTENTID_SYNTH_DEVICES", "200"))
+SYNTH_ADV_RATE = float(os.environ.get("ATTENTID_SYNTH_ADV_RATE", "1.0"))  # reklam za sekundu na zarizeni
+SYNTH_ROTATION = float(os.environ.get("ATTENTID_SYNTH_ROTATION", "0"))  # s do zmeny MAC, 0 = nikdy
+SYNTH_SEED = os.environ.get("ATTENTID_SYNTH_SEED")
+# bez zadaneho seedu sdileji vsechny skenery v procesu stejnou populaci (vice adapteru slysi stejna zarizeni)
+_PROCESS_SEED = random.randrange(2 ** 32)
+
+# company ID -> podil zarizeni (None = bez manufacturer data)
+MANUFACTURER_MIX = {76: 0.45, 6: 0.10, 117: 0.15, 224: 0.05, 89: 0.03, None: 0.22}
+# service UUID -> podil zarizeni (None = bez UUID)
+UUID_MIX = {
+    "0000fe9f-0000-1000-8000-00805f9b34fb": 0.10,
+    "0000fd6f-0000-1000-8000-00805f9b34fb": 0.10,
+    "0000180f-0000-1000-8000-00805f9b34fb": 0.05,
+    "9fa480e0-4967-4542-9390-d343dc5d04ae": 0.05,
+    None: 0.70,
+}
+
+# same fields format_device_data()/Sighting read from bleak's objects
+SyntheticDevice = namedtuple("SyntheticDevice", ("address", "name"))
+SyntheticAdvertisement = namedtuple("SyntheticAdvertisement",
+                                    ("local_name", "rssi", "service_uuids", "manufacturer_data"))
+
+
+def random_mac(rng):
+    """Random private BLE address (top bits 01 like a resolvable private address)."""
+    first = 0x40 | rng.randrange(0x40)
+    return ":".join(f"{b:02X}" for b in [first] + [rng.randrange(256) for _ in range(5)])
+
+
+class _Device:
+    __slots__ = ("address", "name", "base_rssi", "uuids", "manufacturer_data", "rotate_at", "mac_rng")
+
+
+class SyntheticScanner:
+    """Drop-in replacement for BleakScanner that invents advertisements.
+
+    ``devices`` devices advertise ``adv_rate`` times per second each (with
+    RSSI noise around a per-device level). With ``rotation_interval`` > 0
+    every device changes its MAC about that often, like phones with
+    private addresses do. Manufacturer data and service UUIDs are drawn
+    from ``manufacturer_mix`` / ``uuid_mix``; ``user_ratio`` of devices
+    also carry an AttentID user ID (see adv_decoder). Usable as
+    ``scanner_factory`` of AdvertisementStream/PresenceScanner and, through
+    ``discover()``, in place of ``BleakScanner.discover``.
+
+    Scanners with the same ``seed`` simulate the same population, so
+    several of them with different ``adapter`` names behave like adapters
+    in one room: same devices and MAC rotations, independent RSSI noise,
+    each hearing a ``coverage`` share of the devices.
+    """
+
+    def __init__(self, detection_callback=None, devices=None, adv_rate=None, rotation_interval=None,
+                 manufacturer_mix=None, uuid_mix=None, user_ratio=0.0, rssi_noise=4.0,
+                 tick=0.01, seed=None, adapter=None, coverage=1.0, **kwargs):
+        self.detection_callback = detection_callback
+        self.adv_rate = SYNTH_ADV_RATE if adv_rate is None else adv_rate
+        self.rotation_interval = SYNTH_ROTATION if rotation_interval is None else rotation_interval
+        self.manufacturer_mix = MANUFACTURER_MIX if manufacturer_mix is None else manufacturer_mix
+        self.uuid_mix = UUID_MIX if uuid_mix is None else uuid_mix
+        self.user_ratio = user_ratio
+        self.rssi_noise = rssi_noise
+        self.tick = tick
+        if seed is None:
+            seed = int(SYNTH_SEED) if SYNTH_SEED is not None else _PROCESS_SEED
+        self.adapter = adapter
+        self.emitted = 0
+        self.rotations = 0
+        self._task = None
+        self._next = 0
+        population = random.Random(seed)
+        now = time.monotonic()
+        devices = [self._make_device(population, now, f"{seed}-{index}")
+                   for index in range(SYNTH_DEVICES if devices is None else devices)]
+        self.rng = random.Random(f"{seed}-{adapter}")
+        if coverage < 1.0:
+            devices = [device for device in devices if self.rng.random() < coverage]
+        self._devices = devices
+
+    def _make_device(self, rng, now, mac_seed):
+        device = _Device()
+        device.address = random_mac(rng)
+        device.name = f"Synthetic {rng.randrange(10000):04d}" if rng.random() < 0.2 else None
+        device.base_rssi = rng.uniform(-95, -40)
+        uuid = rng.choices(list(self.uuid_mix), weights=list(self.uuid_mix.values()))[0]
+        device.uuids = [uuid] if uuid else []
+        device.manufacturer_data = {}
+        company = rng.choices(list(self.manufacturer_mix), weights=list(self.manufacturer_mix.values()))[0]
+        if company is not None:
+            device.manufacturer_data[company] = rng.randbytes(rng.randint(2, 24))
+        if rng.random() < self.user_ratio:
+            device.manufacturer_data[ATTENTID_COMPANY_ID] = struct.pack("<I", rng.getrandbits(32))
+        # MAC rotations come from a per-device generator, identical for every adapter
+        device.mac_rng = random.Random(mac_seed)
+        device.rotate_at = self._rotation_deadline(now, device.mac_rng)
+        return device
+
+    def _rotation_deadline(self, now, rng):
+        if self.rotation_interval <= 0:
+            return float("inf")
+        return now + rng.uniform(0.5, 1.5) * self.rotation_interval
+
+    @property
+    def addresses(self):
+        """Current MAC of every simulated device."""
+        return [device.address for device in self._devices]
+
+    def advertise(self, count, now=None):
+        """Emit ``count`` advertisements round-robin over the population."""
+        now = time.monotonic() if now is None else now
+        rng, devices, callback = self.rng, self._devices, self.detection_callback
+        for _ in range(count):
+            device = devices[self._next]
+            self._next = (self._next + 1) % len(devices)
+            if now >= device.rotate_at:
+                device.address = random_mac(device.mac_rng)
+                device.rotate_at = self._rotation_deadline(now, device.mac_rng)
+                self.rotations += 1
+            advertisement = SyntheticAdvertisement(
+                device.name, round(device.base_rssi + rng.gauss(0, self.rssi_noise)),
+                device.uuids, device.manufacturer_data)
+            self.emitted += 1
+            if callback is not None:
+                callback(SyntheticDevice(device.address, device.name), advertisement)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        rate = self.adv_rate * len(self._devices)
+        last, credit = loop.time(), 0.0
+        while True:
+            await asyncio.sleep(self.tick)
+            now = loop.time()
+            credit += rate * (now - last)
+            last = now
+            if credit >= 1:
+                self.advertise(int(credit))
+                credit -= int(credit)
+
+    async def start(self):
+        if self._devices and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    @classmethod
+    async def discover(cls, timeout=5.0, **kwargs):
+        """Like BleakScanner.discover: the devices seen during ``timeout`` seconds."""
+        seen = {}
+
+        def collect(device, advertisement):
+            seen[device.address] = Sighting.from_advertisement(device, advertisement)
+
+        scanner = cls(detection_callback=collect, **kwargs)
+        await scanner.start()
+        try:
+            await asyncio.sleep(timeout)
+        finally:
+            await scanner.stop()
+        return list(seen.values())
@@ -0,0 +1,83 @@
+#rekonstrukce uplnych zaznamu z delta rezimu uplinku (strana konzumenta, bez zavislosti)
+"""Reference decoder for delta-encoded device payloads.
+
+With ATTENTID_DELTA_KEYFRAME = N the uplink sends per device::
+
+    keyframe  {"data": {...full record..., "seq": s}, "timestamp": ...}
+    delta     {"m": mac, "s": seq, "t": ms since the device's last keyframe,
+               "d": {...changed fields...},
+               "r": [...fields gone since the last message...]}   (only when non-empty)
+
+A keyframe goes out for a new device, every N messages of a device and
+after every reconnect to the broker; everything in between is a delta
+against the previous message of the same MAC. ``seq`` counts the messages
+of a device (modulo 2**31). Keyframes are plain records with one extra
+field, so consumers that ignore deltas keep working. In batch mode the
+same objects appear as ``records`` entries next to their ``topic``.
+Rebuilt timestamps have millisecond resolution.
+
+A delta whose ``seq`` does not follow the last one of its device means a
+lost message: the device is dropped until its next keyframe. A repeated
+``seq`` (QoS 1 redelivery) is ignored.
+"""
+from datetime import datetime, timedelta
+
+from wire_decoder import decode_payload
+
+SEQ_MASK = 0x7FFFFFFF
+DELTA_KEYS = frozenset("msdrt")
+
+
+class DeltaDecoder:
+    """Keeps the last full record per MAC and applies deltas to it."""
+
+    def __init__(self):
+        self.stats = {"keyframes": 0, "deltas": 0, "plain": 0, "gaps": 0, "duplicates": 0}
+        self._devices = {}  # mac -> [seq, record, keyframe timestamp]
+
+    def __len__(self):
+        return len(self._devices)
+
+    def decode(self, payload):
+        """Full ``{"data", "timestamp"}`` payload, or None when it cannot be rebuilt (yet)."""
+        if "d" not in payload:
+            record = dict(payload["data"])
+            seq = record.pop("seq", None)
+            if seq is None:
+                self.stats["plain"] += 1  # delta mode off on the node
+            else:
+                self.stats["keyframes"] += 1
+                self._devices[record["mac"]] = [seq, record, datetime.fromisoformat(payload["timestamp"])]
+            return {**payload, "data": record}
+
+        mac, seq = payload["m"], payload["s"]
+        state = self._devices.get(mac)
+        if state is not None and seq == state[0]:
+            self.stats["duplicates"] += 1
+            return None
+        if state is None or seq != (state[0] + 1) & SEQ_MASK:
+            self.stats["gaps"] += 1
+            self._devices.pop(mac, None)
+            return None
+
+        record = dict(state[1])
+        record.update(payload["d"])
+        for key in payload.get("r", ()):
+            record.pop(key, None)
+        state[0], state[1] = seq, record
+        self.stats["deltas"] += 1
+        result = {key: value for key, value in payload.items() if key not in DELTA_KEYS}
+        result["data"] = record
+        result["timestamp"] = (state[2] + timedelta(milliseconds=payload["t"])).isoformat()
+        return result
+
+    def decode_message(self, message):
+        """Decode a single payload or a batch; returns the list of rebuilt payloads."""
+        if "records" in message:
+            return [payload for payload in map(self.decode, message["records"]) if payload is not None]
+        payload = self.decode(message)
+        return [] if payload is None else [payload]
+
+    def decode_bytes(self, data):
+        """Like ``decode_message`` for a raw MQTT payload (JSON or binary, see wire_decoder)."""
+        return self.decode_message(decode_payload(data))
@@ -0,0 +1,75 @@
+#delta rezim uplinku: uplny zaznam jen jako keyframe, jinak pouze zmenena pole (format viz delta_decoder)
+from collections import OrderedDict
+from datetime import datetime
+
+from delta_decoder import SEQ_MASK
+
+
+class DeltaEncoder:
+    """Turns per-device ``{"data", "timestamp"}`` payloads into keyframes and deltas.
+
+    Every device starts with a keyframe and gets another one after
+    ``keyframe_interval`` deltas; in between only the fields that differ
+    from its previous message are sent (see delta_decoder for the layout).
+    ``generation()``, e.g. the publisher's connect count, is checked on
+    every message: when it changes all devices restart with a keyframe, so
+    a consumer that lost messages during an outage resynchronizes at once.
+    At most ``max_devices`` devices are remembered (LRU); a forgotten
+    device simply gets a keyframe again.
+    """
+
+    def __init__(self, keyframe_interval=10, max_devices=4096, generation=None):
+        self.keyframe_interval = keyframe_interval
+        self.max_devices = max_devices
+        self.generation = generation
+        self.stats = {"keyframes": 0, "deltas": 0, "resets": 0}
+        self._generation = None
+        # mac -> [seq, deltas since keyframe, last record, keyframe timestamp]
+        self._devices = OrderedDict()
+
+    def __len__(self):
+        return len(self._devices)
+
+    def reset(self):
+        """Forget all devices; the next message of each is a keyframe."""
+        self._devices.clear()
+        self.stats["resets"] += 1
+
+    def encode(self, payload):
+        record = payload["data"]
+        if self.generation is not None:
+            generation = self.generation()
+            if generation != self._generation:
+                if self._generation is not None:
+                    self.reset()
+                self._generation = generation
+
+        mac = record["mac"]
+        state = self._devices.get(mac)
+        if state is None or state[1] >= self.keyframe_interval:
+            seq = 0 if state is None else (state[0] + 1) & SEQ_MASK
+            keyframe_time = datetime.fromisoformat(payload["timestamp"])
+            if state is None:
+                self._devices[mac] = [seq, 0, record, keyframe_time]
+                if len(self._devices) > self.max_devices:
+                    self._devices.popitem(last=False)
+            else:
+                self._devices.move_to_end(mac)
+                state[:] = [seq, 0, record, keyframe_time]
+            self.stats["keyframes"] += 1
+            return {**payload, "data": {**record, "seq": seq}}
+
+        self._devices.move_to_end(mac)
+        previous = state[2]
+        seq = (state[0] + 1) & SEQ_MASK
+        changed = {key: value for key, value in record.items() if key not in previous or previous[key] != value}
+        removed = [key for key in previous if key not in record]
+        state[0], state[1], state[2] = seq, state[1] + 1, record
+        self.stats["deltas"] += 1
+
+        elapsed = datetime.fromisoformat(payload["timestamp"]) - state[3]
+        result = {key: value for key, value in payload.items() if key not in ("data", "timestamp")}
+        result.update(m=mac, s=seq, t=round(elapsed.total_seconds() * 1000), d=changed)
+        if removed:
+            result["r"] = removed
+        return result
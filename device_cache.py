@@ -0,0 +1,79 @@
+#cache posledniho odeslaneho stavu zarizeni - neposilat to, co se nezmenilo
+import time
+from collections import OrderedDict
+
+from macaddr import normalize_mac
+
+
+class ChangeCache:
+    """Bounded per-device state cache that decides whether a record is worth publishing.
+
+    A record is published when the device is new (or its entry expired after
+    ``ttl`` seconds without a sighting), when RSSI moved by at least
+    ``rssi_delta`` dBm since the last publish, when its UUIDs or
+    manufacturer data changed, or when ``keepalive`` seconds passed since the
+    last publish. Entries are kept in LRU order and at most ``max_entries``
+    of them exist, so rotating random addresses cannot grow memory.
+
+    ``should_publish`` only decides; the caller reports a record with
+    ``mark_published`` once its publish was accepted, so a record whose
+    send failed is offered again instead of being suppressed.
+    """
+
+    def __init__(self, max_entries=4096, ttl=300.0, rssi_delta=6, keepalive=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.rssi_delta = rssi_delta
+        self.keepalive = keepalive
+        self.stats = {"published": 0, "suppressed": 0, "evicted": 0, "expired": 0}
+        # mac -> [rssi, uuids, manufacturer_data, last_published, last_seen]
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def should_publish(self, record, now=None):
+        """Whether a format_device_data record differs enough from the last published one."""
+        now = time.monotonic() if now is None else now
+        mac = normalize_mac(record["mac"])
+        entry = self._entries.get(mac)
+        if entry is not None and now - entry[4] > self.ttl:
+            del self._entries[mac]
+            self.stats["expired"] += 1
+            entry = None
+        if entry is None:
+            return True
+
+        self._entries.move_to_end(mac)
+        entry[4] = now
+        rssi = record["rssi"]
+        unchanged = (entry[1] == tuple(sorted(record["uuids"]))
+                     and entry[2] == tuple(sorted(record["manufacturer_data"].items()))
+                     and now - entry[3] < self.keepalive
+                     and (rssi is None or entry[0] is None or abs(rssi - entry[0]) < self.rssi_delta))
+        if unchanged:
+            self.stats["suppressed"] += 1
+            return False
+        return True
+
+    def mark_published(self, record, now=None):
+        """Remember a record whose publish was accepted."""
+        now = time.monotonic() if now is None else now
+        mac = normalize_mac(record["mac"])
+        self._entries[mac] = [record["rssi"], tuple(sorted(record["uuids"])),
+                              tuple(sorted(record["manufacturer_data"].items())), now, now]
+        self._entries.move_to_end(mac)
+        self._evict(now)
+        self.stats["published"] += 1
+
+    def _evict(self, now):
+        # the front of the OrderedDict is always the least recently seen device
+        while self._entries:
+            mac, entry = next(iter(self._entries.items()))
+            if now - entry[4] > self.ttl:
+                self.stats["expired"] += 1
+            elif len(self._entries) > self.max_entries:
+                self.stats["evicted"] += 1
+            else:
+                break
+            del self._entries[mac]
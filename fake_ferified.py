@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
 
 import asyncio
-from bleak import BleakScanner
-from mqttportabo import send_payload
+from ble_stream import AdvertisementStream, get_scanner_backend
+import profiling
+from macaddr import normalize_mac
+from pipeline import Uplink, run_streaming
+from scheduler import make_scheduler
+from sig_tables import get_device_type, get_manufacturer_info
 import os
+import sys
 from datetime import datetime
 
 # Hardcoded UUIDs
@@ -25,57 +30,6 @@ def get_raspberry_uuid():
         return "default-raspberry-uuid-1234"
 
 # Helper functions
-def is_working_hours():
-    """Checks if current time is within working hours (7:00 - 19:00)"""
-    current_hour = datetime.now().hour
-    return 7 <= current_hour < 19
-
-def normalize_mac(mac_address):
-    """Normalize MAC address to uppercase with colons."""
-    if not mac_address:
-        return None
-    return mac_address.upper().replace("-", ":")
-
-# Device type detection
-KNOWN_DEVICE_UUIDS = {
-    "0000180f-0000-1000-8000-00805f9b34fb": "Battery Service",
-    "0000180a-0000-1000-8000-00805f9b34fb": "Device Information",
-    "0000fe9f-0000-1000-8000-00805f9b34fb": "Google Fast Pair",
-    "0000fd6f-0000-1000-8000-00805f9b34fb": "Windows Device",
-    "9fa480e0-4967-4542-9390-d343dc5d04ae": "Apple Device"
-}
-
-def get_device_type(uuids):
-    """Determines device type based on UUIDs"""
-    device_types = []
-    for uuid in uuids:
-        if uuid.lower() in KNOWN_DEVICE_UUIDS:
-            device_types.append(KNOWN_DEVICE_UUIDS[uuid.lower()])
-    return device_types if device_types else ["Unknown Device"]
-
-def get_manufacturer_info(manufacturer_data):
-    """Identifies manufacturer and device type from manufacturer_data"""
-    manufacturer_info = []
-    manufacturer_mapping = {
-        76: "Apple", 
-        6: "Microsoft",
-        117: "Samsung",
-        224: "Google",
-        89: "Sony",
-        15: "Intel",
-        2: "IBM",
-        48: "Nokia",
-        85: "Qualcomm",
-        72: "Broadcom",
-        112: "Huawei",
-        208: "Xiaomi",
-        240: "Oppo",
-        200: "Vivo",
-    }
-    for key, value in manufacturer_data.items():
-        manufacturer_info.append(manufacturer_mapping.get(key, f"Unknown Manufacturer (ID: {key})"))
-    return manufacturer_info
-
 def format_device_data(device):
     """Formats device data into structure for MQTT"""
     uuids = device.metadata.get("uuids", [])
@@ -91,84 +45,111 @@ def format_device_data(device):
         "manufacturer_info": get_manufacturer_info(device.metadata.get("manufacturer_data", {}))
     }
 
-async def scan_and_send():
+def make_topic_selector(raspberry_uuid):
+    def select_topic(device_address):
+        # Normalize MAC for topic
+        normalized_device_mac = normalize_mac(device_address)
+
+        # Always add our fake verified user to the device list
+        if normalized_device_mac == FAKE_VERIFIED_MAC:
+            topic = f"ble_devices/{raspberry_uuid}/{normalized_device_mac}/overenaadresa_uzivatele/{FAKE_USER_UUID}"
+            print(f"✅ Device {device_address} is our fake verified user. Sending to MQTT: {topic}")
+        else:
+            topic = f"ble_devices/{raspberry_uuid}/{normalized_device_mac}"
+            print(f"✅ Sending device {device_address} to MQTT: {topic}")
+        return topic
+    return select_topic
+
+def make_uplink():
     # Get or set Raspberry UUID
     raspberry_uuid = get_raspberry_uuid()
     print(f"🆔 Using Raspberry UUID: {raspberry_uuid}")
     print(f"👤 Using Fake User UUID: {FAKE_USER_UUID}")
     print(f"✓ Verified device MAC: {FAKE_VERIFIED_MAC}")
+    return raspberry_uuid, Uplink(format_device_data, make_topic_selector(raspberry_uuid),
+                                  node_topic=f"ble_devices/{raspberry_uuid}/batch",
+                                  health_topic=f"ble_devices/{raspberry_uuid}/health",
+                                  occupancy_topic=f"ble_devices/{raspberry_uuid}/occupancy")
+
+async def send_fake_device(uplink, raspberry_uuid):
+    print(f"➕ Adding fake verified device {FAKE_VERIFIED_MAC}")
+    fake_topic = f"ble_devices/{raspberry_uuid}/{normalize_mac(FAKE_VERIFIED_MAC)}/overenaadresa_uzivatele/{FAKE_USER_UUID}"
+    fake_payload = {
+        "data": {
+            "name": "Fake Verified Device",
+            "mac": FAKE_VERIFIED_MAC,
+            "rssi": -65,
+            "uuids": [],
+            "device_types": ["Simulated Device"],
+            "manufacturer_data": {},
+            "manufacturer_info": ["Simulated Manufacturer"]
+        },
+        "timestamp": datetime.now().isoformat()
+    }
+    try:
+        await uplink.send(fake_topic, fake_payload)
+        print(f"✅ Sent fake verified device to MQTT: {fake_topic}")
+    except Exception as e:
+        print(f"❌ Error sending fake verified device: {e}")
+
+async def stream_and_send():
+    """Continuous scanning; the fake verified device is injected every 30 s."""
+    raspberry_uuid, uplink = make_uplink()
+
+    async def inject_fake_device():
+        while True:
+            await send_fake_device(uplink, raspberry_uuid)
+            await asyncio.sleep(30)
+
+    injector = asyncio.create_task(inject_fake_device())
+    try:
+        await run_streaming(uplink, AdvertisementStream())
+    finally:
+        injector.cancel()
+
+async def scan_and_send():
+    raspberry_uuid, uplink = make_uplink()
+    uplink.start_metrics()
+    profiling.install()
+    scheduler = make_scheduler()
     
     while True:
-        # Uncomment this block if you want to respect working hours
-        '''
-        if not is_working_hours():
-            print("⏰ Outside working hours (7:00-19:00), waiting...")
-            await asyncio.sleep(60)
-            continue
-        '''
-        
+        await scheduler.wait_active()
+
         try:
             print("🔍 Starting BLE scanning...")
-            devices = await BleakScanner.discover(timeout=10.0)
+            devices = await scheduler.scan(get_scanner_backend().discover)
 
             if not devices:
                 print("❌ No BLE devices found.")
-                await asyncio.sleep(30)
+                await scheduler.rest()
                 continue
 
             # Limit to 5 devices only
             devices = devices[:5]
             print(f"✅ Found 5 devices")
 
-            for device in devices:
-                device_data = format_device_data(device)
-                payload = {
-                    "data": device_data,
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-                device_types = device_data["device_types"]
-                print(f"📱 Device {device.address} (RSSI: {device.rssi}) type: {', '.join(device_types)}")
-
-                # Normalize MAC for topic
-                normalized_device_mac = normalize_mac(device.address)
-                
-                # Always add our fake verified user to the device list
-                if device.address == FAKE_VERIFIED_MAC or device.address.replace("-", ":") == FAKE_VERIFIED_MAC:
-                    topic = f"ble_devices/{raspberry_uuid}/{normalized_device_mac}/overenaadresa_uzivatele/{FAKE_USER_UUID}"
-                    print(f"✅ Device {device.address} is our fake verified user. Sending to MQTT: {topic}")
-                else:
-                    topic = f"ble_devices/{raspberry_uuid}/{normalized_device_mac}"
-                    print(f"✅ Sending device {device.address} to MQTT: {topic}")
+            uplink.observe(devices)
 
+            for device in devices:
                 try:
-                    send_payload(topic, payload)
+                    device_data = await uplink.submit(device)
                 except Exception as e:
                     print(f"❌ Error sending data to MQTT for {device.address}: {e}")
+                    continue
+                device_types = device_data["device_types"]
+                print(f"📱 Device {device.address} (RSSI: {device.rssi}) type: {', '.join(device_types)}")
 
             # Add the fake verified device if not already in the list
             if not any(normalize_mac(d.address) == normalize_mac(FAKE_VERIFIED_MAC) for d in devices):
-                print(f"➕ Adding fake verified device {FAKE_VERIFIED_MAC}")
-                fake_topic = f"ble_devices/{raspberry_uuid}/{normalize_mac(FAKE_VERIFIED_MAC)}/overenaadresa_uzivatele/{FAKE_USER_UUID}"
-                fake_payload = {
-                    "data": {
-                        "name": "Fake Verified Device",
-                        "mac": FAKE_VERIFIED_MAC,
-                        "rssi": -65,
-                        "uuids": [],
-                        "device_types": ["Simulated Device"],
-                        "manufacturer_data": {},
-                        "manufacturer_info": ["Simulated Manufacturer"]
-                    },
-                    "timestamp": datetime.now().isoformat()
-                }
-                try:
-                    send_payload(fake_topic, fake_payload)
-                    print(f"✅ Sent fake verified device to MQTT: {fake_topic}")
-                except Exception as e:
-                    print(f"❌ Error sending fake verified device: {e}")
+                await send_fake_device(uplink, raspberry_uuid)
 
-            await asyncio.sleep(30)
+            # in batch mode the whole cycle goes out as one message
+            await uplink.flush()
+            if uplink.cache is not None:
+                print(f"🔕 Unchanged devices suppressed so far: {uplink.cache.stats['suppressed']}")
+
+            await scheduler.rest()
 
         except Exception as e:
             print(f"❌ Error during scanning or processing: {e}")
@@ -177,4 +158,7 @@ async def scan_and_send():
 if __name__ == "__main__":
     print("🚀 Starting BLE monitoring with fake verified user...")
     print("🔑 Working with hardcoded user UUID")
-    asyncio.run(scan_and_send())
\ No newline at end of file
+    if "--stream" in sys.argv:
+        asyncio.run(stream_and_send())
+    else:
+        asyncio.run(scan_and_send())
\ No newline at end of file
@@ -0,0 +1,166 @@
+#prijem zapisu do GATT charakteristiky: zaznamy pevne delky v ring bufferu, davkove predani do overovani
+import asyncio
+import os
+import struct
+import threading
+
+from adv_decoder import ATTENTID_COMPANY_ID, LAYOUTS, UserMessage, decode
+from metrics import REGISTRY
+
+GATT_RING_SIZE = int(os.environ.get("ATTENTID_GATT_RING", "8192"))  # zaznamu
+GATT_BATCH = int(os.environ.get("ATTENTID_GATT_BATCH", "256"))
+GATT_ON_FULL = os.environ.get("ATTENTID_GATT_ON_FULL", "drop_new")
+
+RECORD = struct.Struct("<6sI")  # MAC, user ID
+MAC_SIZE = 6
+NO_MAC = bytes(MAC_SIZE)
+
+
+def parse_write(value):
+    """(claimed mac bytes, user ID) of one GATT write, None when it is malformed.
+
+    The value is the same frame the app puts in its advertisement (see
+    adv_decoder.UserMessage), optionally followed by a 6-byte MAC
+    (NO_MAC when it is missing). The MAC is not an identity: bless hands
+    the write callback only the characteristic and the value, not the
+    address of the connected peer, a phone cannot know its rotating
+    private address, and anyone can write any MAC. It is passed on as an
+    unverified claim and never bound to the user (see prijimac.handle_claim).
+    """
+    record = decode(ATTENTID_COMPANY_ID, value)
+    if record is None or type(record) is not UserMessage:
+        return None
+    end = LAYOUTS[ATTENTID_COMPANY_ID].size
+    if len(value) < end + MAC_SIZE:
+        return NO_MAC, record.uuid_uzivatele
+    return bytes(value[end:end + MAC_SIZE]), record.uuid_uzivatele
+
+
+def format_mac(mac):
+    return ":".join(f"{b:02X}" for b in mac)
+
+
+class RecordRing:
+    """Bounded ring of fixed-size struct records in one preallocated bytearray.
+
+    ``push`` may be called from any number of threads and from the event
+    loop; it packs the record under a short lock and never waits. When the
+    ring is full ``on_full`` drops either the new record (``"drop_new"``) or
+    the oldest one (``"drop_oldest"``). A single consumer takes records in
+    batches with ``get_batch``: the bytes are copied under the lock and
+    unpacked outside it, and the consumer's loop is only woken when it is
+    actually waiting.
+    """
+
+    def __init__(self, capacity=8192, record=RECORD, on_full="drop_new"):
+        if on_full not in ("drop_new", "drop_oldest"):
+            raise ValueError(f"unknown on_full policy {on_full!r}")
+        self.capacity = capacity
+        self.record = record
+        self.on_full = on_full
+        self.stats = {"pushed": 0, "dropped": 0, "taken": 0, "batches": 0}
+        self._buffer = bytearray(capacity * record.size)
+        self._head = 0  # records ever taken (or dropped from the front)
+        self._tail = 0  # records ever pushed
+        self._lock = threading.Lock()
+        self._waiter = None
+        self._loop = None
+        self._loop_thread = None
+
+    def __len__(self):
+        return self._tail - self._head
+
+    def push(self, *fields):
+        with self._lock:
+            if self._tail - self._head >= self.capacity:
+                self.stats["dropped"] += 1
+                if self.on_full == "drop_new":
+                    return False
+                self._head += 1
+            self.record.pack_into(self._buffer, (self._tail % self.capacity) * self.record.size, *fields)
+            self._tail += 1
+            self.stats["pushed"] += 1
+            waiter, self._waiter = self._waiter, None
+        if waiter is not None:
+            if threading.get_ident() == self._loop_thread:
+                _wake(waiter)
+            else:
+                self._loop.call_soon_threadsafe(_wake, waiter)
+        return True
+
+    def take(self, max_records):
+        """Up to ``max_records`` records in push order, without waiting."""
+        size = self.record.size
+        with self._lock:
+            count = min(max_records, self._tail - self._head)
+            if not count:
+                return []
+            start = (self._head % self.capacity) * size
+            end = start + count * size
+            if end <= len(self._buffer):
+                chunk = bytes(self._buffer[start:end])
+            else:
+                chunk = bytes(self._buffer[start:]) + bytes(self._buffer[:end - len(self._buffer)])
+            self._head += count
+        self.stats["taken"] += count
+        self.stats["batches"] += 1
+        return list(self.record.iter_unpack(chunk))
+
+    async def get_batch(self, max_records):
+        """Wait for records and return up to ``max_records`` of them."""
+        while True:
+            batch = self.take(max_records)
+            if batch:
+                return batch
+            loop = asyncio.get_running_loop()
+            with self._lock:
+                if self._tail != self._head:
+                    continue
+                self._loop, self._loop_thread = loop, threading.get_ident()
+                self._waiter = waiter = loop.create_future()
+            await waiter
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class GattIngest:
+    """GATT writes -> RecordRing -> verification pool.
+
+    ``on_write(value)`` is what the BLE write callback calls: it
+    parses the frame and pushes one record, nothing else. ``run()`` drains
+    the ring in batches of ``batch_size`` into ``pool.submit(mac, user)``,
+    a CoalescingWorkerPool like the one prijimac feeds from advertisements
+    (built with ``make_verify_pool(handle_claim)``, since the MAC is only
+    a claim), so repeated writes of one phone are merged there as well.
+    """
+
+    def __init__(self, pool, capacity=GATT_RING_SIZE, batch_size=GATT_BATCH, on_full=GATT_ON_FULL):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.ring = RecordRing(capacity, RECORD, on_full)
+        self.malformed = 0
+        ring = self.ring
+        REGISTRY.counter_function("attentid_gatt_writes_total", "GATT writes queued for verification",
+                                  lambda: ring.stats["pushed"])
+        REGISTRY.counter_function("attentid_gatt_dropped_total", "GATT writes dropped because the ring was full",
+                                  lambda: ring.stats["dropped"])
+        REGISTRY.counter_function("attentid_gatt_malformed_total", "GATT writes that did not parse",
+                                  lambda: self.malformed)
+        REGISTRY.gauge("attentid_gatt_ring", "GATT writes waiting in the ring", ring.__len__)
+
+    def on_write(self, value):
+        parsed = parse_write(value)
+        if parsed is None:
+            self.malformed += 1
+            return False
+        return self.ring.push(*parsed)
+
+    async def run(self):
+        ring, pool, batch_size = self.ring, self.pool, self.batch_size
+        while True:
+            for mac, uuid_uzivatele in await ring.get_batch(batch_size):
+                pool.submit(format_mac(mac), uuid_uzivatele)
+            await asyncio.sleep(0)  # let the verification workers run between batches
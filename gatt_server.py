@@ -1,28 +1,58 @@
 import asyncio
-from bleak import BleakServer
+import os
+
+import profiling
+from gatt_ingest import GattIngest
+from prijimac import handle_claim, make_verify_pool
 
 # Define the GATT service and characteristic UUIDs
 SERVICE_UUID = "12345678-1234-5678-1234-56789abcdef0"
 CHARACTERISTIC_UUID = "12345678-1234-5678-1234-56789abcdef1"
+GATT_NAME = os.environ.get("ATTENTID_GATT_NAME", "AttentID")
+
+_ingest = None
 
 # Callback for when data is written to the characteristic
-async def write_callback(sender, data):
-    print(f"Received data: {data}")
-    # Here you can forward the data to prijimac.py or process it as needed
+def write_callback(characteristic, value, **kwargs):
+    """
+    Called by the BLE stack for every write; only parses and queues the
+    value (see gatt_ingest), verification runs later in the worker pool.
+    bless does not tell who wrote, so a MAC in the value is only a claim.
+    """
+    if _ingest is not None:
+        _ingest.on_write(value)
 
 # Define the GATT server
 async def run_server():
-    server = BleakServer()
-    await server.add_service(SERVICE_UUID, "Custom Service")
-    await server.add_characteristic(
+    global _ingest
+    from bless import BlessServer, GATTAttributePermissions, GATTCharacteristicProperties
+
+    profiling.install()
+    pool = make_verify_pool(handle_claim)
+    _ingest = GattIngest(pool)
+    drain = asyncio.create_task(_ingest.run())
+
+    server = BlessServer(name=GATT_NAME, loop=asyncio.get_running_loop())
+    server.write_request_func = write_callback
+    await server.add_new_service(SERVICE_UUID)
+    await server.add_new_characteristic(
         SERVICE_UUID,
         CHARACTERISTIC_UUID,
-        "Write Characteristic",
-        write=True,
-        on_write=write_callback,
+        GATTCharacteristicProperties.write | GATTCharacteristicProperties.write_without_response,
+        None,
+        GATTAttributePermissions.writeable,
     )
-    print("GATT server is running...")
     await server.start()
+    print("GATT server is running...")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        drain.cancel()
+        await pool.close()
+        print(f"GATT server stopped. Ingest stats: {_ingest.ring.stats}, malformed: {_ingest.malformed}, "
+              f"verification stats: {pool.stats}")
 
 # Run the server
-asyncio.run(run_server())
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(run_server())
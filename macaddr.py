@@ -0,0 +1,8 @@
+#normalizace MAC adres - jedina kopie, ostatni moduly ji importuji
+
+
+def normalize_mac(mac_address):
+    """Normalize MAC address to uppercase with colons."""
+    if not mac_address:
+        return None
+    return mac_address.upper().replace("-", ":")
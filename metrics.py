@@ -0,0 +1,226 @@
+#lehke metriky pipeline: Prometheus text na lokalnim HTTP portu + souhrn do MQTT (node health)
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+
+# 0 = HTTP endpoint vypnuty
+METRICS_PORT = int(os.environ.get("ATTENTID_METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("ATTENTID_METRICS_HOST", "127.0.0.1")
+# perioda zpravy o stavu uzlu v sekundach, 0 = neposilat
+HEALTH_INTERVAL = float(os.environ.get("ATTENTID_HEALTH_INTERVAL", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DURATION_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 1.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class Counter:
+    """Monotonic count; ``inc`` is one attribute update."""
+
+    __slots__ = ("name", "help", "value")
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def get(self):
+        return self.value
+
+
+class Gauge:
+    """Current value, either set by the caller or read from ``function`` at scrape time."""
+
+    __slots__ = ("name", "help", "value", "function")
+    kind = "gauge"
+
+    def __init__(self, name, help, function=None):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.function = function
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.function() if self.function is not None else self.value
+
+
+class CounterFunction(Gauge):
+    """Counter whose value is kept elsewhere (e.g. a stats dict) and read at scrape time."""
+
+    __slots__ = ()
+    kind = "counter"
+
+
+class Histogram:
+    """Fixed-bucket histogram: ``observe`` is a bisect and two additions."""
+
+    __slots__ = ("name", "help", "bounds", "counts", "sum")
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def get(self):
+        return sum(self.counts)
+
+    def _bucket(self, q):
+        total = sum(self.counts)
+        if not total:
+            return None
+        rank, seen = q * total, 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return index
+        return len(self.bounds)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile (None when empty).
+
+        Above the last bound the highest finite bound is returned (a lower
+        limit then, see ``overflows``), so the value stays valid JSON.
+        """
+        index = self._bucket(q)
+        if index is None or not self.bounds:
+            return None
+        return self.bounds[min(index, len(self.bounds) - 1)]
+
+    def overflows(self, q):
+        """Whether the ``q`` quantile lies above the last bucket bound."""
+        index = self._bucket(q)
+        return index is not None and index == len(self.bounds)
+
+
+class Registry:
+    """Named metrics of one process. Registering a name again replaces the metric."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help):
+        return self._add(Counter(name, help))
+
+    def gauge(self, name, help, function=None):
+        return self._add(Gauge(name, help, function))
+
+    def counter_function(self, name, help, function):
+        return self._add(CounterFunction(name, help, function))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, buckets))
+
+    def _collect(self):
+        with self._lock:
+            return list(self.metrics.values())
+
+    def render(self):
+        """Prometheus text exposition format 0.0.4."""
+        lines = []
+        for metric in self._collect():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if metric.kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(metric.bounds, metric.counts):
+                    cumulative += count
+                    lines.append(f'{metric.name}_bucket{{le="{bound:g}"}} {cumulative}')
+                cumulative += metric.counts[-1]
+                lines.append(f'{metric.name}_bucket{{le="+Inf"}} {cumulative}')
+                lines.append(f"{metric.name}_sum {metric.sum:.6g}")
+                lines.append(f"{metric.name}_count {cumulative}")
+            else:
+                try:
+                    value = metric.get()
+                except Exception:
+                    continue  # the object behind a function metric is gone
+                lines.append(f"{metric.name} {value:g}" if isinstance(value, float) else f"{metric.name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self, prefix="attentid_"):
+        """Compact dict for the node-health message: values, histograms as count/p50/p99.
+
+        ``"overflow": true`` marks a histogram whose p99 is above its last
+        bucket, p99 (and possibly p50) is then only that bound.
+        """
+        values = {}
+        for metric in self._collect():
+            name = metric.name[len(prefix):] if metric.name.startswith(prefix) else metric.name
+            if metric.kind == "histogram":
+                count = metric.get()
+                values[name] = {"n": count, "p50": metric.quantile(0.5), "p99": metric.quantile(0.99)} if count else {"n": 0}
+                if count and metric.overflows(0.99):
+                    values[name]["overflow"] = True
+            else:
+                try:
+                    values[name] = metric.get()
+                except Exception:
+                    continue
+        return values
+
+
+REGISTRY = Registry()
+
+
+def serve(registry=REGISTRY, port=METRICS_PORT, host=METRICS_HOST):
+    """Serve ``registry.render()`` on http://host:port/metrics from a daemon thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # not needed unless serving
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scrapes are not worth a line on the console
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"📊 Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+async def publish_health(send, topic, interval=HEALTH_INTERVAL, registry=REGISTRY):
+    """Every ``interval`` seconds ``await send(topic, payload)`` with a registry snapshot."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await send(topic, {
+                "timestamp": datetime.now().isoformat(),
+                "uptime": round(time.time() - registry.started),
+                "metrics": registry.snapshot(),
+            })
+        except Exception as e:
+            print(f"❌ Error sending node health: {e}")
@@ -0,0 +1,300 @@
+#dlouhodobe MQTT spojeni sdilene vsemi skenovacimi smyckami
+import asyncio
+import itertools
+import ssl
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+EARLY_ACK_TTL = 5.0  # ack predbehne registraci zpravy jen o mikrosekundy, starsi je z jineho spojeni
+
+
+class PublishError(Exception):
+    """Raised when a message cannot be handed over to any broker connection."""
+
+
+class SessionReusingContext(ssl.SSLContext):
+    """SSL context that offers the last TLS session on every new handshake.
+
+    paho does not expose TLS session resumption, but it wraps every socket
+    through the context it was given, so the cached session is injected here.
+    The session is refreshed by MqttPublisher after each successful connect.
+    """
+
+    session = None
+
+    def wrap_socket(self, sock, *args, **kwargs):
+        if self.session is not None and not kwargs.get("server_side", False):
+            try:
+                return super().wrap_socket(sock, *args, session=self.session, **kwargs)
+            except ValueError:
+                # session from an incompatible context, do a full handshake
+                self.session = None
+        return super().wrap_socket(sock, *args, **kwargs)
+
+
+def make_tls_context(tls_version=ssl.PROTOCOL_TLSv1_2, ca_certs=None, insecure=False):
+    """Client TLS context equivalent to paho's tls_set(), with session reuse."""
+    context = SessionReusingContext(ssl.PROTOCOL_TLS_CLIENT)
+    if tls_version == ssl.PROTOCOL_TLSv1_2:
+        context.minimum_version = ssl.TLSVersion.TLSv1_2
+        context.maximum_version = ssl.TLSVersion.TLSv1_2
+    if ca_certs:
+        context.load_verify_locations(ca_certs)
+    else:
+        context.load_default_certs()
+    if insecure:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class MqttPublisher:
+    """Pool of persistent, authenticated MQTT connections.
+
+    Every connection runs its own paho network thread, reconnects on its own
+    with exponential backoff and keeps at most ``max_inflight`` unacknowledged
+    QoS>0 messages on the wire (further messages wait in paho's queue, which is
+    capped by ``max_queued``). When a connection drops, the acknowledgement
+    callbacks of its unacknowledged messages are called with a PublishError:
+    paho may still deliver them after the reconnect, so the outcome is
+    unknown (at-least-once senders publish them again).
+    """
+
+    def __init__(self, hostname, port=8883, auth=None, tls=None, client_id="",
+                 connections=1, qos=1, max_inflight=20, max_queued=1000,
+                 keepalive=60, reconnect_delay=(1, 60)):
+        self.hostname = hostname
+        self.port = port
+        self.auth = auth
+        self.client_id = client_id
+        self.qos = qos
+        self.keepalive = keepalive
+        self.tls_context = None
+        if tls is not None:
+            self.tls_context = tls if isinstance(tls, ssl.SSLContext) else make_tls_context(**tls)
+
+        self.stats = {"published": 0, "acked": 0, "failed": 0,
+                      "connects": 0, "disconnects": 0, "session_reused": 0}
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._early_acks = {}  # (client, mid) -> cas prijeti
+        self._inflight = 0
+        self._connected = set()
+        self._started = False
+
+        self._clients = []
+        for index in range(max(1, connections)):
+            cid = client_id if connections <= 1 or not client_id else f"{client_id}-{index}"
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=cid,
+                                 protocol=mqtt.MQTTv311)
+            if auth:
+                client.username_pw_set(auth.get("username"), auth.get("password"))
+            if self.tls_context is not None:
+                client.tls_set_context(self.tls_context)
+            client.max_inflight_messages_set(max_inflight)
+            client.max_queued_messages_set(max_queued)
+            client.reconnect_delay_set(*reconnect_delay)
+            client.on_connect = self._on_connect
+            client.on_disconnect = self._on_disconnect
+            client.on_publish = self._on_publish
+            self._clients.append(client)
+        self._round_robin = itertools.cycle(range(len(self._clients)))
+
+    def start(self):
+        """Connect all pooled clients in the background (never blocks on DNS/TLS)."""
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+        for client in self._clients:
+            client.connect_async(self.hostname, self.port, self.keepalive)
+            client.loop_start()
+        return self
+
+    def wait_connected(self, timeout=10.0):
+        """Block until at least one connection is up. Returns True on success."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._connected:
+                return True
+            time.sleep(0.01)
+        return bool(self._connected)
+
+    def is_connected(self):
+        return bool(self._connected)
+
+    def _pick_client(self):
+        for _ in range(len(self._clients)):
+            client = self._clients[next(self._round_robin)]
+            if id(client) in self._connected:
+                return client
+        # nothing connected: QoS>0 messages wait in paho's queue until reconnect
+        return self._clients[next(self._round_robin)]
+
+    def publish(self, topic, payload, qos=None, retain=False, callback=None):
+        """Queue one message on a pooled connection.
+
+        ``callback(error)`` is called from the network thread once the broker
+        acknowledged the message (``error`` is None) -- for QoS 0 as soon as it
+        was written to the socket. Raises PublishError when the message was not
+        accepted at all.
+        """
+        if not self._started:
+            self.start()
+        qos = self.qos if qos is None else qos
+        client = self._pick_client()
+        info = client.publish(topic, payload, qos=qos, retain=retain)
+
+        if info.rc == mqtt.MQTT_ERR_QUEUE_SIZE or (info.rc == mqtt.MQTT_ERR_NO_CONN and qos == 0):
+            self.stats["failed"] += 1
+            raise PublishError(f"MQTT publish failed: {mqtt.error_string(info.rc)}")
+        self.stats["published"] += 1
+
+        # every message is registered, so an ack that races ahead of this
+        # point is parked in _early_acks and picked up here
+        key = (id(client), info.mid)
+        with self._lock:
+            parked = self._early_acks.pop(key, None)
+            acked = parked is not None and time.monotonic() - parked < EARLY_ACK_TTL
+            if not acked:
+                self._callbacks[key] = callback
+                self._inflight += 1
+        if acked and callback is not None:
+            callback(None)
+        return info
+
+    def pending(self):
+        """Number of messages not yet acknowledged by the broker."""
+        return self._inflight
+
+    def flush(self, timeout=5.0):
+        """Wait until all queued messages are acknowledged or the timeout expires."""
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.pending() == 0
+
+    def stop(self, timeout=5.0):
+        """Flush pending messages and close all connections."""
+        if not self._started:
+            return
+        self.flush(timeout)
+        for client in self._clients:
+            client.disconnect()
+            client.loop_stop()
+        self._started = False
+        self._connected.clear()
+
+    # paho callbacks, executed in the network threads
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            print(f"❌ MQTT connect refused: {reason_code}")
+            return
+        self._connected.add(id(client))
+        self.stats["connects"] += 1
+        sock = client.socket()
+        if isinstance(sock, ssl.SSLSocket) and isinstance(self.tls_context, SessionReusingContext):
+            if sock.session_reused:
+                self.stats["session_reused"] += 1
+            if sock.session is not None:
+                self.tls_context.session = sock.session
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        self._connected.discard(id(client))
+        self.stats["disconnects"] += 1
+        # mid se po 65535 zpravach opakuje - stare zaznamy by patrily cizim zpravam
+        with self._lock:
+            lost = [key for key in self._callbacks if key[0] == id(client)]
+            callbacks = [self._callbacks.pop(key) for key in lost]
+            self._inflight -= len(lost)
+            self._early_acks = {key: parked for key, parked in self._early_acks.items()
+                                if key[0] != id(client)}
+        error = PublishError(f"MQTT connection lost before the ack: {reason_code}")
+        for callback in callbacks:
+            if callback is not None:
+                callback(error)
+
+    def _on_publish(self, client, userdata, mid, reason_code, properties):
+        self.stats["acked"] += 1
+        key = (id(client), mid)
+        with self._lock:
+            if key in self._callbacks:
+                callback = self._callbacks.pop(key)
+                self._inflight -= 1
+            else:
+                callback = None
+                now = time.monotonic()
+                if len(self._early_acks) >= 1024:  # acky zprav zapomenutych pri vypadku spojeni
+                    self._early_acks = {key: parked for key, parked in self._early_acks.items()
+                                        if now - parked < EARLY_ACK_TTL}
+                self._early_acks[key] = now
+        if callback is not None:
+            callback(None)
+
+
+class AsyncPublisher:
+    """asyncio front end of MqttPublisher that never blocks the event loop.
+
+    Messages go through a bounded submission queue drained by a pump task;
+    paho does the network I/O in its own threads and acks come back to the
+    loop through ``call_soon_threadsafe``. Backpressure:
+
+    * ``await publish(...)`` suspends the caller while the queue is full,
+    * ``publish_nowait(...)`` raises ``asyncio.QueueFull`` instead, so the
+      caller decides whether to drop the message.
+
+    Both return a future that resolves to None on broker ack or raises
+    PublishError when paho refused the message (its own queue is full).
+    """
+
+    def __init__(self, publisher, maxsize=500):
+        self.publisher = publisher
+        self.queue = asyncio.Queue(maxsize)
+        self.loop = asyncio.get_running_loop()
+        self._pump_task = self.loop.create_task(self._pump())
+
+    def publish_nowait(self, topic, payload, qos=None):
+        ack = self.loop.create_future()
+        self.queue.put_nowait((topic, payload, qos, ack))
+        return ack
+
+    async def publish(self, topic, payload, qos=None):
+        ack = self.loop.create_future()
+        await self.queue.put((topic, payload, qos, ack))
+        return ack
+
+    async def join(self):
+        """Wait until everything submitted so far was handed over to paho."""
+        await self.queue.join()
+
+    async def close(self):
+        await self.join()
+        self._pump_task.cancel()
+
+    def _resolve(self, ack, error):
+        if ack.done():
+            return
+        if error is None:
+            ack.set_result(None)
+        else:
+            ack.set_exception(error)
+
+    def _resolve_threadsafe(self, ack, error):
+        try:
+            self.loop.call_soon_threadsafe(self._resolve, ack, error)
+        except RuntimeError:
+            pass  # loop already closed, nobody is waiting for the ack
+
+    async def _pump(self):
+        while True:
+            topic, payload, qos, ack = await self.queue.get()
+            try:
+                self.publisher.publish(topic, payload, qos=qos,
+                                       callback=lambda error, ack=ack: self._resolve_threadsafe(ack, error))
+            except Exception as e:  # PublishError, invalid topic, ...
+                self._resolve(ack, e)
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,160 @@
+#lokalni nahrada MQTT brokeru pro mereni odesilani bez mqtt.portabo.cz
+import asyncio
+import struct
+import threading
+import time
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def _encode_length(length):
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        out.append(byte)
+        if not length:
+            return bytes(out)
+
+
+class StandInBroker:
+    """Minimal in-process MQTT 3.1.1 broker (no routing, no persistence).
+
+    Accepts any client, acknowledges QoS 1/2 publishes and answers pings.
+    ``connect_delay`` delays the CONNACK and ``ack_delay`` every PUBACK/PUBREC,
+    which lets a plain local TCP socket model the handshake and round-trip
+    cost of a remote TLS broker. Runs its own event loop in a daemon thread so
+    it can serve synchronous clients such as paho.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, connect_delay=0.0, ack_delay=0.0,
+                 ssl_context=None):
+        self.host = host
+        self.port = port
+        self.connect_delay = connect_delay
+        self.ack_delay = ack_delay
+        self.ssl_context = ssl_context
+        self.connections = 0
+        self.received = []  # (timestamp, topic, payload_length, qos)
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._handlers = {}
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port, ssl=self.ssl_context))
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="mqtt-standin", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        if self._loop is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            for writer in list(self._handlers.values()):
+                writer.transport.abort()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop = None
+
+    def drop_connections(self):
+        """Abort every client connection, like a network outage would."""
+        def abort():
+            for writer in list(self._handlers.values()):
+                writer.transport.abort()
+        self._loop.call_soon_threadsafe(abort)
+
+    def wait_for(self, count, timeout=10.0):
+        """Block until ``count`` publishes were received. Returns True on success."""
+        deadline = time.monotonic() + timeout
+        while len(self.received) < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return len(self.received) >= count
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    async def _read_packet(self, reader):
+        header = (await reader.readexactly(1))[0]
+        multiplier, length = 1, 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await reader.readexactly(length) if length else b""
+        return header, body
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        task = asyncio.current_task()
+        self._handlers[task] = writer
+        try:
+            while True:
+                header, body = await self._read_packet(reader)
+                kind = header >> 4
+                if kind == CONNECT:
+                    if self.connect_delay:
+                        await asyncio.sleep(self.connect_delay)
+                    writer.write(bytes((CONNACK << 4, 2, 0, 0)))
+                elif kind == PUBLISH:
+                    qos = (header >> 1) & 0x03
+                    topic_length = struct.unpack_from("!H", body)[0]
+                    topic = body[2:2 + topic_length].decode("utf-8", "replace")
+                    offset = 2 + topic_length
+                    if qos:
+                        mid = body[offset:offset + 2]
+                        offset += 2
+                    self.received.append((time.time(), topic, len(body) - offset, qos))
+                    if qos:
+                        ack = bytes(((PUBACK if qos == 1 else PUBREC) << 4, 2)) + mid
+                        if self.ack_delay:
+                            # acks stay pipelined, like a real round trip
+                            asyncio.get_running_loop().call_later(self.ack_delay, writer.write, ack)
+                        else:
+                            writer.write(ack)
+                elif kind == PUBREL:
+                    writer.write(bytes((PUBCOMP << 4, 2)) + body[:2])
+                elif kind == SUBSCRIBE:
+                    granted, offset = bytearray(), 2
+                    while offset < len(body):
+                        offset += 2 + struct.unpack_from("!H", body, offset)[0]
+                        granted.append(min(body[offset], 1))
+                        offset += 1
+                    payload = body[:2] + bytes(granted)
+                    writer.write(bytes((SUBACK << 4,)) + _encode_length(len(payload)) + payload)
+                elif kind == UNSUBSCRIBE:
+                    writer.write(bytes((UNSUBACK << 4, 2)) + body[:2])
+                elif kind == PINGREQ:
+                    writer.write(bytes((PINGRESP << 4, 0)))
+                elif kind == DISCONNECT:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._handlers.pop(task, None)
+            writer.close()
@@ -1,37 +1,270 @@
 #mqtt spojeni a odesilani
-import paho.mqtt.publish as publish
-import paho.mqtt.client as mqtt
+import asyncio
+import atexit
+import os
 import ssl
-import numpy as np
+import threading
+
+from metrics import REGISTRY
+from mqtt_publisher import AsyncPublisher, MqttPublisher, PublishError
+from spool import Spool, replay, replay_blocking
+from wire_format import encode_payload
+
+# broker jde prepsat promennymi prostredi (lokalni broker pro testy a mereni, viz mqtt_standin.py)
+MQTT_HOST = os.environ.get("ATTENTID_MQTT_HOST", "mqtt.portabo.cz")
+MQTT_PORT = int(os.environ.get("ATTENTID_MQTT_PORT", "8883"))
+MQTT_TLS = os.environ.get("ATTENTID_MQTT_TLS", "1") == "1"
+MQTT_CA_CERTS = os.environ.get("ATTENTID_MQTT_CA_CERTS") or None
 
 auth = {
-  'username':"rv-catcher",
-  'password':"D6U5ERM7VAIdh7vaCa4fg6Leh"
+  'username':os.environ.get("ATTENTID_MQTT_USERNAME", "rv-catcher"),
+  'password':os.environ.get("ATTENTID_MQTT_PASSWORD", "D6U5ERM7VAIdh7vaCa4fg6Leh")
 }
+if not auth['username']:
+    auth = None
 
 tls = {
-  'tls_version':ssl.PROTOCOL_TLSv1_2
-}
+  'tls_version':ssl.PROTOCOL_TLSv1_2,
+  'ca_certs':MQTT_CA_CERTS
+} if MQTT_TLS else None
 
-##Pridame z tridy videoprocesor z cyklostezka
-def send_payload(topic, payload):
-    print("Send to MQTT.portabo.cz")
+MQTT_CLIENT_ID = "RomanVaibarHailoCounter"
+MQTT_CONNECTIONS = 1  # pocet soubeznych spojeni v poolu
+MQTT_QOS = 1
+ASYNC_QUEUE_SIZE = 500  # max zprav cekajicich na predani paho
+ACK_TIMEOUT = float(os.environ.get("ATTENTID_MQTT_ACK_TIMEOUT", "10"))  # jak dlouho ceka wait=True na potvrzeni
+# format zpravy: "repr" (puvodni str(dict)), "json" nebo "binary" (viz wire_decoder.py)
+PAYLOAD_FORMAT = os.environ.get("ATTENTID_PAYLOAD_FORMAT", "repr")
+# diskova fronta pro vypadky spojeni (prazdna cesta = vypnuto), velikost v MB je pevna
+SPOOL_PATH = os.environ.get("ATTENTID_SPOOL_PATH", "")
+SPOOL_MB = int(os.environ.get("ATTENTID_SPOOL_MB", "32"))
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+PUBLISH_LATENCY = REGISTRY.histogram("attentid_publish_latency_seconds",
+                                     "Time from async_send_payload to the broker's acknowledgement")
+PUBLISH_FAILURES = REGISTRY.counter("attentid_publish_failures_total", "Messages the broker did not accept or acknowledge")
+SPOOLED = REGISTRY.counter("attentid_spooled_total", "Messages stored in the spool instead of being published")
+# objekty vznikaji az pri prvnim pouziti (a configure je zahodi), do te doby 0
+REGISTRY.gauge("attentid_mqtt_connected", "1 while at least one broker connection is up",
+               lambda: int(_publisher.is_connected()) if _publisher is not None else 0)
+REGISTRY.gauge("attentid_publish_queue", "Messages waiting for the MQTT client",
+               lambda: _async_publisher.queue.qsize() if _async_publisher is not None else 0)
+REGISTRY.gauge("attentid_publish_inflight", "Messages handed to the MQTT client and not yet acknowledged",
+               lambda: _publisher.pending() if _publisher is not None else 0)
+REGISTRY.gauge("attentid_spool_records", "Messages waiting in the spool",
+               lambda: len(_spool) if _spool is not None else 0)
+
+
+def get_publisher():
+    """Sdileny publisher - spojeni se otevira jednou a dal se jen pouziva."""
+    global _publisher
+    with _publisher_lock:
+        if _publisher is None:
+            _publisher = MqttPublisher(MQTT_HOST, MQTT_PORT,
+                                       auth=auth,
+                                       tls=tls,
+                                       client_id=MQTT_CLIENT_ID,
+                                       connections=MQTT_CONNECTIONS,
+                                       qos=MQTT_QOS).start()
+            atexit.register(_publisher.stop)
+        return _publisher
+
+
+_UNSET = object()
+
+
+def configure(host=None, port=None, tls=_UNSET, auth=_UNSET):
+    """Prepoji odesilani na jiny broker; existujici spojeni se zavre.
+
+    ``tls`` a ``auth`` maji stejny tvar jako globalni promenne modulu
+    (None = bez TLS / bez prihlaseni).
+    """
+    global MQTT_HOST, MQTT_PORT, _publisher, _async_publisher, _replay_task
+    current = globals()
+    with _publisher_lock:
+        old, _publisher = _publisher, None
+        if host is not None:
+            MQTT_HOST = host
+        if port is not None:
+            MQTT_PORT = port
+        if tls is not _UNSET:
+            current["tls"] = tls
+        if auth is not _UNSET:
+            current["auth"] = auth
+    _async_publisher = None
+    _stop_replay_thread()
+    if _replay_task is not None:
+        try:
+            _replay_task.get_loop().call_soon_threadsafe(_replay_task.cancel)
+        except RuntimeError:
+            pass  # loop already closed
+        _replay_task = None
+    if old is not None:
+        old.stop()
+
+
+_spool = None
+
+
+def get_spool():
+    """Sdileny spool, nebo None kdyz neni nastaven ATTENTID_SPOOL_PATH."""
+    global _spool
+    if _spool is None and SPOOL_PATH:
+        _spool = Spool(SPOOL_PATH, capacity=SPOOL_MB * 1024 * 1024)
+        atexit.register(_spool.close)
+    return _spool
+
+
+def _should_spool():
+    """Po ztrate spojeni, nebo dokud se nedohani fronta na disku (zachova poradi zprav).
+
+    Pred prvnim pripojenim se spojeni teprve navazuje a zpravy cekaji ve
+    fronte paho, do spoolu jdou az po vypadku navazaneho spojeni.
+    """
+    spool = get_spool()
+    if spool is None:
+        return False
+    publisher = get_publisher()
+    return len(spool) > 0 or (publisher.stats["connects"] > 0 and not publisher.is_connected())
+
+
+_replay_thread = None
+_replay_stop = None
+
+
+def _replaying():
+    """Bezi uz nekde vyprazdnovani spoolu? (vzdy jen jedno, jinak by se zpravy posilaly dvakrat)"""
+    return ((_replay_task is not None and not _replay_task.done())
+            or (_replay_thread is not None and _replay_thread.is_alive()))
+
+
+def _start_replay_thread():
+    """Vyprazdnovani spoolu pro synchronni send_payload, ktery nema event loop."""
+    global _replay_thread, _replay_stop
+    if get_spool() is None or _replaying():
+        return
+    _replay_stop = threading.Event()
+    _replay_thread = threading.Thread(
+        target=replay_blocking, args=(get_spool(), get_publisher(), get_publisher().is_connected, _replay_stop),
+        name="spool-replay", daemon=True)
+    _replay_thread.start()
+
+
+def _stop_replay_thread():
+    global _replay_thread
+    if _replay_thread is not None:
+        _replay_stop.set()
+        _replay_thread = None
+
+
+def _prepare(topic, payload):
     topic="/rv-catcher/"+topic  #mame pravo posilat jen do topicu zacinajiciho /rv-catcher/
     print(topic)
     print(payload)
-    data_do_DCUK_all = publish.single(topic, 
-            payload = str(payload),
-            hostname = "mqtt.portabo.cz",
-            client_id = "RomanVaibarHailoCounter",
-            auth = auth,
-            tls = tls,
-            port = 8883,
-            protocol = mqtt.MQTTv311)
+    return topic, encode_payload(payload, PAYLOAD_FORMAT)
+
+
+##Pridame z tridy videoprocesor z cyklostezka
+def send_payload(topic, payload, wait=False):
+    print("Send to MQTT.portabo.cz")
+    topic, data = _prepare(topic, payload)
+    _start_replay_thread()
+    if _should_spool():
+        get_spool().append(topic, data)
+        SPOOLED.inc()
+        print("💾 Broker unreachable, message stored in spool")
+        return None
+    #zprava jde do fronty trvaleho spojeni, zadny novy TLS handshake
+    try:
+        data_do_DCUK_all = get_publisher().publish(topic, data)
+    except PublishError:
+        PUBLISH_FAILURES.inc()
+        if get_spool() is None:
+            raise
+        get_spool().append(topic, data)
+        SPOOLED.inc()
+        return None
+    if wait:
+        data_do_DCUK_all.wait_for_publish(timeout=ACK_TIMEOUT)
     print(data_do_DCUK_all)
+    return data_do_DCUK_all
+
+
+_async_publisher = None
+_replay_task = None
+
+
+def get_async_publisher():
+    """AsyncPublisher pro prave bezici event loop (nad sdilenym publisherem)."""
+    global _async_publisher, _replay_task
+    loop = asyncio.get_running_loop()
+    if _async_publisher is None or _async_publisher.loop is not loop:
+        _async_publisher = AsyncPublisher(get_publisher(), maxsize=ASYNC_QUEUE_SIZE)
+        _stop_replay_thread()  # event loop prebira vyprazdnovani spoolu
+        if get_spool() is not None and (_replay_task is None or _replay_task.done()):
+            _replay_task = loop.create_task(
+                replay(get_spool(), _async_publisher, get_publisher().is_connected))
+    return _async_publisher
+
+
+def _log_failed_ack(ack):
+    if not ack.cancelled() and ack.exception() is not None:
+        print(f"❌ MQTT message was not delivered: {ack.exception()}")
+
+
+def _spool_failed(topic, data):
+    def callback(ack):
+        if not ack.cancelled() and ack.exception() is not None:
+            get_spool().append(topic, data)
+            SPOOLED.inc()
+    return callback
+
+
+def _measure_ack(loop, start):
+    def callback(ack):
+        if ack.cancelled() or ack.exception() is not None:
+            PUBLISH_FAILURES.inc()
+        else:
+            PUBLISH_LATENCY.observe(loop.time() - start)
+    return callback
+
+
+async def async_send_payload(topic, payload, wait=True):
+    """Neblokujici varianta send_payload.
+
+    Pri plne fronte ceka na volne misto. S wait=True vraci az po potvrzeni
+    brokerem (nejdele ACK_TIMEOUT sekund, pak TimeoutError), s wait=False hned
+    po zarazeni do fronty (chyby se jen vypisi).
+    Se zapnutym spoolem jdou zpravy pri vypadku (a nedorucene zpravy) na disk.
+    """
+    print("Send to MQTT.portabo.cz")
+    topic, data = _prepare(topic, payload)
+    publisher = get_async_publisher()
+    if _should_spool():
+        get_spool().append(topic, data)
+        SPOOLED.inc()
+        print("💾 Broker unreachable, message stored in spool")
+        ack = publisher.loop.create_future()
+        ack.set_result(None)
+        return ack
+    start = publisher.loop.time()
+    ack = await publisher.publish(topic, data)
+    ack.add_done_callback(_measure_ack(publisher.loop, start))
+    if get_spool() is not None:
+        ack.add_done_callback(_spool_failed(topic, data))
+    if wait:
+        # shield: po vyprseni zprava dal ceka na ack (a pripadne jde do spoolu)
+        await asyncio.wait_for(asyncio.shield(ack), ACK_TIMEOUT)
+    else:
+        ack.add_done_callback(_log_failed_ack)
+    return ack
 
 
 # Funkce pro konverzi klíčů na int
 def convert_keys_to_int(d):
+    import numpy as np  # jen kvuli teto funkci, import stoji na Pi sekundy
     if isinstance(d, dict):
         return {int(k) if isinstance(k, np.integer) else k: convert_keys_to_int(v) for k, v in d.items()}
     elif isinstance(d, list):
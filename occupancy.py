@@ -0,0 +1,186 @@
+#agregace obsazenosti na uzlu: souhrn za minutu misto (nebo vedle) jednotlivych zaznamu zarizeni
+import base64
+import hashlib
+import time
+from datetime import datetime
+
+import numpy as np
+
+# RSSI histogram bins [dBm], values outside go to the first/last bin
+RSSI_EDGES = tuple(range(-110, -15, 5))
+MAX_CATEGORIES = 32  # distinct manufacturers/device types per summary, the rest is "other"
+_RANK_BITS = 52  # hash bits used for the rank, exactly representable in float64
+
+
+def mac_hash(mac):
+    """Stable 64-bit hash of a MAC address (the same on every node, so sketches merge)."""
+    return int.from_bytes(hashlib.blake2b(mac.upper().encode(), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """HyperLogLog unique counter with ``2 ** p`` one-byte registers.
+
+    The standard error is about ``1.04 / sqrt(2 ** p)``: 1.6 % for p = 12
+    (4 KiB), 6.5 % for p = 8. Memory does not depend on how many distinct
+    values are added. Values go in as 64-bit hashes (``mac_hash``); the top
+    ``p`` bits pick the register, the rank comes from the low bits.
+    """
+
+    def __init__(self, p=12):
+        if not 4 <= p <= 16:
+            raise ValueError("p must be between 4 and 16")
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+        self._shift = 64 - p
+        self._rank_mask = (1 << min(_RANK_BITS, 64 - p)) - 1
+        self._rank_bits = min(_RANK_BITS, 64 - p)
+
+    def add_hash(self, value):
+        index = value >> self._shift
+        rank = self._rank_bits - (value & self._rank_mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add_hashes(self, values):
+        """Vectorized ``add_hash`` for a uint64 array."""
+        values = np.asarray(values, dtype=np.uint64)
+        index = (values >> np.uint64(self._shift)).astype(np.intp)
+        low = (values & np.uint64(self._rank_mask)).astype(np.float64)  # exact, < 2 ** 53
+        bit_length = np.frexp(low)[1]
+        np.maximum.at(self.registers, index, (self._rank_bits - bit_length + 1).astype(np.uint8))
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError("cannot merge sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def clear(self):
+        self.registers.fill(0)
+
+    def estimate(self):
+        m = self.m
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        raw = alpha * m * m / np.exp2(-self.registers.astype(np.float64)).sum()
+        zeros = m - np.count_nonzero(self.registers)
+        if raw <= 2.5 * m and zeros:
+            return m * np.log(m / zeros)  # linear counting for small cardinalities
+        return float(raw)
+
+    def to_base64(self):
+        return base64.b64encode(self.registers.tobytes()).decode("ascii")
+
+    @classmethod
+    def from_base64(cls, text, p):
+        sketch = cls(p)
+        sketch.registers[:] = np.frombuffer(base64.b64decode(text), dtype=np.uint8)
+        return sketch
+
+
+class OccupancyAggregator:
+    """Per-period occupancy summary of one node, in constant memory.
+
+    ``add(record)`` takes format_device_data records. Each period (aligned
+    to the clock, one minute by default) collects a HyperLogLog estimate
+    of distinct addresses, an RSSI histogram over RSSI_EDGES, and the
+    sightings and estimated distinct devices per manufacturer and device
+    type (at most MAX_CATEGORIES each). Hashes and RSSI values are buffered
+    in fixed NumPy arrays and folded in vectorized passes. ``add`` and
+    ``poll`` return the finished summary once a period is over, else None.
+    With ``include_sketch`` the summary carries the registers, so a
+    consumer can merge nodes or periods (``HyperLogLog.from_base64``).
+    Rotating MACs count as distinct devices, as they do on the air.
+    """
+
+    def __init__(self, period=60.0, p=12, category_p=8, buffer_size=1024, include_sketch=False):
+        self.period = period
+        self.include_sketch = include_sketch
+        self.category_p = category_p
+        self.unique = HyperLogLog(p)
+        self.edges = np.array(RSSI_EDGES, dtype=np.float64)
+        self.rssi_counts = np.zeros(len(RSSI_EDGES) - 1, dtype=np.int64)
+        self.categories = {"manufacturers": {}, "device_types": {}}  # name -> [sightings, HyperLogLog]
+        self._hashes = np.zeros(buffer_size, dtype=np.uint64)
+        self._rssi = np.zeros(buffer_size, dtype=np.float64)
+        self._buffered = 0
+        self._rssi_buffered = 0
+        self.sightings = 0
+        self.window_start = None
+
+    def _window(self, now):
+        return now - now % self.period
+
+    def _fold(self):
+        if self._buffered:
+            self.unique.add_hashes(self._hashes[:self._buffered])
+            self._buffered = 0
+        if self._rssi_buffered:
+            values = np.clip(self._rssi[:self._rssi_buffered], self.edges[0], self.edges[-1])
+            self.rssi_counts += np.histogram(values, bins=self.edges)[0]
+            self._rssi_buffered = 0
+
+    def _count(self, kind, names, value):
+        counters = self.categories[kind]
+        for name in names or ("Unknown",):
+            entry = counters.get(name)
+            if entry is None:
+                if len(counters) >= MAX_CATEGORIES:
+                    name = "other"
+                    entry = counters.get(name)
+                if entry is None:
+                    entry = counters[name] = [0, HyperLogLog(self.category_p)]
+            entry[0] += 1
+            entry[1].add_hash(value)
+
+    def add(self, record, now=None):
+        now = time.time() if now is None else now
+        summary = self.poll(now)
+        if self.window_start is None:
+            self.window_start = self._window(now)
+
+        value = mac_hash(record["mac"])
+        self._hashes[self._buffered] = value
+        self._buffered += 1
+        if record.get("rssi") is not None:
+            self._rssi[self._rssi_buffered] = record["rssi"]
+            self._rssi_buffered += 1
+        if self._buffered == len(self._hashes) or self._rssi_buffered == len(self._rssi):
+            self._fold()
+        self._count("manufacturers", record.get("manufacturer_info"), value)
+        self._count("device_types", record.get("device_types"), value)
+        self.sightings += 1
+        return summary
+
+    def poll(self, now=None):
+        """The summary of the finished period, if one ended before ``now``."""
+        now = time.time() if now is None else now
+        if self.window_start is None or now < self.window_start + self.period:
+            return None
+        summary = self.summary()
+        self.reset()
+        return summary
+
+    def summary(self):
+        self._fold()
+        result = {
+            "timestamp": datetime.fromtimestamp(self.window_start).isoformat(),
+            "period": self.period,
+            "unique_devices": min(self.sightings, round(self.unique.estimate())),
+            "sightings": self.sightings,
+            "rssi_histogram": {"edges": list(RSSI_EDGES), "counts": self.rssi_counts.tolist()},
+        }
+        for kind, counters in self.categories.items():
+            result[kind] = {name: {"sightings": sightings, "unique": min(sightings, round(sketch.estimate()))}
+                            for name, (sightings, sketch) in sorted(counters.items())}
+        if self.include_sketch:
+            result["sketch"] = {"p": self.unique.p, "registers": self.unique.to_base64()}
+        return result
+
+    def reset(self):
+        self.unique.clear()
+        self.rssi_counts.fill(0)
+        for counters in self.categories.values():
+            counters.clear()
+        self._buffered = self._rssi_buffered = 0
+        self.sightings = 0
+        self.window_start = None
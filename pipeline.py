@@ -0,0 +1,283 @@
+#spolecna cast skenovacich smycek: zaznam zarizeni -> MQTT
+import asyncio
+import os
+import time
+from datetime import datetime
+from functools import partial
+
+import metrics
+import profiling
+from delta_format import DeltaEncoder
+from device_cache import ChangeCache
+from metrics import DURATION_BUCKETS, REGISTRY
+from mqttportabo import async_send_payload, get_publisher
+
+# Davkove odesilani: 0 = kazde zarizeni vlastni zpravou na vlastni topic (kompatibilni rezim),
+# N > 0 = az N zaznamu v jedne zprave na topic uzlu, nejpozdeji po BATCH_INTERVAL sekundach
+BATCH_SIZE = int(os.environ.get("ATTENTID_BATCH_SIZE", "0"))
+BATCH_INTERVAL = float(os.environ.get("ATTENTID_BATCH_INTERVAL", "5"))
+
+# Potlaceni opakovanych zprav: zarizeni se posle jen kdyz je nove, zmenilo se RSSI o CHANGE_RSSI_DELTA dBm,
+# UUID nebo manufacturer data, nebo po CHANGE_KEEPALIVE sekundach
+SUPPRESS_UNCHANGED = os.environ.get("ATTENTID_SUPPRESS_UNCHANGED", "0") == "1"
+CHANGE_RSSI_DELTA = int(os.environ.get("ATTENTID_CHANGE_RSSI_DELTA", "6"))
+CHANGE_KEEPALIVE = float(os.environ.get("ATTENTID_CHANGE_KEEPALIVE", "60"))
+CHANGE_CACHE_SIZE = int(os.environ.get("ATTENTID_CHANGE_CACHE_SIZE", "4096"))
+
+# Vyhlazene RSSI a odhad vzdalenosti v zaznamech: "off", "ema" nebo "kalman"
+RSSI_SMOOTHING = os.environ.get("ATTENTID_RSSI_SMOOTHING", "off")
+TX_POWER = float(os.environ.get("ATTENTID_TX_POWER", "-59"))  # RSSI ve vzdalenosti 1 m
+PATH_LOSS_EXPONENT = float(os.environ.get("ATTENTID_PATH_LOSS_EXPONENT", "2.0"))
+
+# Delta rezim: 0 = vypnuto, N > 0 = uplny zaznam zarizeni (keyframe) po kazdych N zpravach a po
+# znovupripojeni, mezi nimi jen zmenena pole (format a dekoder viz delta_decoder)
+DELTA_KEYFRAME = int(os.environ.get("ATTENTID_DELTA_KEYFRAME", "0"))
+
+# Souhrny obsazenosti za periodu (occupancy.py): "off", "alongside" = vedle zaznamu zarizeni,
+# "only" = misto nich
+OCCUPANCY = os.environ.get("ATTENTID_OCCUPANCY", "off")
+OCCUPANCY_PERIOD = float(os.environ.get("ATTENTID_OCCUPANCY_PERIOD", "60"))
+OCCUPANCY_SKETCH = os.environ.get("ATTENTID_OCCUPANCY_SKETCH", "0") == "1"  # registry HLL ve zprave
+
+# Lokalni historie vsech reklam ve streaming rezimu (sighting_store.py), prazdne = vypnuto
+STORE_PATH = os.environ.get("ATTENTID_STORE_PATH", "")
+
+FORMAT_TIME = REGISTRY.histogram("attentid_format_seconds", "format_device_data time per record", DURATION_BUCKETS)
+RECORDS = REGISTRY.counter("attentid_records_total", "Device records formatted")
+
+
+def _when_delivered(ack, callbacks):
+    """Call ``callbacks`` once the broker acknowledged ``ack``, not when it failed."""
+    def done(future):
+        if not future.cancelled() and future.exception() is None:
+            for callback in callbacks:
+                callback()
+    if callbacks:
+        ack.add_done_callback(done)
+
+
+class Batcher:
+    """Collects (topic, payload) pairs and publishes them as one message.
+
+    The batch goes to ``node_topic`` as
+    ``{"timestamp": ..., "records": [{"topic": ..., **payload}, ...]}`` so a
+    consumer can still route every record by its per-device topic. A batch
+    is flushed when it holds ``max_records`` records or, while ``run_timer``
+    is running, once its oldest record is ``flush_interval`` seconds old.
+    An ``on_delivered`` callback given to ``add`` runs once the batch
+    holding the record was acknowledged by the broker.
+    """
+
+    def __init__(self, node_topic, max_records=100, flush_interval=5.0):
+        self.node_topic = node_topic
+        self.max_records = max_records
+        self.flush_interval = flush_interval
+        self.batches_sent = 0
+        self.records_sent = 0
+        self._records = []
+        self._delivered = []
+        self._first_added = None
+
+    async def add(self, topic, payload, on_delivered=None):
+        if not self._records:
+            self._first_added = time.monotonic()
+        self._records.append({"topic": topic, **payload})
+        if on_delivered is not None:
+            self._delivered.append(on_delivered)
+        if len(self._records) >= self.max_records:
+            await self.flush()
+
+    async def flush(self):
+        if not self._records:
+            return
+        records, self._records = self._records, []
+        delivered, self._delivered = self._delivered, []
+        ack = await async_send_payload(self.node_topic, {
+            "timestamp": datetime.now().isoformat(),
+            "records": records,
+        }, wait=False)
+        _when_delivered(ack, delivered)
+        self.batches_sent += 1
+        self.records_sent += len(records)
+
+    async def run_timer(self):
+        while True:
+            await asyncio.sleep(self.flush_interval / 4)
+            if self._records and time.monotonic() - self._first_added >= self.flush_interval:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    print(f"❌ Error sending batch to MQTT: {e}")
+
+
+_metrics_server = None
+
+
+class Uplink:
+    """Formats a device with the script's format_device_data and publishes it.
+
+    ``select_topic(device_address)`` returns the MQTT topic for a device, so
+    every script keeps its own rules (verified user, fake device, ...). With
+    ``batch_size`` > 0 and a ``node_topic`` the records are batched (see
+    Batcher); call ``flush()`` at the end of a scan cycle. A ChangeCache
+    passed as ``cache`` drops records that carry nothing new. An
+    RssiTracker passed as ``rssi_tracker`` adds smoothed RSSI and distance
+    to every record; feed it with ``observe()`` once per scan.
+    ``start_metrics()`` starts the metrics endpoint and the node-health
+    messages to ``health_topic`` when they are configured (see metrics).
+    A DeltaEncoder passed as ``delta`` sends most records as deltas
+    against the previous record of the device (see delta_decoder).
+    An OccupancyAggregator passed as ``occupancy`` sees every record and
+    its period summaries go to ``occupancy_topic``; with ``raw_records``
+    false only the summaries are published.
+    """
+
+    def __init__(self, format_device, select_topic, node_topic=None,
+                 batch_size=None, flush_interval=None, cache=None, rssi_tracker=None,
+                 health_topic=None, delta=None, occupancy_topic=None, occupancy=None, raw_records=None):
+        self.format_device = format_device
+        self.select_topic = select_topic
+        self.health_topic = health_topic
+        self._health_task = None
+        if rssi_tracker is None and RSSI_SMOOTHING != "off":
+            from rssi_filter import RssiTracker  # NumPy only when smoothing is on
+            rssi_tracker = RssiTracker(method=RSSI_SMOOTHING, tx_power=TX_POWER,
+                                       path_loss_exponent=PATH_LOSS_EXPONENT)
+        self.rssi_tracker = rssi_tracker
+        if cache is None and SUPPRESS_UNCHANGED:
+            cache = ChangeCache(CHANGE_CACHE_SIZE, rssi_delta=CHANGE_RSSI_DELTA, keepalive=CHANGE_KEEPALIVE)
+        self.cache = cache
+        if cache is not None:
+            REGISTRY.counter_function("attentid_suppressed_total", "Unchanged records not published",
+                                      lambda: cache.stats["suppressed"])
+        if occupancy is None and OCCUPANCY != "off" and occupancy_topic:
+            from occupancy import OccupancyAggregator  # NumPy only when aggregating
+            occupancy = OccupancyAggregator(OCCUPANCY_PERIOD, include_sketch=OCCUPANCY_SKETCH)
+        self.occupancy = occupancy
+        self.occupancy_topic = occupancy_topic
+        self.raw_records = (occupancy is None or OCCUPANCY != "only") if raw_records is None else raw_records
+        if delta is None and DELTA_KEYFRAME > 0:
+            # a reconnect may have lost messages: keyframes for everyone after it
+            delta = DeltaEncoder(DELTA_KEYFRAME, CHANGE_CACHE_SIZE,
+                                 generation=lambda: get_publisher().stats["connects"])
+        self.delta = delta
+        if delta is not None:
+            REGISTRY.counter_function("attentid_delta_keyframes_total", "Full records sent in delta mode",
+                                      lambda: delta.stats["keyframes"])
+            REGISTRY.counter_function("attentid_delta_records_total", "Records sent as deltas",
+                                      lambda: delta.stats["deltas"])
+        batch_size = BATCH_SIZE if batch_size is None else batch_size
+        self.batcher = None
+        if batch_size > 0 and node_topic:
+            self.batcher = batcher = Batcher(node_topic, batch_size,
+                                             BATCH_INTERVAL if flush_interval is None else flush_interval)
+            REGISTRY.gauge("attentid_batch_records", "Records waiting in the current batch",
+                           lambda: len(batcher._records))
+
+    def start_metrics(self):
+        """Metrics HTTP endpoint and node-health task, as far as they are enabled."""
+        global _metrics_server
+        if metrics.METRICS_PORT and _metrics_server is None:
+            _metrics_server = metrics.serve()
+        if metrics.HEALTH_INTERVAL > 0 and self.health_topic and self._health_task is None:
+            self._health_task = asyncio.create_task(
+                metrics.publish_health(partial(async_send_payload, wait=False), self.health_topic))
+
+    async def submit(self, device, timestamp=None):
+        """Publish one device; returns the formatted record."""
+        start = time.perf_counter()
+        device_data = self.format_device(device)
+        FORMAT_TIME.observe(time.perf_counter() - start)
+        RECORDS.inc()
+        adapter = getattr(device, "adapter", None)
+        if adapter is not None:
+            device_data["adapter"] = adapter  # multi-adapter scanning (ble_stream.ADAPTERS)
+        if self.rssi_tracker is not None:
+            self.rssi_tracker.annotate(device_data)
+        if self.occupancy is not None:
+            await self._send_occupancy(self.occupancy.add(device_data, timestamp))
+            if not self.raw_records:
+                return device_data
+        if self.cache is not None and not self.cache.should_publish(device_data):
+            return device_data
+        payload = {
+            "data": device_data,
+            "timestamp": (datetime.fromtimestamp(timestamp) if timestamp else datetime.now()).isoformat()
+        }
+        if self.delta is not None:
+            payload = self.delta.encode(payload)
+        # do cache az po potvrzeni brokerem - nedoruceny zaznam se zkusi znovu
+        on_delivered = partial(self.cache.mark_published, device_data) if self.cache is not None else None
+        await self.send(self.select_topic(device.address), payload, on_delivered)
+        return device_data
+
+    def observe(self, devices):
+        """Feed the RSSI of a whole scan to the tracker in one vectorized update."""
+        if self.rssi_tracker is None:
+            return
+        for device in devices:
+            self.rssi_tracker.record(device.address, device.rssi)
+        self.rssi_tracker.flush()
+
+    async def send(self, topic, payload, on_delivered=None):
+        """Queue one message; ``on_delivered()`` runs after the broker acknowledged it."""
+        if self.batcher is not None:
+            await self.batcher.add(topic, payload, on_delivered)
+        else:
+            ack = await async_send_payload(topic, payload, wait=False)
+            _when_delivered(ack, [on_delivered] if on_delivered is not None else [])
+
+    async def _send_occupancy(self, summary):
+        if summary is not None:
+            await async_send_payload(self.occupancy_topic, summary, wait=False)
+
+    async def flush(self):
+        if self.batcher is not None:
+            await self.batcher.flush()
+        if self.occupancy is not None:
+            await self._send_occupancy(self.occupancy.poll())
+
+    async def run_occupancy_timer(self):
+        """Publish period summaries on time even when no sightings arrive."""
+        while True:
+            await asyncio.sleep(self.occupancy.period / 4)
+            try:
+                await self._send_occupancy(self.occupancy.poll())
+            except Exception as e:
+                print(f"❌ Error sending occupancy summary to MQTT: {e}")
+
+
+async def run_streaming(uplink, stream):
+    """Publish sightings from an AdvertisementStream as soon as they arrive."""
+    timers = []
+    if uplink.batcher is not None:
+        timers.append(asyncio.create_task(uplink.batcher.run_timer()))
+    if uplink.occupancy is not None:
+        timers.append(asyncio.create_task(uplink.run_occupancy_timer()))
+    if uplink.rssi_tracker is not None:
+        # every advertisement counts for smoothing (in order), not only the emitted ones
+        tracker = uplink.rssi_tracker
+        stream.listeners.append(lambda sighting: tracker.record(sighting.address, sighting.rssi, sighting.timestamp))
+    store = None
+    if STORE_PATH:
+        from sighting_store import SightingStore
+        store = SightingStore(STORE_PATH)
+        stream.listeners.append(store.append_sighting)
+        timers.append(asyncio.create_task(store.run()))
+    uplink.start_metrics()
+    profiling.install()
+    try:
+        async with stream:
+            print("📡 Streaming scanner started")
+            async for sighting in stream:
+                try:
+                    device_data = await uplink.submit(sighting, sighting.timestamp)
+                    print(f"📱 Device {sighting.address} (RSSI: {sighting.rssi}) type: {', '.join(device_data['device_types'])}")
+                except Exception as e:
+                    print(f"❌ Error processing {sighting.address}: {e}")
+    finally:
+        for timer in timers:
+            timer.cancel()
+        if store is not None:
+            store.close()
+        await uplink.flush()
@@ -1,46 +1,34 @@
-from utils import handle_incoming_message
+# Porovnani MAC adres se zarizenimi v blizkosti - implementace je v utils.py
+# (drive zde byla kopie, ktera pri kazde zprave spoustela novy 5s BLE scan)
+from utils import handle_incoming_message, async_handle_incoming_message
 from utils import get_nearby_mac_addresses
+from user_registry import get_registry
 
-import re
-from bleak import BleakScanner
 
-async def get_nearby_mac_addresses():
-    """Retrieve a list of nearby MAC addresses using BLE scanning."""
-    try:
-        devices = await BleakScanner.discover(timeout=5.0)
-        macs = [device.address for device in devices]
-        print(f"Nearby MAC addresses: {macs}")  # Debugging log
-        return macs
-    except Exception as e:
-        print(f"Error during BLE scanning: {e}")
-        return []
-
-def handle_incoming_message(message):
+def verify_device(device_address, uuid_uzivatele):
     """
-    Handle an incoming message by extracting the MAC address,
-    comparing it with nearby MAC addresses, and outputting the result.
+    Verify that the user ID advertised by a device is registered; the device
+    address is then bound to the user (see user_registry). Returns bool.
     """
-    try:
-        # Extract MAC address from the message
-        mac_address = message.get("mac")
-        if not mac_address:
-            print("No MAC address found in the message.")
-            return
-
-        # Retrieve nearby MAC addresses
-        nearby_macs = asyncio.run(get_nearby_mac_addresses())
-
-        # Normalize MAC address formats
-        def normalize_mac(mac):
-            return re.sub(r'[^A-Fa-f0-9]', '', mac).upper()
+    registry = get_registry()
+    registry.maybe_reload()
+    if registry.verify_device(device_address, uuid_uzivatele):
+        print(f"Device {device_address} verified for user {uuid_uzivatele}.")
+        return True
+    print(f"User {uuid_uzivatele} of device {device_address} is not registered.")
+    return False
 
-        normalized_mac = normalize_mac(mac_address)
-        normalized_nearby_macs = [normalize_mac(mac) for mac in nearby_macs]
 
-        # Compare the MAC address with the nearby list
-        if normalized_mac in normalized_nearby_macs:
-            print(f"MAC address {mac_address} is nearby.")
-        else:
-            print(f"MAC address {mac_address} is not nearby.")
-    except Exception as e:
-        print(f"Error handling the message: {e}")
\ No newline at end of file
+def verify_user(uuid_uzivatele, claimed_address=None):
+    """
+    Verify only that the user ID is registered, without binding any address.
+    For sources that cannot prove which device sent the ID (GATT writes):
+    ``claimed_address`` is just logged. Returns bool.
+    """
+    registry = get_registry()
+    registry.maybe_reload()
+    if registry.verify_user(uuid_uzivatele):
+        print(f"User {uuid_uzivatele} verified (unverified address {claimed_address}).")
+        return True
+    print(f"User {uuid_uzivatele} (unverified address {claimed_address}) is not registered.")
+    return False
@@ -0,0 +1,164 @@
+#prubezne aktualizovany index MAC adres v blizkosti
+import asyncio
+import re
+import threading
+import time
+
+_NON_HEX = re.compile(r'[^A-Fa-f0-9]')
+
+
+def normalize_mac(mac):
+    """AA:bb-CC... -> AABBCC... (same normalization as utils.handle_incoming_message)."""
+    return _NON_HEX.sub('', mac).upper()
+
+
+class PresenceIndex:
+    """normalized MAC -> (last seen, RSSI), fed by a scanner detection callback.
+
+    Lookups are a single dict access. Entries older than ``expiry`` seconds
+    are dropped by ``prune()``, which the background scanner calls
+    periodically, so the index only holds recently seen devices.
+    """
+
+    def __init__(self, expiry=300.0):
+        self.expiry = expiry
+        self._seen = {}
+
+    def __len__(self):
+        return len(self._seen)
+
+    def update(self, address, rssi, now=None):
+        self._seen[normalize_mac(address)] = (time.time() if now is None else now, rssi)
+
+    def detection_callback(self, device, advertisement_data):
+        self.update(device.address, advertisement_data.rssi)
+
+    def last_seen(self, mac):
+        """(timestamp, rssi) of the last sighting, or None."""
+        return self._seen.get(normalize_mac(mac))
+
+    def is_nearby(self, mac, within=30.0, now=None):
+        entry = self._seen.get(normalize_mac(mac))
+        if entry is None:
+            return False
+        return (time.time() if now is None else now) - entry[0] <= within
+
+    def nearby_many(self, macs, within=30.0, now=None):
+        """{mac: bool} for a batch of MAC addresses."""
+        now = time.time() if now is None else now
+        return {mac: self.is_nearby(mac, within, now) for mac in macs}
+
+    def prune(self, now=None):
+        horizon = (time.time() if now is None else now) - self.expiry
+        for mac in [m for m, (seen, _) in self._seen.items() if seen < horizon]:
+            self._seen.pop(mac, None)
+
+
+class PresenceScanner:
+    """Keeps a PresenceIndex fresh with a persistent scanner.
+
+    ``run()`` works inside an existing event loop; ``start_in_loop()`` runs
+    it as a task of the caller's loop and ``start_background()`` in a
+    daemon thread with its own loop for synchronous callers. Right after
+    start the index is still empty, so callers should wait
+    ``warmup_remaining()`` seconds once before trusting a negative answer.
+    When the scanner fails, ``failed`` is set and it is not restarted
+    before ``retry_in()`` seconds (doubling up to ``max_retry``), so
+    callers can answer at once instead of waiting for a new warm-up.
+    """
+
+    def __init__(self, index=None, prune_interval=30.0, scanner_factory=None, retry=30.0, max_retry=600.0):
+        self.index = index if index is not None else PresenceIndex()
+        self.prune_interval = prune_interval
+        self.scanner_factory = scanner_factory
+        self.retry = retry
+        self.max_retry = max_retry
+        self.running = False
+        self.started_at = None
+        self.error = None
+        self.failures = 0
+        self._retry_at = 0.0
+        self._thread = None
+        self._task = None
+        self._lock = threading.Lock()
+
+    async def run(self):
+        scanner_factory = self.scanner_factory
+        if scanner_factory is None:
+            from bleak import BleakScanner  # heavy (D-Bus backend), only when really scanning
+            scanner_factory = BleakScanner
+        scanner = scanner_factory(detection_callback=self.index.detection_callback)
+        self.started_at = time.monotonic()
+        await scanner.start()
+        self.running = True
+        self.error = None
+        self.failures = 0
+        try:
+            while True:
+                await asyncio.sleep(self.prune_interval)
+                self.index.prune()
+        finally:
+            self.running = False
+            await scanner.stop()
+
+    async def _supervise(self):
+        try:
+            await self.run()
+        except Exception as e:
+            self.error = e
+            self.failures += 1
+            self._retry_at = time.monotonic() + min(self.max_retry, self.retry * 2 ** (self.failures - 1))
+            print(f"Error during BLE scanning: {e}, retrying in {self.retry_in():.0f} s")
+
+    def _active(self):
+        return (self._thread is not None and self._thread.is_alive()) or (self._task is not None and not self._task.done())
+
+    @property
+    def failed(self):
+        """The last scanner stopped with an error and none is running now."""
+        return self.error is not None and not self._active()
+
+    def retry_in(self):
+        return max(0.0, self._retry_at - time.monotonic())
+
+    def warmup_remaining(self, warmup):
+        if self.failed:
+            return 0.0
+        if self.started_at is None:
+            return warmup
+        return max(0.0, self.started_at + warmup - time.monotonic())
+
+    def _should_start(self):
+        return not self._active() and time.monotonic() >= self._retry_at
+
+    def start_background(self):
+        with self._lock:
+            if self._should_start():
+                self.started_at = time.monotonic()
+                self._thread = threading.Thread(target=self._thread_main, name="presence-scanner", daemon=True)
+                self._thread.start()
+        return self
+
+    def _thread_main(self):
+        asyncio.run(self._supervise())
+
+    def start_in_loop(self):
+        """Run the scanner as a task of the running loop, unless it already runs somewhere."""
+        with self._lock:
+            if self._should_start():
+                self.started_at = time.monotonic()
+                self._task = asyncio.get_running_loop().create_task(self._supervise())
+        return self
+
+
+_scanner = None
+_scanner_lock = threading.Lock()
+
+
+def get_presence_scanner():
+    """Shared PresenceScanner (not started)."""
+    global _scanner
+    with _scanner_lock:
+        if _scanner is None:
+            _scanner = PresenceScanner()
+        return _scanner
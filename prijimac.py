@@ -1,6 +1,17 @@
 import asyncio
+import os
 from bleak import BleakScanner, BleakClient
 import porovnani
+import profiling
+from adv_decoder import LAYOUTS, UserMessage, decode
+from worker_pool import CoalescingWorkerPool
+
+# Overovani bezi v omezenem poctu workeru; stejna dvojice (adresa, uzivatel)
+# behem VERIFY_COALESCE_MS se slouci do jednoho overeni
+VERIFY_WORKERS = int(os.environ.get("ATTENTID_VERIFY_WORKERS", "4"))
+VERIFY_QUEUE = int(os.environ.get("ATTENTID_VERIFY_QUEUE", "1000"))
+VERIFY_COALESCE_MS = float(os.environ.get("ATTENTID_VERIFY_COALESCE_MS", "2000"))
+VERIFY_ON_FULL = os.environ.get("ATTENTID_VERIFY_ON_FULL", "drop_new")
 
 async def handle_message(device_address, uuid_uzivatele):
     """
@@ -9,26 +20,41 @@ async def handle_message(device_address, uuid_uzivatele):
     print(f"Received message from device: {device_address}, UUID: {uuid_uzivatele}")
     porovnani.verify_device(device_address, uuid_uzivatele)
 
+async def handle_claim(claimed_address, uuid_uzivatele):
+    """
+    Process a user ID whose sender is not known (GATT write): the address is
+    only what the phone wrote, so the user is checked and nothing is bound.
+    """
+    print(f"Received claim from device: {claimed_address}, UUID: {uuid_uzivatele}")
+    porovnani.verify_user(uuid_uzivatele, claimed_address)
+
+def make_verify_pool(handler=handle_message):
+    """The verification worker pool (advertisements: handle_message, GATT writes: handle_claim)."""
+    return CoalescingWorkerPool(handler, workers=VERIFY_WORKERS, max_queue=VERIFY_QUEUE,
+                                window=VERIFY_COALESCE_MS / 1000.0, on_full=VERIFY_ON_FULL).start()
+
 async def main():
     """
     Main function to scan for BLE devices and handle incoming messages.
     """
     print("Starting BLE scanner...")
+    profiling.install()
     scanner = BleakScanner()
+    pool = make_verify_pool()
 
     def detection_callback(device, advertisement_data):
         """
         Callback function triggered when a BLE device is detected.
         """
-        # Assuming the message is in the manufacturer data
-        manufacturer_data = advertisement_data.manufacturer_data
-        for key, value in manufacturer_data.items():
+        # The message is in the manufacturer data of our company ID (see adv_decoder),
+        # everything else is rejected by a single table lookup
+        for key, value in advertisement_data.manufacturer_data.items():
+            if key not in LAYOUTS:
+                continue
             try:
-                # Decode the 32-bit message
-                message = int.from_bytes(value, byteorder='little')
-                device_address = device.address
-                uuid_uzivatele = message & 0xFFFFFFFF  # Extract UUID from the message
-                asyncio.create_task(handle_message(device_address, uuid_uzivatele))
+                record = decode(key, value)
+                if record is not None and type(record) is UserMessage:
+                    pool.submit(device.address, record.uuid_uzivatele)
             except Exception as e:
                 print(f"Error processing message: {e}")
 
@@ -40,7 +66,8 @@ async def main():
         await asyncio.sleep(30)  # Run the scanner for 30 seconds
     finally:
         await scanner.stop()
-        print("Scanner stopped.")
+        await pool.close()
+        print(f"Scanner stopped. Verification stats: {pool.stats}")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
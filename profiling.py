@@ -0,0 +1,332 @@
+#volitelne profilovani dlouho bezicich smycek: vzorkovani CPU ve vlakne a snimky tracemalloc
+import asyncio
+import fnmatch
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import datetime
+
+# "cpu", "memory" nebo "cpu,memory" = zapnout hned po startu; jinak jen signaly:
+# kill -USR1 <pid> prepina CPU profil, kill -USR2 <pid> prepina tracemalloc
+PROFILE = os.environ.get("ATTENTID_PROFILE", "")
+PROFILE_DIR = os.environ.get("ATTENTID_PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.environ.get("ATTENTID_PROFILE_INTERVAL", "300"))  # s mezi vypisy
+PROFILE_KEEP = int(os.environ.get("ATTENTID_PROFILE_KEEP", "12"))  # vypisu od kazdeho druhu
+PROFILE_HZ = float(os.environ.get("ATTENTID_PROFILE_HZ", "50"))
+PROFILE_FRAMES = int(os.environ.get("ATTENTID_PROFILE_FRAMES", "8"))  # hloubka tracebacku tracemalloc
+
+# Stage of a stack = the first of its frames (innermost first) whose file matches
+STAGES = {
+    "publish": ("mqttportabo.py", "mqtt_publisher.py", "spool.py", "*/paho/*"),
+    "decode": ("adv_decoder.py", "wire_decoder.py"),
+    "verify": ("porovnani.py", "worker_pool.py", "prijimac.py"),
+    "scan": ("ble_stream.py", "ble_synthetic.py", "scheduler.py", "*/bleak/*", "*/dbus_fast/*"),
+    "format": ("pipeline.py", "sigma.py", "vypis.py", "fake_ferified.py", "sig_tables.py", "device_cache.py",
+               "rssi_filter.py", "wire_format.py", "utils.py"),
+}
+MAX_DEPTH = 64
+
+
+class StageClassifier:
+    """Maps file names to pipeline stages (cached, files are few)."""
+
+    def __init__(self, stages=STAGES):
+        self.stages = stages
+        self._cache = {}
+
+    def __call__(self, filename):
+        stage = self._cache.get(filename)
+        if stage is None:
+            base = os.path.basename(filename)
+            stage = next((name for name, patterns in self.stages.items()
+                          if any(fnmatch.fnmatch(base if "/" not in pattern else filename, pattern)
+                                 for pattern in patterns)), "")
+            self._cache[filename] = stage
+        return stage
+
+    def stage_of(self, filenames):
+        """Stage of a stack given as file names from the innermost frame outwards."""
+        for filename in filenames:
+            stage = self(filename)
+            if stage:
+                return stage
+        return "other"
+
+
+class Sampler:
+    """Statistical CPU profiler running in its own thread.
+
+    Every 1/``hz`` seconds it reads the stacks of all other threads (the
+    paho network thread too) and charges each the CPU time its thread used
+    since the previous tick, read from the per-thread CPU clock; threads
+    waiting in select() therefore cost nothing. Nothing runs while it is
+    stopped. ``folded()`` returns the microseconds per stack in the
+    collapsed format of flamegraph.pl / speedscope, with the pipeline
+    stage as the root frame.
+    """
+
+    def __init__(self, hz=PROFILE_HZ, classifier=None):
+        self.hz = hz
+        self.classifier = classifier or StageClassifier()
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def active(self):
+        return self._thread is not None
+
+    def _run(self):
+        own = threading.get_ident()
+        last_cpu = {}
+        while not self._stop.wait(1 / self.hz):
+            cpu_now = {}
+            for thread_id, top in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                try:
+                    cpu = time.clock_gettime(time.pthread_getcpuclockid(thread_id))
+                except (AttributeError, OSError):
+                    cpu = None  # no per-thread clock: count every tick as one interval
+                cpu_now[thread_id] = cpu
+                used = 1 / self.hz if cpu is None else cpu - last_cpu.get(thread_id, cpu)
+                if used <= 0:
+                    continue
+                stack = []
+                while top is not None and len(stack) < MAX_DEPTH:
+                    stack.append(top.f_code)
+                    top = top.f_back
+                self.stacks[tuple(stack)] += used
+            last_cpu = cpu_now
+            self.samples += 1
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self.started = time.time()
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def take(self):
+        """Return (stacks, ticks, seconds) collected so far and start over."""
+        stacks, samples, started = self.stacks, self.samples, self.started
+        self.stacks, self.samples, self.started = Counter(), 0, time.time()
+        return stacks, samples, self.started - (started or self.started)
+
+    def by_stage(self, stacks):
+        shares = Counter()
+        for stack, used in stacks.items():
+            shares[self.classifier.stage_of(code.co_filename for code in stack)] += used
+        return shares
+
+    def folded(self, stacks):
+        lines = []
+        for stack, used in stacks.most_common():
+            stage = self.classifier.stage_of(code.co_filename for code in stack)
+            frames = [f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                      for code in reversed(stack)]
+            lines.append(f"{';'.join([stage] + frames)} {round(used * 1e6)}")
+        return "\n".join(lines) + "\n"
+
+
+class MemoryTracker:
+    """tracemalloc snapshots compared per pipeline stage.
+
+    Each ``report()`` takes a snapshot and sums the traced memory by stage
+    (classified by the allocating traceback) and by allocating line, and
+    lists the lines that grew most since the previous report.
+    """
+
+    def __init__(self, frames=PROFILE_FRAMES, classifier=None):
+        self.frames = frames
+        self.classifier = classifier or StageClassifier()
+        self._previous = {}
+
+    @property
+    def active(self):
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._previous = {}
+
+    def stop(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def sizes(self):
+        """(stage, "file:line") -> traced bytes."""
+        sizes = defaultdict(int)
+        # one Statistic per distinct traceback (frames oldest first); filtering those here is far
+        # cheaper than Snapshot.filter_traces(), which runs fnmatch on every frame of every trace
+        for statistic in tracemalloc.take_snapshot().statistics("traceback"):
+            filenames = [frame.filename for frame in reversed(statistic.traceback)]
+            if __file__ in filenames or tracemalloc.__file__ in filenames:
+                continue  # the profiler's own bookkeeping
+            innermost = statistic.traceback[-1]
+            line = f"{os.path.basename(innermost.filename)}:{innermost.lineno}"
+            sizes[self.classifier.stage_of(filenames), line] += statistic.size
+        return sizes
+
+    def report(self, top=10):
+        current, peak = tracemalloc.get_traced_memory()
+        sizes = self.sizes()
+        previous, self._previous = self._previous, sizes
+        totals, growth = defaultdict(int), defaultdict(list)
+        for (stage, line), size in sizes.items():
+            totals[stage] += size
+            delta = size - previous.get((stage, line), 0)
+            if delta:
+                growth[stage].append((delta, line, size))
+        for (stage, line), size in previous.items():
+            if (stage, line) not in sizes:
+                growth[stage].append((-size, line, 0))
+        before = defaultdict(int)
+        for (stage, _), size in previous.items():
+            before[stage] += size
+
+        lines = [f"# {datetime.now().isoformat()}  traced {current / 1024:.0f} KiB, peak {peak / 1024:.0f} KiB"]
+        for stage in sorted(totals, key=totals.get, reverse=True):
+            diff = totals[stage] - before[stage] if previous else 0
+            lines.append(f"\n[{stage}] {totals[stage] / 1024:.1f} KiB ({diff / 1024:+.1f} KiB)")
+            for delta, line, size in sorted(growth[stage], reverse=True)[:top]:
+                lines.append(f"  {delta / 1024:+10.1f} KiB  {size / 1024:10.1f} KiB  {line}")
+        return "\n".join(lines) + "\n"
+
+
+class Profiler:
+    """CPU sampler and memory tracker with periodic, rotated dumps.
+
+    Both modes cost nothing until switched on, by ``modes`` at start or at
+    runtime by SIGUSR1 (CPU) / SIGUSR2 (memory). While a mode is on, ``run()``
+    writes ``cpu-<time>.folded`` / ``mem-<time>.txt`` into ``directory`` every
+    ``interval`` seconds and keeps the newest ``keep`` of each; switching a
+    mode off writes its last dump right away.
+    """
+
+    def __init__(self, directory=PROFILE_DIR, interval=PROFILE_INTERVAL, keep=PROFILE_KEEP,
+                 hz=PROFILE_HZ, frames=PROFILE_FRAMES):
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        classifier = StageClassifier()
+        self.cpu = Sampler(hz, classifier)
+        self.memory = MemoryTracker(frames, classifier)
+        self._task = None
+        self._lock = threading.RLock()  # memory reports run in executor threads
+
+    def _path(self, prefix, suffix):
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{prefix}-{datetime.now():%Y%m%d-%H%M%S}{suffix}")
+
+    def _rotate(self, prefix):
+        dumps = sorted(name for name in os.listdir(self.directory) if name.startswith(prefix + "-"))
+        for name in dumps[:-self.keep] if self.keep > 0 else ():
+            os.remove(os.path.join(self.directory, name))
+
+    def dump_cpu(self):
+        stacks, samples, seconds = self.cpu.take()
+        if not stacks:
+            return None
+        shares = self.cpu.by_stage(stacks)
+        path = self._path("cpu", ".folded")
+        with open(path, "w") as f:
+            f.write(self.cpu.folded(stacks))
+        self._rotate("cpu")
+        total = sum(shares.values())
+        summary = ", ".join(f"{stage} {used / total:.0%}" for stage, used in shares.most_common())
+        print(f"🔬 CPU profile ({total:.1f} s CPU in {seconds:.0f} s, {samples} samples): {summary} -> {path}")
+        return path
+
+    def dump_memory(self):
+        with self._lock:
+            if not self.memory.active:
+                return None
+            report = self.memory.report()
+            path = self._path("mem", ".txt")
+            with open(path, "w") as f:
+                f.write(report)
+            self._rotate("mem")
+            current, peak = tracemalloc.get_traced_memory()
+        print(f"🔬 Memory snapshot (traced {current / 1024:.0f} KiB, peak {peak / 1024:.0f} KiB) -> {path}")
+        return path
+
+    def dump(self):
+        for dump in (self.dump_cpu, self.dump_memory):
+            try:
+                dump()
+            except OSError as e:
+                print(f"❌ Error writing profile: {e}")
+
+    def toggle_cpu(self):
+        if self.cpu.active:
+            self.cpu.stop()
+            self.dump_cpu()
+        else:
+            self.cpu.take()
+            self.cpu.start()
+            print(f"🔬 CPU sampling on ({self.cpu.hz:g} Hz)")
+
+    def _last_memory_dump(self):
+        with self._lock:
+            try:
+                self.dump_memory()
+            except OSError as e:
+                print(f"❌ Error writing profile: {e}")
+            self.memory.stop()
+
+    def toggle_memory(self):
+        if self.memory.active:
+            # a report takes a second or more on a big heap, the loop keeps running meanwhile
+            asyncio.get_running_loop().run_in_executor(None, self._last_memory_dump)
+        else:
+            self.memory.start()
+            print(f"🔬 tracemalloc on ({self.memory.frames} frames)")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self.cpu.active or self.memory.active:
+                await asyncio.get_running_loop().run_in_executor(None, self.dump)
+
+    def install(self, modes=PROFILE):
+        """Start the configured modes, the signal handlers and the dump task (running loop required)."""
+        loop = asyncio.get_running_loop()
+        if self._task is not None:
+            return self
+        try:
+            loop.add_signal_handler(signal.SIGUSR1, self.toggle_cpu)
+            loop.add_signal_handler(signal.SIGUSR2, self.toggle_memory)
+        except (NotImplementedError, RuntimeError):
+            pass  # no signals here (Windows, not the main thread): only ATTENTID_PROFILE applies
+        modes = {mode.strip() for mode in modes.split(",") if mode.strip()}
+        if "cpu" in modes:
+            self.toggle_cpu()
+        if "memory" in modes:
+            self.toggle_memory()
+        self._task = loop.create_task(self.run())
+        return self
+
+
+_profiler = None
+
+
+def install(modes=PROFILE):
+    """Install the process-wide profiler once; safe to call from every loop."""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler.install(modes)
@@ -0,0 +1,189 @@
+#vyhlazovani RSSI a odhad vzdalenosti pro vsechna zarizeni najednou (NumPy)
+import time
+
+import numpy as np
+
+
+class RssiTracker:
+    """Per-device RSSI history in NumPy ring buffers with EMA/Kalman smoothing.
+
+    Readings are queued with ``record()`` (cheap, e.g. from a detection
+    callback) and applied by ``flush()``, which lookups call automatically.
+    Every reading counts, in the order it was recorded: a pass takes one
+    vectorized step per repeat, the k-th step updating every device with
+    at least k readings, so flush once per scan or advertisement burst.
+
+    Distance uses the log-distance path-loss model
+    ``d = 10 ** ((tx_power - rssi) / (10 * path_loss_exponent))`` where
+    ``tx_power`` is the RSSI measured at 1 m.
+
+    Devices live in fixed slots; when all ``capacity`` slots are taken the
+    least recently seen eighth is recycled, so memory stays constant.
+    """
+
+    def __init__(self, capacity=16384, history=16, alpha=0.3,
+                 process_noise=0.5, measurement_noise=9.0,
+                 tx_power=-59.0, path_loss_exponent=2.0, method="kalman"):
+        self.capacity = capacity
+        self.history_length = history
+        self.alpha = alpha
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.tx_power = tx_power
+        self.path_loss_exponent = path_loss_exponent
+        self.method = method
+
+        self.history = np.full((capacity, history), np.nan, dtype=np.float32)
+        self.head = np.zeros(capacity, dtype=np.int32)
+        self.count = np.zeros(capacity, dtype=np.int32)
+        self.ema = np.zeros(capacity, dtype=np.float32)
+        self.estimate = np.zeros(capacity, dtype=np.float32)
+        self.variance = np.zeros(capacity, dtype=np.float32)
+        self.last_seen = np.full(capacity, -np.inf)
+
+        self._slots = {}
+        self._macs = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+        self._pending_macs = []
+        self._pending_rssi = []
+        self._pending_time = []
+
+    def __len__(self):
+        return len(self._slots)
+
+    # --- updates ---
+
+    def record(self, mac, rssi, timestamp=None):
+        if rssi is None:
+            return
+        self._pending_macs.append(mac)
+        self._pending_rssi.append(rssi)
+        self._pending_time.append(time.time() if timestamp is None else timestamp)
+
+    def flush(self):
+        if not self._pending_macs:
+            return
+        macs, self._pending_macs = self._pending_macs, []
+        rssi, self._pending_rssi = self._pending_rssi, []
+        times, self._pending_time = self._pending_time, []
+        self.update(macs, rssi, times)
+
+    def update(self, macs, rssi, timestamps=None):
+        """Apply one batch of readings (sequences of equal length) in order."""
+        now = time.time()
+        timestamps = np.full(len(macs), now) if timestamps is None else np.asarray(timestamps, dtype=np.float64)
+        touched = set()
+        slots = np.fromiter((self._slot(mac, now, touched) for mac in macs), dtype=np.intp, count=len(macs))
+        z = np.asarray(rssi, dtype=np.float32)
+        if len(touched) == len(slots):
+            self._step(slots, z, timestamps)
+            return
+        # poradi cteni v ramci zarizeni: k-ty krok dostane k-te cteni kazdeho zarizeni
+        order = np.argsort(slots, kind="stable")
+        ordered = slots[order]
+        starts = np.flatnonzero(np.concatenate(([True], ordered[1:] != ordered[:-1])))
+        rank = np.empty(len(slots), dtype=np.intp)
+        rank[order] = np.arange(len(slots)) - np.repeat(starts, np.diff(np.append(starts, len(slots))))
+        for k in range(int(rank.max()) + 1):
+            pick = rank == k
+            self._step(slots[pick], z[pick], timestamps[pick])
+
+    def _step(self, slots, z, timestamps):
+        """One update of distinct ``slots``."""
+        self.history[slots, self.head[slots]] = z
+        self.head[slots] = (self.head[slots] + 1) % self.history_length
+        new = self.count[slots] == 0
+        self.count[slots] = np.minimum(self.count[slots] + 1, self.history_length)
+        self.last_seen[slots] = timestamps
+
+        ema = self.ema[slots]
+        self.ema[slots] = np.where(new, z, ema + self.alpha * (z - ema))
+
+        x = self.estimate[slots]
+        p = self.variance[slots] + self.process_noise
+        gain = p / (p + self.measurement_noise)
+        self.estimate[slots] = np.where(new, z, x + gain * (z - x))
+        self.variance[slots] = np.where(new, self.measurement_noise, (1.0 - gain) * p)
+
+    def _slot(self, mac, now, touched):
+        slot = self._slots.get(mac)
+        if slot is None:
+            if not self._free:
+                self._recycle(max(1, self.capacity // 8), touched)
+            if not self._free:
+                raise ValueError(f"more than {self.capacity} devices in one batch")
+            slot = self._free.pop()
+            self._slots[mac] = slot
+            self._macs[slot] = mac
+            self.history[slot] = np.nan
+            self.head[slot] = 0
+            self.count[slot] = 0
+            self.last_seen[slot] = now
+        touched.add(slot)
+        return slot
+
+    def _recycle(self, n, touched=()):
+        """Free the ``n`` least recently seen slots, except those of the batch being applied."""
+        age = self.last_seen
+        if touched:
+            age = age.copy()
+            age[list(touched)] = np.inf
+        for slot in np.argpartition(age, n - 1)[:n].tolist():
+            mac = self._macs[slot]
+            if mac is not None and age[slot] != np.inf:
+                del self._slots[mac]
+                self._macs[slot] = None
+                self.last_seen[slot] = -np.inf
+                self._free.append(slot)
+
+    def prune(self, max_age, now=None):
+        """Free devices not seen for ``max_age`` seconds."""
+        now = time.time() if now is None else now
+        for slot in np.flatnonzero(self.last_seen < now - max_age).tolist():
+            mac = self._macs[slot]
+            if mac is not None:
+                del self._slots[mac]
+                self._macs[slot] = None
+                self.last_seen[slot] = -np.inf
+                self._free.append(slot)
+
+    # --- results ---
+
+    def smoothed_all(self):
+        """Smoothed RSSI of every slot (NaN for unused slots)."""
+        self.flush()
+        values = self.estimate if self.method == "kalman" else self.ema
+        return np.where(self.count > 0, values, np.nan)
+
+    def distances(self, smoothed=None):
+        smoothed = self.smoothed_all() if smoothed is None else smoothed
+        return np.power(10.0, (self.tx_power - smoothed) / (10.0 * self.path_loss_exponent))
+
+    def window_mean(self):
+        """Mean of the raw RSSI history per slot."""
+        self.flush()
+        with np.errstate(invalid="ignore"):
+            return np.nanmean(np.where(self.count[:, None] > 0, self.history, np.nan), axis=1)
+
+    def get(self, mac):
+        """(smoothed RSSI, distance in m) of one device, or (None, None)."""
+        self.flush()
+        slot = self._slots.get(mac)
+        if slot is None or not self.count[slot]:
+            return None, None
+        value = float(self.estimate[slot] if self.method == "kalman" else self.ema[slot])
+        return value, float(10.0 ** ((self.tx_power - value) / (10.0 * self.path_loss_exponent)))
+
+    def nearby(self, max_distance):
+        """MAC addresses whose estimated distance is at most ``max_distance`` metres."""
+        with np.errstate(invalid="ignore"):
+            mask = self.distances() <= max_distance
+        return [self._macs[slot] for slot in np.flatnonzero(mask).tolist()]
+
+    def annotate(self, record):
+        """Add ``rssi_smoothed`` and ``distance_m`` to a format_device_data record."""
+        value, distance = self.get(record["mac"])
+        if value is not None:
+            record["rssi_smoothed"] = round(value, 1)
+            record["distance_m"] = round(distance, 2)
+        return record
@@ -0,0 +1,203 @@
+#planovani skenovani: adaptivni delka skenu a pauzy podle zmen v okoli, aktivni okna podle kalendare
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+from metrics import COUNT_BUCKETS, REGISTRY
+
+# Aktivni okna, napr. "mon-fri 07:00-19:00; sat 08:00-12:00" (prazdne = stale aktivni)
+ACTIVE_HOURS = os.environ.get("ATTENTID_ACTIVE_HOURS")
+# "0" = pevny cyklus SCAN_WINDOW + SCAN_INTERVAL jako drive
+SCAN_ADAPTIVE = os.environ.get("ATTENTID_SCAN_ADAPTIVE", "1") == "1"
+SCAN_WINDOW = float(os.environ.get("ATTENTID_SCAN_WINDOW", "10"))
+SCAN_INTERVAL = float(os.environ.get("ATTENTID_SCAN_INTERVAL", "30"))
+SCAN_WINDOW_RANGE = (float(os.environ.get("ATTENTID_SCAN_WINDOW_MIN", "5")),
+                     float(os.environ.get("ATTENTID_SCAN_WINDOW_MAX", "20")))
+SCAN_INTERVAL_RANGE = (float(os.environ.get("ATTENTID_SCAN_INTERVAL_MIN", "10")),
+                       float(os.environ.get("ATTENTID_SCAN_INTERVAL_MAX", "120")))
+
+SCAN_DURATION = REGISTRY.histogram("attentid_scan_seconds", "Radio time of one discover() scan",
+                                   (1, 2, 5, 7.5, 10, 15, 20, 30, 60))
+DEVICES_PER_SCAN = REGISTRY.histogram("attentid_devices_per_scan", "Devices found by one scan", COUNT_BUCKETS)
+CYCLE_CPU = REGISTRY.counter("attentid_scan_cycle_cpu_seconds_total", "Process CPU time spent in scan cycles")
+
+DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def _parse_days(text):
+    days = set()
+    for part in text.split(","):
+        first, _, last = part.strip().lower().partition("-")
+        start = DAYS.index(first[:3])
+        end = DAYS.index(last[:3]) if last else start
+        days.update(DAYS[(start + offset) % 7] for offset in range((end - start) % 7 + 1))
+    return frozenset(DAYS.index(day) for day in days)
+
+
+def _parse_time(text):
+    hours, _, minutes = text.strip().partition(":")
+    return timedelta(hours=int(hours), minutes=int(minutes or 0))
+
+
+class ActiveWindows:
+    """Weekly calendar of active periods.
+
+    ``spec`` is a list of entries separated by ";", each "[days] HH:MM-HH:MM"
+    where days are e.g. "mon-fri" or "sat,sun" (all days when omitted). A
+    window ending before it starts runs over midnight. An empty spec means
+    always active.
+    """
+
+    def __init__(self, spec=""):
+        self.spec = spec or ""
+        self.windows = []  # (weekdays, start, end) with start/end as offsets from midnight
+        for entry in filter(None, (part.strip() for part in self.spec.split(";"))):
+            *days, hours = entry.split()
+            start, _, end = hours.partition("-")
+            weekdays = _parse_days(" ".join(days)) if days else frozenset(range(7))
+            start, end = _parse_time(start), _parse_time(end)
+            if end <= start:
+                end += timedelta(days=1)
+            self.windows.append((weekdays, start, end))
+
+    def __bool__(self):
+        return bool(self.windows)
+
+    def _periods(self, now):
+        """Active (start, end) datetimes from yesterday to a week ahead, in order."""
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        periods = []
+        for day in range(-1, 8):
+            date = midnight + timedelta(days=day)
+            for weekdays, start, end in self.windows:
+                if date.weekday() in weekdays:
+                    periods.append((date + start, date + end))
+        return sorted(periods)
+
+    def is_active(self, now=None):
+        if not self.windows:
+            return True
+        now = datetime.now() if now is None else now
+        return any(start <= now < end for start, end in self._periods(now))
+
+    def next_start(self, now=None):
+        """Start of the next active period (``now`` when already active)."""
+        now = datetime.now() if now is None else now
+        if self.is_active(now):
+            return now
+        return min(start for start, _ in self._periods(now) if start > now)
+
+
+class DutyCycle:
+    """Scan window and pause that follow the churn of the scene.
+
+    ``update(addresses)`` after each scan compares the addresses with those
+    seen in the last ``memory`` cycles. When more than ``busy`` of them are
+    new, the next scan is ``factor`` times longer and the pause shorter;
+    below ``calm`` the scan shortens and the pause grows, within the
+    configured ranges.
+    """
+
+    def __init__(self, window=10.0, interval=30.0, window_range=(5.0, 20.0), interval_range=(10.0, 120.0),
+                 adaptive=True, factor=1.5, busy=0.2, calm=0.05, memory=5):
+        self.window = window
+        self.interval = interval
+        self.window_range = window_range
+        self.interval_range = interval_range
+        self.adaptive = adaptive
+        self.factor = factor
+        self.busy = busy
+        self.calm = calm
+        self.memory = memory
+        self.churn = 0.0
+        self.new = 0
+        self._cycle = 0
+        self._last_seen = {}
+
+    def update(self, addresses):
+        self._cycle += 1
+        addresses = set(addresses)
+        horizon = self._cycle - self.memory
+        self.new = sum(1 for address in addresses if self._last_seen.get(address, horizon - 1) < horizon)
+        self.churn = self.new / len(addresses) if addresses else 0.0
+        for address in addresses:
+            self._last_seen[address] = self._cycle
+        if len(self._last_seen) > 4 * len(addresses) + 256:
+            self._last_seen = {a: c for a, c in self._last_seen.items() if c >= horizon}
+
+        if not self.adaptive:
+            return
+        if self.churn > self.busy:
+            self.window = min(self.window_range[1], self.window * self.factor)
+            self.interval = max(self.interval_range[0], self.interval / self.factor)
+        elif self.churn < self.calm:
+            self.window = max(self.window_range[0], self.window / self.factor)
+            self.interval = min(self.interval_range[1], self.interval * self.factor)
+
+
+class ScanScheduler:
+    """Drives a discover/process/pause scan loop.
+
+        scheduler = make_scheduler()
+        while True:
+            await scheduler.wait_active()
+            devices = await scheduler.scan(get_scanner_backend().discover)
+            ...
+            await scheduler.rest()
+
+    ``wait_active`` sleeps until the next active window instead of polling
+    the clock, ``scan`` runs discover for the current adaptive window and
+    ``rest`` prints the radio and CPU time of the cycle before pausing.
+    """
+
+    # long sleeps are split, so a clock step (NTP sync after boot) is noticed
+    MAX_SLEEP = 3600.0
+
+    def __init__(self, windows=None, duty=None):
+        self.windows = ActiveWindows() if windows is None else windows
+        self.duty = DutyCycle() if duty is None else duty
+        self.stats = {"cycles": 0, "radio_time": 0.0, "cpu_time": 0.0}
+        self._cycle_cpu = None
+        self._radio = 0.0
+        self._devices = 0
+
+    async def wait_active(self):
+        while not self.windows.is_active():
+            now = datetime.now()
+            delay = (self.windows.next_start(now) - now).total_seconds()
+            if delay > 0:
+                print(f"⏰ Outside active hours, sleeping until {now + timedelta(seconds=delay):%a %H:%M}")
+                await asyncio.sleep(min(delay, self.MAX_SLEEP))
+
+    async def scan(self, discover):
+        self._cycle_cpu = time.process_time()
+        window = self.duty.window
+        start = time.monotonic()
+        devices = await discover(timeout=window)
+        self._radio = time.monotonic() - start
+        self._devices = len(devices)
+        SCAN_DURATION.observe(self._radio)
+        DEVICES_PER_SCAN.observe(self._devices)
+        self.duty.update(device.address for device in devices)
+        return devices
+
+    async def rest(self):
+        cpu = time.process_time() - self._cycle_cpu if self._cycle_cpu is not None else 0.0
+        self._cycle_cpu = None
+        self.stats["cycles"] += 1
+        self.stats["radio_time"] += self._radio
+        self.stats["cpu_time"] += cpu
+        CYCLE_CPU.inc(cpu)
+        duty = self.duty
+        print(f"⏱️ Cycle: radio {self._radio:.1f} s, CPU {cpu:.2f} s, {self._devices} devices "
+              f"({duty.new} new, churn {duty.churn:.0%}); next scan {duty.window:.1f} s after {duty.interval:.1f} s")
+        await asyncio.sleep(duty.interval)
+
+
+def make_scheduler(default_hours=""):
+    """Scheduler configured from the ATTENTID_ACTIVE_HOURS / ATTENTID_SCAN_* variables."""
+    hours = default_hours if ACTIVE_HOURS is None else ACTIVE_HOURS
+    return ScanScheduler(ActiveWindows(hours),
+                         DutyCycle(SCAN_WINDOW, SCAN_INTERVAL, SCAN_WINDOW_RANGE, SCAN_INTERVAL_RANGE,
+                                   adaptive=SCAN_ADAPTIVE))
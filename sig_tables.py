@@ -0,0 +1,186 @@
+#Bluetooth SIG tabulky: company ID vyrobcu a 16bitove service UUID, sestavene az pri prvnim pouziti
+import os
+import sys
+from array import array
+
+BASE_UUID_SUFFIX = "-0000-1000-8000-00805f9b34fb"
+
+# Kratke nazvy, ktere v MQTT zpravach chodi od zacatku - maji prednost pred oficialnimi nazvy SIG.
+# Jen firmy, jejichz ID opravdu odpovida (puvodni mapovani skriptu melo 10 ze 14 ID spatne).
+COMPANY_ALIASES = {
+    76: "Apple",  # 0x004C
+    6: "Microsoft",  # 0x0006
+    117: "Samsung",  # 0x0075
+    224: "Google",  # 0x00E0
+    0xFFFF: "Test/Internal",  # rezervovano SIG pro testy (viz adv_decoder.ATTENTID_COMPANY_ID)
+}
+SERVICE_ALIASES = {
+    0x180F: "Battery Service",
+    0x180A: "Device Information",
+    0xFE9F: "Google Fast Pair",
+    0xFD6F: "Windows Device",
+}
+# 128bitova UUID mimo Bluetooth base UUID
+UUID128_ALIASES = {
+    "9fa480e0-4967-4542-9390-d343dc5d04ae": "Apple Device",
+}
+
+# Seznamy SIG dodavane s repozitarem (vygeneruje "python sig_tables.py"), bleak jen kdyz chybi
+COMPANY_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sig_companies.txt")
+SERVICE_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sig_services.txt")
+# Volitelne soubory "id;nazev" (id dekadicky nebo 0x...) s aktualnejsim seznamem SIG
+COMPANY_FILE = os.environ.get("ATTENTID_SIG_COMPANY_FILE")
+SERVICE_FILE = os.environ.get("ATTENTID_SIG_SERVICE_FILE")
+
+
+class Uint16Table:
+    """Read-only uint16 -> name map: an array of indexes into a tuple of interned names.
+
+    Takes 128 kB however many names it holds, and a lookup is two
+    indexing operations returning a shared string, nothing is allocated.
+    """
+
+    __slots__ = ("index", "names")
+
+    def __init__(self, *mappings):
+        names, positions = [None], {}
+        index = array("H", bytes(2 * 65536))
+        for mapping in mappings:
+            for key, name in mapping.items():
+                name = sys.intern(name)
+                position = positions.get(name)
+                if position is None:
+                    position = positions[name] = len(names)
+                    names.append(name)
+                index[key] = position
+        self.index = index
+        self.names = tuple(names)
+
+    def get(self, key):
+        """Name for ``key``, or None when it is unknown or not a uint16."""
+        try:
+            if 0 <= key <= 0xFFFF:
+                return self.names[self.index[key]]
+        except TypeError:
+            pass
+        return None
+
+    def __len__(self):
+        return sum(1 for position in self.index if position)
+
+
+def load_table_file(path):
+    """Read an "id;name" file (one entry per line, # starts a comment)."""
+    mapping = {}
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            key, _, name = line.partition(";")
+            mapping[int(key, 0)] = name.strip()
+    return mapping
+
+
+_companies = None
+_services = None
+
+
+def _bleak_companies():
+    try:
+        from bleak.backends._manufacturers import MANUFACTURERS  # soukromy modul bleak, jen zaloha
+    except ImportError:
+        return {}
+    return MANUFACTURERS
+
+
+def _bleak_services():
+    try:
+        from bleak.uuids import uuid16_dict
+    except ImportError:
+        return {}
+    return uuid16_dict
+
+
+def company_table():
+    global _companies
+    if _companies is None:
+        base = load_table_file(COMPANY_DATA) if os.path.exists(COMPANY_DATA) else _bleak_companies()
+        extra = load_table_file(COMPANY_FILE) if COMPANY_FILE else {}
+        _companies = Uint16Table(base, extra, COMPANY_ALIASES)
+    return _companies
+
+
+def service_table():
+    global _services
+    if _services is None:
+        base = load_table_file(SERVICE_DATA) if os.path.exists(SERVICE_DATA) else _bleak_services()
+        extra = load_table_file(SERVICE_FILE) if SERVICE_FILE else {}
+        _services = Uint16Table(base, extra, SERVICE_ALIASES)
+    return _services
+
+
+def company_name(company_id):
+    """Manufacturer name for an int company ID (the keys of bleak's manufacturer_data)."""
+    return company_table().get(company_id)
+
+
+def uuid16(uuid):
+    """16-bit value of a UUID string on the Bluetooth base UUID, else None."""
+    if len(uuid) == 36 and uuid.startswith("0000") and uuid.lower().endswith(BASE_UUID_SUFFIX):
+        try:
+            return int(uuid[4:8], 16)
+        except ValueError:
+            return None
+    if len(uuid) == 4:
+        try:
+            return int(uuid, 16)
+        except ValueError:
+            return None
+    return None
+
+
+def service_name(uuid):
+    """Name of a service UUID string (16-bit SIG services and known 128-bit ones)."""
+    short = uuid16(uuid)
+    if short is not None:
+        return service_table().get(short)
+    return UUID128_ALIASES.get(uuid.lower())
+
+
+def get_device_type(uuids):
+    device_types = []
+    for uuid in uuids:
+        name = service_name(uuid)
+        if name is not None:
+            device_types.append(name)
+    return device_types if device_types else ["Unknown Device"]
+
+
+def get_manufacturer_info(manufacturer_data):
+    """Manufacturer names for a manufacturer_data dict keyed by int company ID."""
+    table = company_table()
+    manufacturer_info = []
+    for key in manufacturer_data:
+        name = table.get(key)
+        manufacturer_info.append(name if name is not None else f"Unknown Manufacturer (ID: {key})")
+    return manufacturer_info
+
+
+def write_table_file(path, mapping, title):
+    """Write ``mapping`` as an "id;name" file read by ``load_table_file``."""
+    from importlib.metadata import version
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(f"# Bluetooth SIG {title} (id;name), from bleak {version('bleak')}\n")
+        file.write("# regenerate with: python sig_tables.py\n")
+        for key in sorted(mapping):
+            file.write(f"0x{key:04X};{mapping[key]}\n")
+    return len(mapping)
+
+
+if __name__ == "__main__":
+    # regenerate the shipped lists from the installed bleak
+    print(f"{write_table_file(COMPANY_DATA, _bleak_companies(), 'company identifiers')} company identifiers "
+          f"written to {COMPANY_DATA}")
+    print(f"{write_table_file(SERVICE_DATA, _bleak_services(), '16-bit service UUIDs')} service UUIDs "
+          f"written to {SERVICE_DATA}")
@@ -0,0 +1,282 @@
+#dotazy nad lokalni historii reklam (sighting_store): casovy index segmentu a index podle MAC
+import os
+import struct
+import time
+from datetime import datetime
+
+import numpy as np
+
+from sighting_store import COUNT, ROW, Segment, SightingStore, format_mac48, mac48
+
+BLOCK_ROWS = 4096  # radku na jeden zaznam casoveho indexu
+INDEX_FILE = "index"
+INDEX_MAGIC = b"ATIX"
+INDEX_HEADER = struct.Struct("<4s4xQQQ")  # magic, blocks, MACs, rows; pole nasleduji zarovnana na 8 B
+
+RESULT = np.dtype(ROW.descr + [COUNT])
+TOP = np.dtype([("mac", "<u8"), ("rssi", "i1"), ("count", "<u4"), ("last_seen", "<f8")])
+
+
+class SegmentIndex:
+    """Time and MAC index of one closed segment.
+
+    ``blocks`` holds the lowest and highest timestamp of every BLOCK_ROWS
+    rows, so a time range only touches the blocks that overlap it, even
+    though rows are only roughly in time order. ``macs`` are the sorted
+    distinct MACs and ``rows[offsets[i]:offsets[i + 1]]`` the rows of
+    ``macs[i]`` in ascending order (a posting list). The arrays are saved
+    in one file (INDEX_FILE) in the segment directory and are views into
+    a single read-only memmap after loading.
+    """
+
+    def __init__(self, blocks, macs, offsets, rows):
+        self.blocks = blocks
+        self.macs = macs
+        self.offsets = offsets
+        self.rows = rows
+        self.start = float(blocks[:, 0].min()) if len(blocks) else 0.0
+        self.end = float(blocks[:, 1].max()) if len(blocks) else 0.0
+
+    @classmethod
+    def build(cls, segment):
+        timestamps = np.asarray(segment.column("timestamp"))
+        padded = np.pad(timestamps, (0, -len(timestamps) % BLOCK_ROWS), mode="edge") if len(timestamps) else timestamps
+        blocks = padded.reshape(-1, BLOCK_ROWS)
+        blocks = np.stack((blocks.min(axis=1), blocks.max(axis=1)), axis=1)
+        mac = np.asarray(segment.column("mac"))
+        rows = np.argsort(mac, kind="stable").astype(np.uint32)
+        macs, counts = np.unique(mac[rows], return_counts=True)
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        return cls(blocks, macs, offsets, rows)
+
+    def save(self, path):
+        temporary = os.path.join(path, f"{INDEX_FILE}.tmp")
+        with open(temporary, "wb") as file:
+            file.write(INDEX_HEADER.pack(INDEX_MAGIC, len(self.blocks), len(self.macs), len(self.rows)))
+            for array in (self.blocks, self.macs, self.offsets, self.rows):
+                file.write(np.ascontiguousarray(array).tobytes())
+        os.replace(temporary, os.path.join(path, INDEX_FILE))
+
+    @classmethod
+    def load(cls, path):
+        """The saved index of a segment directory, or None."""
+        path = os.path.join(path, INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, block_count, mac_count, row_count = INDEX_HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC:
+            return None
+        arrays = []
+        offset = INDEX_HEADER.size
+        for dtype, count in ((np.float64, 2 * block_count), (np.uint64, mac_count),
+                             (np.int64, mac_count + 1), (np.uint32, row_count)):
+            size = count * np.dtype(dtype).itemsize
+            arrays.append(data[offset:offset + size].view(dtype))
+            offset += size
+        blocks, macs, offsets, rows = arrays
+        return cls(blocks.reshape(-1, 2), macs, offsets, rows)
+
+    def rows_in(self, start, end):
+        """Rows of the blocks overlapping [start, end); the caller filters exact times."""
+        candidates = np.flatnonzero((self.blocks[:, 1] >= start) & (self.blocks[:, 0] < end))
+        if not len(candidates):
+            return np.empty(0, dtype=np.int64)
+        total = len(self.rows)
+        return np.concatenate([np.arange(block * BLOCK_ROWS, min((block + 1) * BLOCK_ROWS, total))
+                               for block in candidates])
+
+    def rows_of(self, mac):
+        position = np.searchsorted(self.macs, mac)
+        if position == len(self.macs) or self.macs[position] != mac:
+            return np.empty(0, dtype=np.int64)
+        return np.asarray(self.rows[self.offsets[position]:self.offsets[position + 1]], dtype=np.int64)
+
+
+class SightingHistory:
+    """Range queries over recorded sightings; results are NumPy arrays.
+
+    ``store`` is a live SightingStore or the directory of one that another
+    process is writing. Closed segments are indexed on first use
+    (SegmentIndex, saved next to the columns unless ``save_indexes`` is
+    off); segments whose time range does not overlap the query are
+    skipped without reading their columns. The segment being written is
+    scanned, it only holds the latest rows. Read from a directory, the
+    other process's open segment is left out: its files are truncated
+    when it closes, which would fault a mapping of them.
+    """
+
+    def __init__(self, store, save_indexes=True):
+        self.store = store if isinstance(store, SightingStore) else None
+        self.path = store.path if self.store is not None else store
+        self.save_indexes = save_indexes
+        self._indexes = {}  # segment path -> SegmentIndex
+        self._segments = {}  # segment path -> Segment (s namapovanymi sloupci), jen pro cteni z adresare
+
+    def segments(self):
+        if self.store is not None:
+            return self.store.segments()
+        segments = {}
+        for entry in sorted(os.scandir(self.path), key=lambda entry: entry.name):
+            if entry.name.endswith(".tmp"):
+                continue
+            segment = self._segments.get(entry.path)
+            if segment is None:
+                # znacka vznika pred sloupci a mizi az po zkraceni: nejdriv sloupec, pak znacka
+                if not os.path.exists(os.path.join(entry.path, "timestamp")) or Segment.is_open(entry.path):
+                    continue
+                segment = Segment(entry.path)
+            segments[entry.path] = segment
+        self._segments = segments
+        return list(segments.values())
+
+    def index(self, segment):
+        """SegmentIndex of a closed segment (None for the one being written)."""
+        index = self._indexes.get(segment.path)
+        if index is None:
+            index = SegmentIndex.load(segment.path)  # ulozeny index = uzavreny segment
+            if index is None:
+                if segment.writable is not None:
+                    return None
+                index = SegmentIndex.build(segment)
+                if self.save_indexes:
+                    try:
+                        index.save(segment.path)
+                    except OSError:
+                        pass  # jen pro cteni - index zustane v pameti
+            self._indexes[segment.path] = index
+        return index
+
+    def build_indexes(self):
+        """Index all closed segments now instead of on the first query."""
+        for segment in self.segments():
+            self.index(segment)
+
+    def _rows(self, segment, start, end, mac=None):
+        """Sorted row numbers of ``segment`` in [start, end) (and of ``mac``)."""
+        index = self.index(segment)
+        if index is None:
+            timestamps = np.asarray(segment.column("timestamp"))
+            mask = (timestamps >= start) & (timestamps < end) & (timestamps > 0)
+            if mac is not None:
+                mask &= np.asarray(segment.column("mac")) == mac
+            return np.flatnonzero(mask)
+        if index.end < start or index.start >= end:
+            return np.empty(0, dtype=np.int64)
+        rows = index.rows_in(start, end) if mac is None else index.rows_of(mac)
+        if start <= index.start and index.end < end:
+            return rows
+        timestamps = segment.column("timestamp")[rows]
+        return rows[(timestamps >= start) & (timestamps < end)]
+
+    def _select(self, start, end, mac=None, min_rssi=None, names=RESULT.names):
+        start = 0.0 if start is None else start
+        end = np.inf if end is None else end
+        live = set()
+        parts = []
+        for segment in self.segments():
+            live.add(segment.path)
+            rows = self._rows(segment, start, end, mac)
+            if not len(rows):
+                continue
+            part = np.empty(len(rows), dtype=[(name, RESULT[name]) for name in names])
+            for name in names:
+                part[name] = segment.column(name)[rows]
+            if min_rssi is not None:
+                part = part[part["rssi"] >= min_rssi]
+            parts.append(part)
+        for path in [path for path in self._indexes if path not in live]:
+            del self._indexes[path]  # segment zhusten nebo smazan
+        if not parts:
+            return np.empty(0, dtype=[(name, RESULT[name]) for name in names])
+        return np.concatenate(parts)
+
+    def range(self, start=None, end=None, min_rssi=None):
+        """All rows in [start, end), in segment order."""
+        return self._select(start, end, min_rssi=min_rssi)
+
+    def sightings(self, mac, start=None, end=None, min_rssi=None):
+        """Rows of one MAC (string or 48-bit int) in [start, end), by time."""
+        value = mac48(mac)[0] if isinstance(mac, str) else mac
+        rows = self._select(start, end, value, min_rssi)
+        return rows[np.argsort(rows["timestamp"], kind="stable")]
+
+    def presence(self, mac, start=None, end=None, min_rssi=None, gap=120.0):
+        """(first, last) seen of each visit of a MAC, as an (n, 2) array.
+
+        Sightings less than ``gap`` seconds apart belong to one visit; a
+        ``min_rssi`` threshold turns "seen" into "near".
+        """
+        timestamps = self.sightings(mac, start, end, min_rssi)["timestamp"]
+        if not len(timestamps):
+            return np.empty((0, 2))
+        breaks = np.flatnonzero(np.diff(timestamps) >= gap)
+        return np.stack((timestamps[np.concatenate(([0], breaks + 1))],
+                         timestamps[np.concatenate((breaks, [len(timestamps) - 1]))]), axis=1)
+
+    def top(self, start=None, end=None, n=10, min_rssi=None):
+        """The ``n`` devices with the strongest RSSI in [start, end), as a TOP array."""
+        rows = self._select(start, end, min_rssi=min_rssi, names=("timestamp", "mac", "rssi", "count"))
+        if not len(rows):
+            return np.empty(0, dtype=TOP)
+        order = np.lexsort((rows["rssi"], rows["mac"]))
+        mac = rows["mac"][order]
+        starts = np.flatnonzero(np.concatenate(([True], mac[1:] != mac[:-1])))
+        ends = np.concatenate((starts[1:], [len(mac)])) - 1
+        result = np.empty(len(starts), dtype=TOP)
+        result["mac"] = mac[starts]
+        result["rssi"] = rows["rssi"][order][ends]
+        result["count"] = np.add.reduceat(rows["count"][order], starts)
+        result["last_seen"] = np.maximum.reduceat(rows["timestamp"][order], starts)
+        best = np.lexsort((-result["count"].astype(np.int64), -result["rssi"].astype(np.int16)))[:n]
+        return result[best]
+
+
+def parse_time(text, now=None):
+    """Epoch seconds of "HH:MM" (today), an ISO date/time, or a number."""
+    if text is None:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    if len(text) <= 5 and ":" in text:
+        moment = datetime.fromtimestamp(time.time() if now is None else now)
+        hours, minutes = map(int, text.split(":"))
+        return moment.replace(hour=hours, minute=minutes, second=0, microsecond=0).timestamp()
+    return datetime.fromisoformat(text).timestamp()
+
+
+def _when(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat(sep=" ", timespec="seconds")
+
+
+async def run_query(args):
+    """``attentid.py history``: print the result of one query."""
+    if not args.store:
+        raise SystemExit("no store: pass --store or set ATTENTID_STORE_PATH")
+    if args.query != "top" and not args.mac:
+        raise SystemExit(f"{args.query} needs a MAC address")
+    history = SightingHistory(args.store)
+    end = parse_time(args.to)
+    start = parse_time(getattr(args, "from"))
+    if args.last:
+        end = time.time() if end is None else end
+        start = end - args.last
+    started = time.perf_counter()
+
+    if args.query == "top":
+        result = history.top(start, end, args.n, args.min_rssi)
+        for row in result:
+            print(f"{format_mac48(row['mac'])}  {row['rssi']:4d} dBm  {row['count']:7d}x  "
+                  f"last {_when(row['last_seen'])}")
+    elif args.query == "presence":
+        result = history.presence(args.mac, start, end, args.min_rssi, args.gap)
+        for first, last in result:
+            print(f"{_when(first)} - {_when(last)}  ({last - first:.0f} s)")
+    else:
+        result = history.sightings(args.mac, start, end, args.min_rssi)
+        for row in result:
+            print(f"{_when(row['timestamp'])}  {row['rssi']:4d} dBm  company 0x{row['company_id']:04X}  "
+                  f"flags 0x{row['flags']:02X}  {row['count']}x")
+    print(f"{len(result)} results in {(time.perf_counter() - started) * 1000:.1f} ms")
@@ -0,0 +1,366 @@
+#lokalni historie zachycenych reklam: sloupcove segmenty (NumPy memmap) s rotaci, zhustenim a limitem velikosti
+import asyncio
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from metrics import REGISTRY
+
+STORE_MB = int(os.environ.get("ATTENTID_STORE_MB", "512"))
+STORE_SEGMENT_SECONDS = float(os.environ.get("ATTENTID_STORE_SEGMENT", "3600"))
+STORE_SEGMENT_ROWS = int(os.environ.get("ATTENTID_STORE_SEGMENT_ROWS", str(1 << 22)))
+STORE_COMPACT_AFTER = float(os.environ.get("ATTENTID_STORE_COMPACT_AFTER", "86400"))  # s, 0 = nezhustovat
+STORE_RESOLUTION = int(os.environ.get("ATTENTID_STORE_RESOLUTION", "60"))  # s na radek po zhusteni
+STORE_SYNC = float(os.environ.get("ATTENTID_STORE_SYNC", "5"))  # s mezi msync (opotrebeni SD karty)
+
+# one file per column; downsampled segments add COUNT (sightings merged into the row)
+ROW = np.dtype([("timestamp", "<f8"), ("mac", "<u8"), ("rssi", "i1"), ("company_id", "<u2"), ("flags", "u1")])
+COUNT = ("count", "<u4")
+RSSI_NONE = -128
+OPEN_FILE = "open"  # znacka segmentu, ktery se prave zapisuje (soubory maji plnou predalokovanou delku)
+
+FLAG_NAME = 0x01
+FLAG_UUIDS = 0x02
+FLAG_MANUFACTURER = 0x04  # company_id is valid
+FLAG_HASHED = 0x08  # address was not a MAC (e.g. CoreBluetooth UUID), mac is a 48-bit hash
+
+
+def mac48(address):
+    """(48-bit integer, extra flags) of an address."""
+    if len(address) == 17:
+        try:
+            return int(address.replace(":", "").replace("-", ""), 16), 0
+        except ValueError:
+            pass
+    return int.from_bytes(hashlib.blake2b(address.upper().encode(), digest_size=6).digest(), "big"), FLAG_HASHED
+
+
+def format_mac48(value):
+    return ":".join(f"{b:02X}" for b in int(value).to_bytes(6, "big"))
+
+
+class Segment:
+    """One directory of column files covering a time window.
+
+    The name is ``<first timestamp in ms>-<resolution>``, resolution 0 for
+    raw sightings. A segment being written has preallocated (sparse)
+    files of ``capacity`` rows and an OPEN_FILE marker; ``close()`` trims
+    the files to the rows written and only then removes the marker, so a
+    segment without the marker never shrinks and its row count is its
+    file size. Columns are opened read-only as memmaps by ``column()``.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        start, resolution = os.path.basename(path).split("-")
+        self.start = int(start) / 1000.0
+        self.resolution = int(resolution)
+        self.rows = os.path.getsize(self._file("timestamp")) // ROW["timestamp"].itemsize
+        self.writable = None
+        self._columns = {}
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @property
+    def names(self):
+        return ROW.names + ((COUNT[0],) if self.resolution else ())
+
+    def dtype(self, name):
+        return np.dtype(COUNT[1]) if name == COUNT[0] else ROW[name]
+
+    def column(self, name):
+        if name == COUNT[0] and not self.resolution:
+            return np.ones(self.rows, dtype=COUNT[1])
+        if not self.rows:
+            return np.empty(0, dtype=self.dtype(name))
+        if self.writable is not None:
+            return self.writable[name][:self.rows]
+        column = self._columns.get(name)
+        if column is None:
+            column = self._columns[name] = np.memmap(self._file(name), dtype=self.dtype(name), mode="r",
+                                                     shape=(self.rows,))
+        return column
+
+    @property
+    def end(self):
+        """Timestamp of the last row (the first one for an empty segment)."""
+        return float(self.column("timestamp")[-1]) if self.rows else self.start
+
+    @staticmethod
+    def is_open(path):
+        """Whether the segment directory is (or was, before a crash) being written."""
+        return os.path.exists(os.path.join(path, OPEN_FILE))
+
+    def disk_usage(self):
+        """Bytes on disk, including index files (sighting_query) next to the columns."""
+        usage = 0
+        for entry in os.scandir(self.path):
+            try:
+                usage += entry.stat().st_blocks * 512
+            except FileNotFoundError:
+                pass  # marker OPEN_FILE, segment se prave zavrel
+        return usage
+
+    @classmethod
+    def create(cls, root, start, capacity, resolution=0):
+        millis = round(start * 1000)
+        while os.path.exists(os.path.join(root, f"{millis:015d}-{resolution}")):
+            millis += 1
+        path = os.path.join(root, f"{millis:015d}-{resolution}")
+        os.makedirs(path)
+        open(os.path.join(path, OPEN_FILE), "wb").close()  # driv nez sloupce
+        segment = cls.__new__(cls)
+        segment.path, segment.start, segment.resolution, segment.rows = path, start, resolution, 0
+        segment._columns = {}
+        segment.writable = {name: np.memmap(segment._file(name), dtype=segment.dtype(name), mode="w+",
+                                            shape=(capacity,))
+                            for name in segment.names}
+        return segment
+
+    @property
+    def capacity(self):
+        return len(self.writable["timestamp"]) if self.writable else self.rows
+
+    def write(self, rows):
+        """Append a structured array of ROW (and COUNT) fields; the timestamp column goes last."""
+        start, end = self.rows, self.rows + len(rows)
+        for name in self.names[::-1]:
+            self.writable[name][start:end] = rows[name]
+        self.rows = end
+
+    def sync(self):
+        for column in self.writable.values():
+            column.flush()
+
+    def close(self):
+        if self.writable is None:
+            return
+        self.sync()
+        self.writable = None
+        for name in self.names:
+            os.truncate(self._file(name), self.rows * self.dtype(name).itemsize)
+        os.unlink(self._file(OPEN_FILE))
+
+    @classmethod
+    def recover(cls, path):
+        """Open a segment, trimming one left behind by a crash after its last written row."""
+        timestamp = os.path.join(path, "timestamp")
+        itemsize = ROW["timestamp"].itemsize
+        size = os.path.getsize(timestamp)
+        last = np.fromfile(timestamp, dtype=ROW["timestamp"], count=1, offset=size - itemsize) if size else None
+        if last is not None and last[0] == 0:  # nezkraceny segment, zapsany je jen zacatek
+            rows = int(np.flatnonzero(np.fromfile(timestamp, dtype=ROW["timestamp"]) == 0)[0])
+            segment = cls.__new__(cls)
+            segment.path, segment.rows, segment.writable = path, rows, None
+            segment.resolution = int(os.path.basename(path).split("-")[1])
+            for name in segment.names:
+                os.truncate(segment._file(name), rows * segment.dtype(name).itemsize)
+        if cls.is_open(path):
+            os.unlink(os.path.join(path, OPEN_FILE))
+        return cls(path)
+
+
+def downsample(segment, resolution):
+    """Rows of ``segment`` merged per (MAC, ``resolution``-second bucket).
+
+    A merged row keeps the first timestamp, the strongest RSSI, the
+    highest company ID, all flags, and the number of sightings in COUNT.
+    """
+    timestamp = np.asarray(segment.column("timestamp"))
+    mac = np.asarray(segment.column("mac"))
+    bucket = (timestamp // resolution).astype(np.int64)
+    order = np.lexsort((mac, bucket))
+    bucket, mac = bucket[order], mac[order]
+    starts = np.flatnonzero(np.concatenate(([True], (bucket[1:] != bucket[:-1]) | (mac[1:] != mac[:-1]))))
+
+    rows = np.empty(len(starts), dtype=ROW.descr + [COUNT])
+    rows["timestamp"] = np.minimum.reduceat(timestamp[order], starts)
+    rows["mac"] = mac[starts]
+    rows["rssi"] = np.maximum.reduceat(np.asarray(segment.column("rssi"))[order], starts)
+    rows["company_id"] = np.maximum.reduceat(np.asarray(segment.column("company_id"))[order], starts)
+    rows["flags"] = np.bitwise_or.reduceat(np.asarray(segment.column("flags"))[order], starts)
+    rows["count"] = np.add.reduceat(np.asarray(segment.column("count"), dtype=np.uint32)[order], starts)
+    return rows[np.argsort(rows["timestamp"], kind="stable")]
+
+
+class SightingStore:
+    """Append-only local history of advertisements in columnar segments.
+
+    ``append`` only adds a tuple to a list; ``flush()`` (every
+    ``flush_rows`` rows and from ``run()``) converts the buffer to NumPy
+    once and copies each column into the memmaps of the current segment,
+    so a full-rate streaming scanner costs about a microsecond per
+    advertisement. Dirty pages are msync'ed every ``sync_interval``
+    seconds, which keeps SD card writes large and sequential. A new
+    segment starts every ``segment_seconds`` (aligned to the clock) or
+    when ``segment_rows`` are full.
+
+    ``maintain()`` (from ``run()``, in a worker thread) replaces raw
+    segments older than ``compact_after`` by a downsampled copy (see
+    ``downsample``) and then deletes the oldest segments while the store
+    uses more than ``budget_bytes`` on disk. After a crash, the segment
+    that was being written is trimmed to its written rows on open.
+    """
+
+    def __init__(self, path, budget_bytes=STORE_MB << 20, segment_seconds=STORE_SEGMENT_SECONDS,
+                 segment_rows=STORE_SEGMENT_ROWS, compact_after=STORE_COMPACT_AFTER,
+                 resolution=STORE_RESOLUTION, sync_interval=STORE_SYNC, flush_rows=4096):
+        self.path = path
+        self.budget_bytes = budget_bytes
+        self.segment_seconds = segment_seconds
+        self.segment_rows = segment_rows
+        self.compact_after = compact_after
+        self.resolution = resolution
+        self.sync_interval = sync_interval
+        self.flush_rows = flush_rows
+        self.stats = {"appended": 0, "segments": 0, "compacted": 0, "deleted": 0}
+        self._buffer = []
+        self._active = None
+        self._active_end = 0.0
+        self._next_sync = 0.0
+        self._lock = threading.Lock()  # seznam uzavrenych segmentu (maintain bezi v jinem vlakne)
+        os.makedirs(path, exist_ok=True)
+        names = sorted(os.listdir(path))
+        for name in names:
+            start, _, resolution = name.partition("-")
+            # nedokoncene zhusteni, nebo zhusteni, po kterem nestihl zmizet puvodni segment
+            if name.endswith(".tmp") or (resolution == "0" and any(
+                    other.startswith(start + "-") and other != name and not other.endswith(".tmp")
+                    for other in names)):
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+        self._closed = [Segment.recover(os.path.join(path, name)) for name in sorted(os.listdir(path))]
+        REGISTRY.counter_function("attentid_store_rows_total", "Sightings written to the local store",
+                                  lambda: self.stats["appended"])
+        REGISTRY.gauge("attentid_store_segments", "Segments in the local sighting store",
+                       lambda: len(self._closed) + (self._active is not None))
+
+    def append(self, timestamp, mac, rssi, company_id=0, flags=0):
+        self._buffer.append((timestamp, mac, rssi, company_id, flags))
+        if len(self._buffer) >= self.flush_rows:
+            self.flush()
+
+    def append_sighting(self, sighting):
+        """AdvertisementStream listener: one row per advertisement."""
+        mac, flags = mac48(sighting.address)
+        metadata = sighting.metadata
+        company_id = 0
+        if metadata["manufacturer_data"]:
+            company_id = next(iter(metadata["manufacturer_data"]))
+            flags |= FLAG_MANUFACTURER
+        if metadata["uuids"]:
+            flags |= FLAG_UUIDS
+        if sighting.name:
+            flags |= FLAG_NAME
+        rssi = RSSI_NONE if sighting.rssi is None else max(-127, min(127, sighting.rssi))
+        self.append(sighting.timestamp, mac, rssi, company_id, flags)
+
+    def flush(self, now=None):
+        if self._buffer:
+            rows = np.array(self._buffer, dtype=ROW)
+            self._buffer.clear()
+            self.stats["appended"] += len(rows)
+            while len(rows):
+                segment = self._segment_for(float(rows["timestamp"][0]))
+                timestamps = rows["timestamp"]
+                # do aktivniho segmentu patri souvisly zacatek, ktery nepresahne jeho okno ani kapacitu
+                fits = min(len(rows), segment.capacity - segment.rows)
+                outside = np.flatnonzero(timestamps[:fits] >= self._active_end)
+                if len(outside):
+                    fits = int(outside[0])
+                segment.write(rows[:fits])
+                rows = rows[fits:]
+        now = time.monotonic() if now is None else now
+        if self._active is not None and now >= self._next_sync:
+            self._next_sync = now + self.sync_interval
+            self._active.sync()
+
+    def _segment_for(self, timestamp):
+        active = self._active
+        if active is not None and timestamp < self._active_end and active.rows < active.capacity:
+            return active
+        self.roll()
+        window = timestamp - timestamp % self.segment_seconds
+        self._active = Segment.create(self.path, timestamp, self.segment_rows)
+        self._active_end = window + self.segment_seconds
+        self.stats["segments"] += 1
+        return self._active
+
+    def roll(self):
+        """Close the segment being written; the next row starts a new one."""
+        if self._active is not None:
+            self._active.close()
+            with self._lock:
+                self._closed.append(Segment(self._active.path))
+            self._active = None
+
+    def segments(self):
+        """Closed segments, oldest first, plus the one being written (flushed rows only)."""
+        with self._lock:
+            segments = list(self._closed)
+        if self._active is not None:
+            segments.append(self._active)
+        return segments
+
+    def maintain(self, now=None):
+        """Downsample old raw segments and enforce the size budget; safe to run in a thread."""
+        now = time.time() if now is None else now
+        if self.compact_after:
+            with self._lock:
+                candidates = [segment for segment in self._closed if not segment.resolution
+                              and segment.end < now - self.compact_after]
+            for segment in candidates:
+                self._compact(segment)
+
+        with self._lock:
+            closed = list(self._closed)
+        usage = sum(segment.disk_usage() for segment in closed)
+        active = self._active  # roll() ho muze mezitim zavrit a vynulovat
+        if active is not None:
+            usage += active.disk_usage()
+        for segment in closed:
+            if usage <= self.budget_bytes:
+                break
+            usage -= segment.disk_usage()
+            with self._lock:
+                self._closed.remove(segment)
+            shutil.rmtree(segment.path, ignore_errors=True)
+            self.stats["deleted"] += 1
+
+    def _compact(self, segment):
+        rows = downsample(segment, self.resolution)
+        start = os.path.basename(segment.path).split("-")[0]
+        temporary = os.path.join(self.path, f"{start}-{self.resolution}.tmp")
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        for name in rows.dtype.names:
+            rows[name].tofile(os.path.join(temporary, name))
+        target = temporary[:-len(".tmp")]
+        os.replace(temporary, target)
+        compacted = Segment(target)
+        with self._lock:
+            self._closed[self._closed.index(segment)] = compacted
+        shutil.rmtree(segment.path, ignore_errors=True)
+        self.stats["compacted"] += 1
+
+    async def run(self, flush_interval=1.0, maintain_interval=300.0):
+        """Flush the buffer periodically and run ``maintain()`` in a worker thread."""
+        loop = asyncio.get_running_loop()
+        next_maintenance = 0.0
+        while True:
+            try:
+                self.flush()
+                if time.monotonic() >= next_maintenance:
+                    next_maintenance = time.monotonic() + maintain_interval
+                    await loop.run_in_executor(None, self.maintain)
+            except Exception as e:
+                print(f"❌ Error maintaining sighting store: {e}")
+            await asyncio.sleep(flush_interval)
+
+    def close(self):
+        self.flush()
+        self.roll()
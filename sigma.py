@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
 import asyncio
-from bleak import BleakScanner
-from mqttportabo import send_payload
+from ble_stream import AdvertisementStream, get_scanner_backend
+import profiling
+from macaddr import normalize_mac as normalize_mac_address
+from pipeline import Uplink, run_streaming
+from scheduler import make_scheduler
+from sig_tables import get_device_type, get_manufacturer_info
+from user_registry import get_registry
+import sys
 import time
 import os
 from datetime import datetime
@@ -30,56 +36,6 @@ def get_raspberry_uuid():
         return "test-raspberry-uuid-1234"
 
 # Helper functions
-def normalize_mac_address(mac_address):
-    """Normalize MAC address to uppercase with colons."""
-    if not mac_address:
-        return None
-    return mac_address.upper().replace("-", ":")
-
-def is_working_hours():
-    current_hour = datetime.now().hour
-    return 7 <= current_hour < 19
-
-# Device type detection
-KNOWN_DEVICE_UUIDS = {
-    "0000180f-0000-1000-8000-00805f9b34fb": "Battery Service",
-    "0000180a-0000-1000-8000-00805f9b34fb": "Device Information",
-    "0000fe9f-0000-1000-8000-00805f9b34fb": "Google Fast Pair",
-    "0000fd6f-0000-1000-8000-00805f9b34fb": "Windows Device",
-    "9fa480e0-4967-4542-9390-d343dc5d04ae": "Apple Device"
-}
-
-def get_device_type(uuids):
-    device_types = []
-    for uuid_str in uuids:
-        uuid_lower = uuid_str.lower()
-        if uuid_lower in KNOWN_DEVICE_UUIDS:
-            device_types.append(KNOWN_DEVICE_UUIDS[uuid_lower])
-    return device_types if device_types else ["Unknown Device"]
-
-def get_manufacturer_info(manufacturer_data):
-    """Zjistí výrobce a typ zařízení z manufacturer_data"""
-    manufacturer_info = []
-    manufacturer_mapping = {
-        76: "Apple",
-        6: "Microsoft",
-        117: "Samsung",
-        224: "Google",
-        89: "Sony",
-        15: "Intel",
-        2: "IBM",
-        48: "Nokia",
-        85: "Qualcomm",
-        72: "Broadcom",
-        112: "Huawei",
-        208: "Xiaomi",
-        240: "Oppo",
-        200: "Vivo",
-    }
-    for key, value in manufacturer_data.items():
-        manufacturer_info.append(manufacturer_mapping.get(key, f"Unknown Manufacturer (ID: {key})"))
-    return manufacturer_info
-
 def format_device_data(device):
     uuids = device.metadata.get("uuids", [])
     raw_manufacturer_data = device.metadata.get("manufacturer_data", {})
@@ -92,31 +48,59 @@ def format_device_data(device):
         "uuids": uuids,
         "device_types": get_device_type(uuids),
         "manufacturer_data": processed_manufacturer_data,
-        "manufacturer_info": get_manufacturer_info(processed_manufacturer_data)
+        "manufacturer_info": get_manufacturer_info(raw_manufacturer_data)
     }
 
-async def scan_and_send():
+def make_topic_selector(raspberry_uuid, registry):
+    def select_topic(device_address):
+        # Normalize MAC for topic
+        normalized_device_mac_for_topic = normalize_mac_address(device_address)
+
+        # Determine topic based on the user the device is bound to (user_registry)
+        registry.maybe_reload()
+        uuid_uzivatele = registry.user_of(device_address)
+        if uuid_uzivatele is not None:
+            topic = f"ble_devices/{raspberry_uuid}/{normalized_device_mac_for_topic}/overenaadresa_uzivatele/{uuid_uzivatele}"
+            print(f"✅ Device {device_address} belongs to user {uuid_uzivatele}. Sending to MQTT (user): {topic}")
+        else:
+            topic = f"ble_devices/{raspberry_uuid}/{normalized_device_mac_for_topic}"
+            print(f"✅ Sending device {device_address} to MQTT: {topic}")
+        return topic
+    return select_topic
+
+def make_uplink():
     # Get UUIDs
     uuid_uzivatele = get_uuid()
     raspberry_uuid = get_raspberry_uuid()
-    
+
     print(f"🆔 Using Raspberry UUID: {raspberry_uuid}")
-    print(f"👤 Using User UUID: {uuid_uzivatele}")
+    registry = get_registry(uuid_uzivatele)
+    print(f"👤 Using User UUID: {uuid_uzivatele} ({len(registry)} registered users)")
+    return Uplink(format_device_data, make_topic_selector(raspberry_uuid, registry),
+                  node_topic=f"ble_devices/{raspberry_uuid}/batch",
+                  health_topic=f"ble_devices/{raspberry_uuid}/health",
+                  occupancy_topic=f"ble_devices/{raspberry_uuid}/occupancy")
+
+async def stream_and_send():
+    """Continuous scanning: every sighting is published as soon as it is seen."""
+    await run_streaming(make_uplink(), AdvertisementStream())
+
+async def scan_and_send():
+    uplink = make_uplink()
+    uplink.start_metrics()
+    profiling.install()
+    scheduler = make_scheduler()
 
     while True:
-        '''
-        if not is_working_hours():
-            print("⏰ Outside working hours (7:00-19:00), waiting...")
-            await asyncio.sleep(60)
-            continue
-'''
+        await scheduler.wait_active()
+
         try:
             print("🔍 Starting BLE scanning...")
-            devices = await BleakScanner.discover(timeout=10.0)
+            devices = await scheduler.scan(get_scanner_backend().discover)
 
             if not devices:
                 print("❌ No BLE devices found.")
-                await asyncio.sleep(30)
+                await scheduler.rest()
                 continue
             
             # Limit to 5 devices only
@@ -125,33 +109,23 @@ async def scan_and_send():
             
             all_discovered_macs = [d.address for d in devices]
 
-            for device in devices:
-                device_data = format_device_data(device)
-                payload = {
-                    "data": device_data,
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-                device_types = device_data["device_types"]
-                print(f"📱 Device {device.address} (RSSI: {device.rssi}) type: {', '.join(device_types)}")
-
-                # Normalize MAC for topic
-                normalized_device_mac_for_topic = normalize_mac_address(device.address)
-
-                # Determine topic based on device MAC
-                if normalize_mac_address(device.address) == normalize_mac_address(uuid_uzivatele):
-                    topic = f"ble_devices/{raspberry_uuid}/{normalized_device_mac_for_topic}/overenaadresa_uzivatele/{uuid_uzivatele}"
-                    print(f"✅ Device {device.address} matches uuid_uzivatele. Sending to MQTT (user): {topic}")
-                else:
-                    topic = f"ble_devices/{raspberry_uuid}/{normalized_device_mac_for_topic}"
-                    print(f"✅ Sending device {device.address} to MQTT: {topic}")
+            uplink.observe(devices)
 
+            for device in devices:
                 try:
-                    send_payload(topic, payload)
+                    device_data = await uplink.submit(device)
                 except Exception as e:
                     print(f"❌ Error sending data to MQTT for {device.address}: {e}")
+                    continue
+                device_types = device_data["device_types"]
+                print(f"📱 Device {device.address} (RSSI: {device.rssi}) type: {', '.join(device_types)}")
+
+            # in batch mode the whole cycle goes out as one message
+            await uplink.flush()
+            if uplink.cache is not None:
+                print(f"🔕 Unchanged devices suppressed so far: {uplink.cache.stats['suppressed']}")
 
-            await asyncio.sleep(30)
+            await scheduler.rest()
 
         except Exception as e:
             print(f"❌ Error during scanning or processing: {e}")
@@ -160,4 +134,7 @@ async def scan_and_send():
 if __name__ == "__main__":
     print("🚀 Starting BLE monitoring test...")
     print("⏰ Working hours: 7:00 - 19:00")
-    asyncio.run(scan_and_send())
\ No newline at end of file
+    if "--stream" in sys.argv:
+        asyncio.run(stream_and_send())
+    else:
+        asyncio.run(scan_and_send())
\ No newline at end of file
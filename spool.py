@@ -0,0 +1,301 @@
+#diskova fronta zprav pro vypadky MQTT (store-and-forward)
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+MAGIC = b"ATSP"
+VERSION = 1
+# dve kopie indexu; data musi zacinat na hranici stranky, jinak mmap.flush() vraci EINVAL
+# (Raspberry Pi 5 ma 16K stranky). Soubor tak patri k velikosti stranky stroje, ktery ho zalozil.
+HEADER_SIZE = max(4096, mmap.ALLOCATIONGRANULARITY)
+SLOT = struct.Struct(">4sIQQQQ")  # magic, version, seq, head, tail, count
+SLOT_CRC = struct.Struct(">I")
+SLOT_SIZE = SLOT.size + SLOT_CRC.size
+RECORD = struct.Struct(">IIBH")  # length, crc32, flags, topic length
+WRAP = 0xFFFFFFFF
+FLAG_TEXT = 0x01
+
+
+class Spool:
+    """Append-only ring of (topic, payload) records in a memory-mapped file.
+
+    The file has a fixed size (``capacity`` bytes of data plus a one-page
+    header, at least 4 kB), so disk usage never grows; when the ring is full the oldest
+    records are overwritten. The write index lives in two header slots
+    written alternately with a sequence number and CRC, and every record
+    carries its own CRC: on open the newest valid slot is used and the
+    records are walked from head, so a torn write after a crash only loses
+    the records that were not completely on disk; damaged data is skipped
+    up to the next intact record. Before the oldest records are
+    overwritten, the moved head is committed and synced on its own.
+
+    ``sync_interval`` bounds how often the file is msync'ed (SD card wear vs.
+    how much a power cut can lose); ``sync()`` forces it. ``append``,
+    ``peek`` and ``pop`` hold ``lock``, so the spool can be filled and
+    drained from different threads.
+    """
+
+    def __init__(self, path, capacity=32 * 1024 * 1024, sync_interval=1.0):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.overwritten = 0
+        self.lock = threading.RLock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        size = HEADER_SIZE + capacity
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            existing = os.fstat(fd).st_size
+            if existing and existing != size:
+                # kapacita se zmenila - zachovat puvodni velikost souboru
+                size = existing
+            elif not existing:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.capacity = size - HEADER_SIZE
+        self.seq = 0
+        self.head = 0
+        self.tail = 0
+        self.count = 0
+        self._last_sync = 0.0
+        self._load()
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        with self.lock:
+            if self._map is not None:
+                self.sync()
+                self._map.close()
+                self._map = None
+
+    # --- index ---
+
+    def _load(self):
+        best = None
+        for offset in (0, SLOT_SIZE):
+            raw = self._map[offset:offset + SLOT.size]
+            (crc,) = SLOT_CRC.unpack_from(self._map, offset + SLOT.size)
+            magic, version, seq, head, tail, count = SLOT.unpack(raw)
+            if magic == MAGIC and version == VERSION and zlib.crc32(raw) == crc:
+                if best is None or seq > best[0]:
+                    best = (seq, head, tail, count)
+        if best is None:
+            self._commit()
+            return
+        self.seq, self.head, self.tail, self.count = best
+        self._recover()
+
+    def _recover(self):
+        """Walk the committed records, skipping damaged data instead of dropping everything after it."""
+        if not self.count:
+            return
+        if self.tail > self.head:
+            regions = [(self.head, self.tail)]
+        else:  # ziva data pretekaji pres konec souboru
+            regions = [(self.head, self.capacity), (0, self.tail)]
+        good, skipped, head, tail = 0, 0, None, 0
+        for position, end in regions:
+            while end - position >= RECORD.size:
+                (length,) = struct.unpack_from(">I", self._map, HEADER_SIZE + position)
+                if length == WRAP:
+                    break
+                record = self._read(position) if position + length <= end else None
+                if record is None:
+                    skipped += 1
+                    position = self._resync(position + 1, end)
+                    if position is None:
+                        break
+                    continue
+                if head is None:
+                    head = position
+                position += length
+                tail = position
+                good += 1
+        if good != self.count or skipped:
+            print(f"⚠️ Spool {self.path}: skipped {skipped} damaged areas, kept {good} of {self.count} records")
+            self.count = good
+            self.head, self.tail = (head, tail) if good else (0, 0)
+            self._commit()
+
+    def _resync(self, position, end):
+        """Start of the next intact record in [position, end), or None."""
+        for candidate in range(position, end - RECORD.size + 1):
+            (length,) = struct.unpack_from(">I", self._map, HEADER_SIZE + candidate)
+            if RECORD.size <= length <= end - candidate and self._read(candidate) is not None:
+                return candidate
+        return None
+
+    def _commit(self):
+        self.seq += 1
+        raw = SLOT.pack(MAGIC, VERSION, self.seq, self.head, self.tail, self.count)
+        offset = (self.seq % 2) * SLOT_SIZE
+        self._map[offset:offset + SLOT_SIZE] = raw + SLOT_CRC.pack(zlib.crc32(raw))
+        if time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        # data first, then the index that points to it
+        self._map.flush(HEADER_SIZE, self.capacity)
+        self._map.flush(0, HEADER_SIZE)
+        self._last_sync = time.monotonic()
+
+    # --- records ---
+
+    def _skip_wrap(self, position):
+        if self.capacity - position < RECORD.size:
+            return 0
+        (length,) = struct.unpack_from(">I", self._map, HEADER_SIZE + position)
+        return 0 if length == WRAP else position
+
+    def _read(self, position):
+        """(length, topic, payload) at position, or None when the record is damaged."""
+        start = HEADER_SIZE + position
+        length, crc, flags, topic_length = RECORD.unpack_from(self._map, start)
+        if length < RECORD.size + topic_length or position + length > self.capacity:
+            return None
+        body = self._map[start + 8:start + length]
+        if zlib.crc32(body) != crc:
+            return None
+        topic = body[3:3 + topic_length].decode("utf-8")
+        payload = body[3 + topic_length:]
+        if flags & FLAG_TEXT:
+            payload = payload.decode("utf-8")
+        return length, topic, payload
+
+    def _place(self, length):
+        """Offset where a record of ``length`` bytes fits without touching live data, or None."""
+        if self.count == 0:
+            return 0
+        if self.tail > self.head:
+            if self.capacity - self.tail >= length:
+                return self.tail
+            return 0 if self.head >= length else None
+        if self.tail < self.head and self.head - self.tail >= length:
+            return self.tail
+        return None
+
+    def append(self, topic, payload):
+        """Store one message; overwrites the oldest records when the ring is full."""
+        with self.lock:
+            flags = 0
+            if isinstance(payload, str):
+                payload = payload.encode("utf-8")
+                flags |= FLAG_TEXT
+            topic_bytes = topic.encode("utf-8")
+            body = struct.pack(">BH", flags, len(topic_bytes)) + topic_bytes + payload
+            length = 8 + len(body)
+            if length > self.capacity:
+                raise ValueError("message larger than the spool")
+
+            position = self._place(length)
+            if position is None:
+                while position is None:
+                    self._advance_head()
+                    self.overwritten += 1
+                    position = self._place(length)
+                # posunuty zacatek musi byt na disku driv, nez se prepisou nejstarsi zaznamy
+                self._commit()
+                self._map.flush(0, HEADER_SIZE)
+
+            if position == 0 and self.count and self.capacity - self.tail >= 4:
+                struct.pack_into(">I", self._map, HEADER_SIZE + self.tail, WRAP)
+            start = HEADER_SIZE + position
+            struct.pack_into(">II", self._map, start, length, zlib.crc32(body))
+            self._map[start + 8:start + length] = body
+            if self.count == 0:
+                self.head = position
+            self.tail = position + length
+            self.count += 1
+            self._commit()
+
+    def peek(self, limit=100):
+        """Up to ``limit`` oldest (topic, payload) records, without removing them."""
+        with self.lock:
+            records, position = [], self.head
+            for _ in range(min(limit, self.count)):
+                position = self._skip_wrap(position)
+                record = self._read(position)
+                if record is None:
+                    self._recover()  # poskozeny zaznam se preskoci, jinak by replay stal na miste
+                    return self.peek(limit)
+                length, topic, payload = record
+                records.append((topic, payload))
+                position += length
+            return records
+
+    def pop(self, n):
+        """Remove the ``n`` oldest records (after they were delivered)."""
+        with self.lock:
+            for _ in range(min(n, self.count)):
+                self._advance_head()
+            self._commit()
+
+    def _advance_head(self):
+        self.head = self._skip_wrap(self.head)
+        (length,) = struct.unpack_from(">I", self._map, HEADER_SIZE + self.head)
+        self.head += length
+        self.count -= 1
+        if self.count == 0:
+            self.head = self.tail = 0
+
+
+async def replay(spool, publisher, is_connected, batch_size=100, idle=2.0, ack_timeout=30.0):
+    """Drain the spool through an AsyncPublisher whenever the broker is reachable.
+
+    Records are published in pipelined batches and removed only once the
+    whole batch was acknowledged (at-least-once: a failed batch is retried).
+    """
+    while True:
+        if not len(spool) or not is_connected():
+            await asyncio.sleep(idle)
+            continue
+        with spool.lock:
+            overwritten = spool.overwritten
+            batch = spool.peek(batch_size)
+        acks = [await publisher.publish(topic, payload) for topic, payload in batch]
+        try:
+            await asyncio.wait_for(asyncio.gather(*acks), ack_timeout)
+        except Exception as e:
+            print(f"❌ Spool replay failed, will retry: {e}")
+            await asyncio.sleep(idle)
+            continue
+        # records overwritten meanwhile were the oldest ones, i.e. part of this batch
+        spool.pop(max(0, len(batch) - (spool.overwritten - overwritten)))
+        print(f"📤 Replayed {len(batch)} spooled messages, {len(spool)} left")
+
+
+def replay_blocking(spool, publisher, is_connected, stop, batch_size=100, idle=2.0, ack_timeout=30.0):
+    """Thread variant of ``replay`` over a MqttPublisher, for the synchronous send path.
+
+    Runs until the ``stop`` event is set.
+    """
+    while not stop.is_set():
+        if not len(spool) or not is_connected():
+            stop.wait(idle)
+            continue
+        with spool.lock:
+            overwritten = spool.overwritten
+            batch = spool.peek(batch_size)
+        try:
+            infos = [publisher.publish(topic, payload) for topic, payload in batch]
+            deadline = time.monotonic() + ack_timeout
+            for info in infos:
+                info.wait_for_publish(max(0.0, deadline - time.monotonic()))
+            if not all(info.is_published() for info in infos):
+                raise TimeoutError(f"no ack within {ack_timeout} s")
+        except Exception as e:
+            print(f"❌ Spool replay failed, will retry: {e}")
+            stop.wait(idle)
+            continue
+        spool.pop(max(0, len(batch) - (spool.overwritten - overwritten)))
+        print(f"📤 Replayed {len(batch)} spooled messages, {len(spool)} left")
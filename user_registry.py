@@ -0,0 +1,381 @@
+#registr uzivatelu a jejich zarizeni pro overovani (porovnani.verify_device) a temata overenaadresa_uzivatele
+import fcntl
+import mmap
+import os
+import struct
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from macaddr import normalize_mac
+
+REGISTRY_PATH = os.environ.get("ATTENTID_REGISTRY_PATH", os.path.join("production", "registry.bin"))
+REGISTRY_RELOAD = float(os.environ.get("ATTENTID_REGISTRY_RELOAD", "10"))  # s mezi kontrolami zmen na disku
+MAX_DEVICES_PER_USER = int(os.environ.get("ATTENTID_REGISTRY_DEVICES", "8"))  # telefony rotuji MAC
+REGISTRY_COMPACT_KB = int(os.environ.get("ATTENTID_REGISTRY_COMPACT_KB", "1024"))  # zurnal vetsi nez toto -> save()
+
+MAGIC = b"ATRG"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIId")  # magic, version, flags, users, bindings, saved at
+USER = struct.Struct("<64s")  # user ID, UTF-8, zero padded
+BINDING = struct.Struct("<6s2xId")  # MAC, user index, bound at
+
+
+def _mac_bytes(mac):
+    try:
+        raw = bytes.fromhex(mac.replace(":", ""))
+    except ValueError:
+        return None
+    return raw if len(raw) == 6 else None
+
+
+class UserRegistry:
+    """Registered users and the device addresses bound to them.
+
+    Two dicts index the registry in both directions: user ID -> devices
+    (an OrderedDict of MAC -> bound at, oldest first, at most
+    ``max_devices`` per user) and MAC -> user ID, so ``user_of`` and
+    ``devices_of`` are single lookups however many users there are. User
+    IDs are strings; the 32-bit IDs from advertisements are stored as their
+    decimal form.
+
+    On disk the registry is a snapshot at ``path`` (fixed-size records,
+    read through mmap) plus an append-only text journal at ``path + .log``
+    with the changes made since. ``reload()`` is incremental: it only
+    parses journal lines appended since the last call, and reads the
+    snapshot again only when the file was replaced. ``save()`` writes a
+    new snapshot atomically and truncates the journal; ``maybe_reload()``
+    calls it once the journal grew past ``compact_bytes``, as every newly
+    seen MAC of a user is journaled. Journal writes and ``save()`` hold an
+    flock on the journal, so processes sharing the registry (scanner,
+    receiver, GATT server) do not lose each other's entries. Addresses
+    that are not MACs (e.g. CoreBluetooth UUIDs) are kept in memory only.
+    """
+
+    def __init__(self, path=REGISTRY_PATH, max_devices=MAX_DEVICES_PER_USER, reload_interval=REGISTRY_RELOAD,
+                 compact_bytes=REGISTRY_COMPACT_KB << 10):
+        self.path = path
+        self.journal_path = path + ".log" if path else None
+        self.max_devices = max_devices
+        self.reload_interval = reload_interval
+        self.compact_bytes = compact_bytes
+        self.stats = {"loads": 0, "journal_entries": 0, "verified": 0, "rejected": 0, "compactions": 0}
+        self._users = {}  # user -> OrderedDict(mac -> bound at)
+        self._devices = {}  # mac -> user
+        self._snapshot_id = None
+        self._journal_id = None
+        self._journal_offset = 0
+        self._journal = None
+        self._next_check = 0.0
+        self._defaults = []
+
+    def __len__(self):
+        return len(self._users)
+
+    def __contains__(self, user):
+        return str(user) in self._users
+
+    def users(self):
+        return list(self._users)
+
+    def user_of(self, mac):
+        """The user the address is bound to, or None."""
+        return self._devices.get(normalize_mac(mac))
+
+    def devices_of(self, user):
+        return list(self._users.get(str(user), ()))
+
+    # zmeny (persist=False = jen v pameti, napr. pri nacitani)
+
+    def add_user(self, user, devices=(), persist=True):
+        user = str(user)
+        if len(user.encode()) > USER.size:
+            raise ValueError(f"user ID longer than {USER.size} bytes: {user!r}")
+        if user not in self._users:
+            self._users[user] = OrderedDict()
+            if persist:
+                self._append("U", user)
+        for mac in devices:
+            self.bind(mac, user, persist=persist)
+
+    def remove_user(self, user, persist=True):
+        user = str(user)
+        devices = self._users.pop(user, None)
+        if devices is None:
+            return False
+        for mac in devices:
+            self._devices.pop(mac, None)
+        if persist:
+            self._append("X", user)
+        return True
+
+    def bind(self, mac, user, now=None, persist=True):
+        """Bind an address to a registered user; False when the user is unknown.
+
+        Only new bindings go to the journal, refreshing an existing one just
+        moves it to the end of the user's devices.
+        """
+        user = str(user)
+        devices = self._users.get(user)
+        if devices is None:
+            return False
+        mac = normalize_mac(mac)
+        now = time.time() if now is None else now
+        previous = self._devices.get(mac)
+        if previous == user:
+            devices.move_to_end(mac)
+            devices[mac] = now
+            return True
+        if previous is not None:
+            self._users[previous].pop(mac, None)
+        devices[mac] = now
+        self._devices[mac] = user
+        while len(devices) > self.max_devices:
+            oldest, _ = devices.popitem(last=False)
+            self._devices.pop(oldest, None)
+        if persist:
+            self._append("B", mac, user, repr(now))
+        return True
+
+    def unbind(self, mac, persist=True):
+        mac = normalize_mac(mac)
+        user = self._devices.pop(mac, None)
+        if user is None:
+            return False
+        self._users[user].pop(mac, None)
+        if persist:
+            self._append("D", mac)
+        return True
+
+    def verify_device(self, address, user):
+        """True when ``user`` is registered; the address is then bound to it."""
+        if self.bind(address, user):
+            self.stats["verified"] += 1
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    def verify_user(self, user):
+        """True when ``user`` is registered; nothing is bound (for addresses that are not proven)."""
+        if user in self:
+            self.stats["verified"] += 1
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    # disk
+
+    def _open_journal(self):
+        if self._journal is None:
+            directory = os.path.dirname(self.journal_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._journal = open(self.journal_path, "ab")
+        return self._journal
+
+    @contextmanager
+    def _journal_lock(self):
+        journal = self._open_journal()
+        fcntl.flock(journal.fileno(), fcntl.LOCK_EX)
+        try:
+            yield journal
+        finally:
+            fcntl.flock(journal.fileno(), fcntl.LOCK_UN)
+
+    def _append(self, *fields):
+        if not self.journal_path:
+            return
+        with self._journal_lock() as journal:
+            journal.seek(0, os.SEEK_END)  # jiny proces mohl zurnal mezitim zkratit
+            start = journal.tell()
+            journal.write(("\t".join(fields) + "\n").encode())
+            journal.flush()
+            if start == self._journal_offset:
+                self._journal_offset = journal.tell()  # vlastni zapis uz je aplikovany
+
+    def _apply(self, line):
+        kind, *fields = line.decode().split("\t")
+        if kind == "U":
+            self.add_user(fields[0], persist=False)
+        elif kind == "X":
+            self.remove_user(fields[0], persist=False)
+        elif kind == "B":
+            self.bind(fields[0], fields[1], float(fields[2]), persist=False)
+        elif kind == "D":
+            self.unbind(fields[0], persist=False)
+        else:
+            raise ValueError(f"unknown journal entry {line!r}")
+
+    @staticmethod
+    def _file_id(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load_snapshot(self):
+        self._users.clear()
+        self._devices.clear()
+        self._snapshot_id = self._file_id(self.path)
+        if self._snapshot_id is None or not self._snapshot_id[2]:
+            return
+        with open(self.path, "rb") as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view, memoryview(view) as data:
+            magic, version, _, user_count, binding_count, _ = HEADER.unpack_from(data)
+            users_end = HEADER.size + user_count * USER.size
+            if magic != MAGIC or version != VERSION or len(data) != users_end + binding_count * BINDING.size:
+                raise ValueError(f"{self.path} is not a version {VERSION} registry snapshot")
+            names = [raw.rstrip(b"\0").decode() for (raw,) in USER.iter_unpack(data[HEADER.size:users_end])]
+            for name in names:
+                self._users[name] = OrderedDict()
+            users, devices = self._users, self._devices
+            for raw, index, bound_at in BINDING.iter_unpack(data[users_end:]):
+                mac, user = raw.hex(":").upper(), names[index]
+                users[user][mac] = bound_at  # ulozene v poradi od nejstarsiho
+                devices[mac] = user
+
+    def load(self):
+        """Read the snapshot and the whole journal."""
+        self._load_snapshot()
+        self._journal_id = None
+        self._journal_offset = 0
+        self._read_journal()
+        for user in self._defaults:
+            self._add_default(user)
+        self.stats["loads"] += 1
+        return self
+
+    def add_default_user(self, user):
+        """Register ``user`` in memory only, also after every full reload.
+
+        This is the single user the scan scripts used to read from
+        production/uuid.txt; when it is a MAC address, that address is bound
+        to it, as the scripts used to compare device MACs with it.
+        """
+        user = str(user)
+        if user not in self._defaults:
+            self._defaults.append(user)
+        self._add_default(user)
+
+    def _add_default(self, user):
+        if user not in self._users:
+            self.add_user(user, persist=False)
+            if _mac_bytes(normalize_mac(user)) is not None:
+                self.bind(user, user, persist=False)
+
+    def _read_journal(self):
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            self._journal_id = None
+            return
+        with open(self.journal_path, "rb") as file:
+            journal_id = os.fstat(file.fileno()).st_ino
+            if self._journal_id != journal_id or os.fstat(file.fileno()).st_size < self._journal_offset:
+                self._journal_id, self._journal_offset = journal_id, 0  # novy nebo zkraceny zurnal
+            file.seek(self._journal_offset)
+            chunk = file.read()
+        complete = chunk.rfind(b"\n") + 1  # posledni radek muze byt rozepsany
+        for line in chunk[:complete].splitlines():
+            if line:
+                self._apply(line)
+                self.stats["journal_entries"] += 1
+        self._journal_offset += complete
+
+    def reload(self):
+        """Apply what changed on disk since the last load/reload."""
+        if self._file_id(self.path) != self._snapshot_id:
+            return self.load()
+        self._read_journal()
+        return self
+
+    def maybe_reload(self, now=None):
+        """``reload()`` at most every ``reload_interval`` seconds; cheap enough for every lookup.
+
+        Compacts the journal into a new snapshot once it is larger than
+        ``compact_bytes``.
+        """
+        now = time.monotonic() if now is None else now
+        if now >= self._next_check and self.path:
+            self._next_check = now + self.reload_interval
+            self.reload()
+            if self.compact_bytes and self._journal_offset > self.compact_bytes:
+                self.save()
+                self.stats["compactions"] += 1
+
+    def save(self):
+        """Write a snapshot of the current state and start an empty journal.
+
+        Holds the journal lock and applies what other processes wrote first,
+        so nothing journaled before the truncation is lost.
+        """
+        if not self.journal_path:
+            self._write_snapshot()
+            return
+        with self._journal_lock() as journal:
+            self.reload()
+            self._write_snapshot()
+            journal.truncate(0)
+            self._journal_id = os.fstat(journal.fileno()).st_ino
+            self._journal_offset = 0
+
+    def _write_snapshot(self):
+        names = list(self._users)
+        index = {name: position for position, name in enumerate(names)}
+        bindings = [(raw, index[user], bound_at) for user, devices in self._users.items()
+                    for mac, bound_at in devices.items() if (raw := _mac_bytes(mac)) is not None]
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, 0, len(names), len(bindings), time.time()))
+            file.write(b"".join(USER.pack(name.encode()) for name in names))
+            file.write(b"".join(BINDING.pack(*binding) for binding in bindings))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+        self._snapshot_id = self._file_id(self.path)
+
+    def close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+_registry = None
+
+
+def get_registry(default_user=None):
+    """Shared UserRegistry loaded from REGISTRY_PATH (see ``add_default_user``)."""
+    global _registry
+    if _registry is None:
+        _registry = UserRegistry().load()
+        # plny reload() hned po load(): znovu nacte snapshot, pokud se mezitim zmenil, dohraje novy
+        # konec journalu, pripadne ho zkompaktuje, a nastavi cas pristi kontroly
+        _registry.maybe_reload()
+    if default_user:
+        _registry.add_default_user(default_user)
+    return _registry
+
+
+async def run_command(args):
+    """``attentid.py users``: list, add or remove registered users."""
+    registry = UserRegistry(args.registry).load()
+    try:
+        if args.command == "list":
+            for user in registry.users():
+                print(f"{user}  {' '.join(registry.devices_of(user)) or '-'}")
+            print(f"{len(registry)} users")
+        elif not args.user:
+            raise SystemExit(f"{args.command} needs a user ID")
+        elif args.command == "add":
+            registry.add_user(args.user, args.device)
+            print(f"User {args.user} registered, devices: {' '.join(registry.devices_of(args.user)) or '-'}")
+        elif args.command == "remove":
+            print(f"User {args.user} removed." if registry.remove_user(args.user)
+                  else f"User {args.user} is not registered.")
+        if args.compact:
+            registry.save()
+            print(f"Journal compacted into {registry.path}")
+    finally:
+        registry.close()
@@ -1,11 +1,15 @@
 import asyncio
-import re
-from bleak import BleakScanner
+import time
+from presence import get_presence_scanner
 # Removed circular import
 
+NEARBY_WITHIN = 30.0  # MAC je "v blizkosti", pokud byla videna za poslednich N sekund
+PRESENCE_WARMUP = 5.0  # po startu skeneru se jednou pocka, nez se index naplni
+
 async def get_nearby_mac_addresses():
     """Retrieve a list of nearby MAC addresses using BLE scanning."""
     try:
+        from bleak import BleakScanner  # heavy (D-Bus backend), only when really scanning
         devices = await BleakScanner.discover(timeout=5.0)
         macs = [device.address for device in devices]
         print(f"Nearby MAC addresses: {macs}")  # Debugging log
@@ -14,32 +18,71 @@ async def get_nearby_mac_addresses():
         print(f"Error during BLE scanning: {e}")
         return []
 
-def handle_incoming_message(message):
+def _message_macs(message):
+    """MAC addresses of a message: {"mac": "..."} or {"mac": [...]} / {"macs": [...]}."""
+    macs = message.get("macs") or message.get("mac")
+    if isinstance(macs, str):
+        return [macs]
+    return list(macs or [])
+
+def _unavailable(scanner):
+    if not scanner.failed:
+        return False
+    print(f"Presence scanner is not running ({scanner.error}), next attempt in {scanner.retry_in():.0f} s.")
+    return True
+
+def _report(mac_addresses, nearby):
+    for mac_address in mac_addresses:
+        if nearby[mac_address]:
+            print(f"MAC address {mac_address} is nearby.")
+        else:
+            print(f"MAC address {mac_address} is not nearby.")
+    return nearby
+
+def handle_incoming_message(message, within=NEARBY_WITHIN):
     """
-    Handle an incoming message by extracting the MAC address,
-    comparing it with nearby MAC addresses, and outputting the result.
+    Handle an incoming message by extracting the MAC address(es),
+    comparing them with the live presence index, and outputting the result.
+    Returns {mac: bool}, or None at once when the scanner has failed.
     """
     try:
         # Extract MAC address from the message
-        mac_address = message.get("mac")
-        if not mac_address:
+        mac_addresses = _message_macs(message)
+        if not mac_addresses:
             print("No MAC address found in the message.")
             return
 
-        # Retrieve nearby MAC addresses
-        nearby_macs = asyncio.run(get_nearby_mac_addresses())
+        # Presence index is kept fresh by a background scanner, lookups are O(1)
+        scanner = get_presence_scanner().start_background()
+        if _unavailable(scanner):
+            return
+        # warmup_remaining je 0, jakmile skener selze - pak se neceka zbytecne
+        while warmup := scanner.warmup_remaining(PRESENCE_WARMUP):
+            time.sleep(min(warmup, 0.1))
+        if _unavailable(scanner):
+            return
 
-        # Normalize MAC address formats
-        def normalize_mac(mac):
-            return re.sub(r'[^A-Fa-f0-9]', '', mac).upper()
+        return _report(mac_addresses, scanner.index.nearby_many(mac_addresses, within))
+    except Exception as e:
+        print(f"Error handling the message: {e}")
 
-        normalized_mac = normalize_mac(mac_address)
-        normalized_nearby_macs = [normalize_mac(mac) for mac in nearby_macs]
+async def async_handle_incoming_message(message, within=NEARBY_WITHIN):
+    """Async variant of handle_incoming_message; the scanner runs on the caller's loop."""
+    try:
+        mac_addresses = _message_macs(message)
+        if not mac_addresses:
+            print("No MAC address found in the message.")
+            return
 
-        # Compare the MAC address with the nearby list
-        if normalized_mac in normalized_nearby_macs:
-            print(f"MAC address {mac_address} is nearby.")
-        else:
-            print(f"MAC address {mac_address} is not nearby.")
+        scanner = get_presence_scanner().start_in_loop()
+        if _unavailable(scanner):
+            return
+        # warmup_remaining je 0, jakmile skener selze - pak se neceka zbytecne
+        while warmup := scanner.warmup_remaining(PRESENCE_WARMUP):
+            await asyncio.sleep(min(warmup, 0.1))
+        if _unavailable(scanner):
+            return
+
+        return _report(mac_addresses, scanner.index.nearby_many(mac_addresses, within))
     except Exception as e:
-        print(f"Error handling the message: {e}")
\ No newline at end of file
+        print(f"Error handling the message: {e}")
@@ -1,73 +1,37 @@
 import asyncio
-from bleak import BleakScanner
 # Předpokládáme, že mqttportabo.py je buď ve stejném adresáři, nebo v PYTHONPATH
-from mqttportabo import send_payload # Zkontrolujte umístění mqttportabo.py
+from ble_stream import AdvertisementStream, get_scanner_backend
+import profiling
+from pipeline import Uplink, run_streaming
+from scheduler import make_scheduler
+from sig_tables import get_device_type, get_manufacturer_info
+from user_registry import get_registry
+import sys
 import time
 import os
 from datetime import datetime
 import re # Přidán chybějící import re
 
-# Importy z adresáře 'production'
-# Aby to fungovalo, adresář 'production' by měl být buď v sys.path,
-# nebo by 'production' měl být balíček (obsahovat __init__.py)
-# a spouštět vypis.py z kořenového adresáře projektu.
-from production.prijimac import uuid_uzivatele # Používá se pro MQTT téma
-from production.porovnani import normalize_mac_address, check_if_device_is_nearby
-
-# Slovník známých UUID a jejich typů zařízení
-KNOWN_DEVICE_UUIDS = {
-    "0000180f-0000-1000-8000-00805f9b34fb": "Battery Service",
-    "0000180a-0000-1000-8000-00805f9b34fb": "Device Information",
-    "0000fe9f-0000-1000-8000-00805f9b34fb": "Google Fast Pair",
-    "0000fd6f-0000-1000-8000-00805f9b34fb": "Windows Device",
-    "9fa480e0-4967-4542-9390-d343dc5d04ae": "Apple Device"
-}
-def is_working_hours():
-    current_hour = datetime.now().hour
-    return 7 <= current_hour < 19
-
-# Removed get_device_type function as it relied on UUIDs
-
-def get_manufacturer_info(manufacturer_data):
-    """Zjistí výrobce a typ zařízení z manufacturer_data"""
-    manufacturer_info = []
-    manufacturer_mapping = {
-        76: "Apple",  # Company Identifier Code 0x004C
-        6: "Microsoft",  # Company Identifier Code 0x0006
-        117: "Samsung",  # Company Identifier Code 0x0075
-        224: "Google",  # Company Identifier Code 0x00E0
-        89: "Sony",  # Company Identifier Code 0x0059
-        15: "Intel",  # Company Identifier Code 0x000F
-        2: "IBM",  # Company Identifier Code 0x0002
-        48: "Nokia",  # Company Identifier Code 0x0030
-        85: "Qualcomm",  # Company Identifier Code 0x0055
-        72: "Broadcom",  # Company Identifier Code 0x0048
-        112: "Huawei",  # Company Identifier Code 0x0070
-        208: "Xiaomi",  # Company Identifier Code 0x00D0
-        240: "Oppo",  # Company Identifier Code 0x00F0
-        200: "Vivo",  # Company Identifier Code 0x00C8
-    }
-    for key, value in manufacturer_data.items():
-        manufacturer_info.append(manufacturer_mapping.get(key, f"Unknown Manufacturer (ID: {key})"))
-    return manufacturer_info
-
-# Načtení UUID Raspberry Pi
-folder_path = os.path.join(os.getcwd(), "production", "raspberry_uuid") # Upravená cesta
-file_path = os.path.join(folder_path, "uuid.txt")
-raspberry_uuid = "unknown_raspberry_uuid" # Defaultní hodnota
-if os.path.exists(file_path):
-    with open(file_path, "r") as file:
-        raspberry_uuid = file.read().strip()
-else:
+from macaddr import normalize_mac as normalize_mac_address
+
+# UUID se ctou az pri spusteni, ne pri importu (rychly start, import z attentid.py)
+def get_raspberry_uuid():
+    """Načtení UUID Raspberry Pi."""
+    file_path = os.path.join(os.getcwd(), "production", "raspberry_uuid", "uuid.txt")
+    if os.path.exists(file_path):
+        with open(file_path, "r") as file:
+            return file.read().strip()
     print(f"Soubor s UUID Raspberry Pi nebyl nalezen: {file_path}")
+    return "unknown_raspberry_uuid" # Defaultní hodnota
 
+def get_uuid_uzivatele():
+    """UUID uživatele pro MQTT téma (dříve nefunkční import z production.prijimac)."""
+    file_path = os.path.join(os.getcwd(), "production", "uuid.txt")
+    if os.path.exists(file_path):
+        with open(file_path, "r") as file:
+            return file.read().strip()
+    return "unknown_uuid_uzivatele"
 
-def get_device_type(uuids):
-    device_types = []
-    for uuid_str in uuids: # Přejmenováno pro srozumitelnost
-        if uuid_str.lower() in KNOWN_DEVICE_UUIDS:
-            device_types.append(KNOWN_DEVICE_UUIDS[uuid_str.lower()])
-    return device_types if device_types else ["Unknown Device"]
 
 def format_device_data(device):
     uuids = device.metadata.get("uuids", [])
@@ -82,72 +46,95 @@ def format_device_data(device):
         "uuids": uuids,
         "device_types": get_device_type(uuids),
         "manufacturer_data": processed_manufacturer_data,
-        "manufacturer_info": get_manufacturer_info(processed_manufacturer_data) # Použijte zpracovaná data
+        "manufacturer_info": get_manufacturer_info(raw_manufacturer_data) # klice musi byt int (company ID)
     }
 
+def make_topic_selector(raspberry_uuid, registry):
+    def select_topic(device_address):
+        # Použití funkce z porovnani.py pro kontrolu, zda je zařízení "ověřené" (tj. v blízkosti)
+        # Tato logika je oddělená od GATT ověření.
+        # Zde "overenaadresa" znamená, že MAC adresa zařízení byla nalezena v seznamu aktuálně skenovaných zařízení.
+        # To není úplně "ověření" ve smyslu identity, spíše potvrzení přítomnosti.
+        # Funkce check_if_device_is_nearby nyní vrací boolean.
+
+        # Normalizujeme MAC adresu zařízení pro konzistentní formát v MQTT tématu
+        normalized_device_mac_for_topic = normalize_mac_address(device_address)
+
+        # Logika pro určení, zda je adresa "ověřená" (tj. nalezena mezi ostatními skenovanými)
+        # Tato část byla ve vašem kódu trochu nejasná, `handle_incoming_message` se zdálo být pro toto.
+        # Nyní používáme `check_if_device_is_nearby`.
+        # `uuid_uzivatele` je zde použito pro identifikaci "uživatele" v MQTT tématu.
+
+        # Původní logika byla: if normalized_mac in normalized_nearby_macs:
+        # což je přesně to, co dělá check_if_device_is_nearby(device.address, all_discovered_macs)
+
+        # Uživatel, ke kterému je zařízení přiřazené (user_registry, plní ho porovnani.verify_device)
+        registry.maybe_reload()
+        uuid_uzivatele = registry.user_of(device_address)
+        if uuid_uzivatele is not None:
+            topic = f"ble_devices/{raspberry_uuid}/{normalized_device_mac_for_topic}/overenaadresa_uzivatele/{uuid_uzivatele}"
+            print(f"✅ Zařízení {device_address} patří uživateli {uuid_uzivatele}. Odesílám na MQTT (uživatel): {topic}")
+        # Obecné odeslání pro všechna zařízení
+        else:
+            topic = f"ble_devices/{raspberry_uuid}/{normalized_device_mac_for_topic}"
+            print(f"✅ Odesílám zařízení {device_address} na MQTT: {topic}")
+        return topic
+    return select_topic
+
+def make_uplink():
+    raspberry_uuid = get_raspberry_uuid()
+    uuid_uzivatele = get_uuid_uzivatele()
+    print(f"🆔 UUID Raspberry Pi: {raspberry_uuid}")
+    registry = get_registry(uuid_uzivatele)
+    print(f"👤 UUID Uživatele (pro MQTT a GATT): {uuid_uzivatele}, registrovaných uživatelů: {len(registry)}")
+    # V dávkovém režimu (ATTENTID_BATCH_SIZE > 0) jde celý cyklus jednou zprávou na téma uzlu
+    return Uplink(format_device_data, make_topic_selector(raspberry_uuid, registry),
+                  node_topic=f"ble_devices/{raspberry_uuid}/batch",
+                  health_topic=f"ble_devices/{raspberry_uuid}/health",
+                  occupancy_topic=f"ble_devices/{raspberry_uuid}/occupancy")
+
+async def stream_and_send():
+    """Průběžné skenování - každé zachycené zařízení se odešle hned."""
+    await run_streaming(make_uplink(), AdvertisementStream())
+
 async def scan_and_send():
+    uplink = make_uplink()
+    uplink.start_metrics()
+    profiling.install()
+    scheduler = make_scheduler("07:00-19:00")
     while True:
-        if not is_working_hours():
-            print("⏰ Mimo pracovní dobu (7:00-19:00), čekám...")
-            await asyncio.sleep(60)
-            continue
+        await scheduler.wait_active()
 
         try:
             print("🔍 Spouštím BLE skenování...")
             # Zvýšení timeoutu může pomoci najít více zařízení, ale prodlouží skenování
-            devices = await BleakScanner.discover(timeout=10.0) 
+            devices = await scheduler.scan(get_scanner_backend().discover) 
 
             if not devices:
                 print("❌ Nenalezena žádná BLE zařízení.")
-                await asyncio.sleep(30)
+                await scheduler.rest()
                 continue
 
             print(f"✅ Nalezeno {len(devices)} zařízení")
             
             all_discovered_macs = [d.address for d in devices]
 
-            for device in devices:
-                device_data = format_device_data(device)
-                payload = {
-                    "data": device_data,
-                    "timestamp": datetime.now().isoformat() # Přidání časového razítka
-                }
-                
-                device_types = device_data["device_types"]
-                print(f"📱 Zařízení {device.address} (RSSI: {device.rssi}) typu: {', '.join(device_types)}")
-
-                # Použití funkce z porovnani.py pro kontrolu, zda je zařízení "ověřené" (tj. v blízkosti)
-                # Tato logika je oddělená od GATT ověření.
-                # Zde "overenaadresa" znamená, že MAC adresa zařízení byla nalezena v seznamu aktuálně skenovaných zařízení.
-                # To není úplně "ověření" ve smyslu identity, spíše potvrzení přítomnosti.
-                # Funkce check_if_device_is_nearby nyní vrací boolean.
-                
-                # Normalizujeme MAC adresu zařízení pro konzistentní formát v MQTT tématu
-                normalized_device_mac_for_topic = normalize_mac_address(device.address)
-
-                # Logika pro určení, zda je adresa "ověřená" (tj. nalezena mezi ostatními skenovanými)
-                # Tato část byla ve vašem kódu trochu nejasná, `handle_incoming_message` se zdálo být pro toto.
-                # Nyní používáme `check_if_device_is_nearby`.
-                # `uuid_uzivatele` je zde použito pro identifikaci "uživatele" v MQTT tématu.
-                
-                # Původní logika byla: if normalized_mac in normalized_nearby_macs:
-                # což je přesně to, co dělá check_if_device_is_nearby(device.address, all_discovered_macs)
-                
-                # Pro jednoduchost, pokud chcete označit zařízení, jehož MAC odpovídá uuid_uzivatele:
-                if normalize_mac_address(device.address) == normalize_mac_address(uuid_uzivatele):
-                    topic = f"ble_devices/{raspberry_uuid}/{normalized_device_mac_for_topic}/overenaadresa_uzivatele/{uuid_uzivatele}"
-                    print(f"✅ Zařízení {device.address} odpovídá uuid_uzivatele. Odesílám na MQTT (uživatel): {topic}")
-                # Obecné odeslání pro všechna zařízení
-                else:
-                    topic = f"ble_devices/{raspberry_uuid}/{normalized_device_mac_for_topic}"
-                    print(f"✅ Odesílám zařízení {device.address} na MQTT: {topic}")
+            uplink.observe(devices)
 
+            for device in devices:
                 try:
-                    send_payload(topic, payload)
+                    device_data = await uplink.submit(device)
                 except Exception as e:
                     print(f"❌ Chyba při odesílání dat na MQTT pro {device.address}: {e}")
+                    continue
+                device_types = device_data["device_types"]
+                print(f"📱 Zařízení {device.address} (RSSI: {device.rssi}) typu: {', '.join(device_types)}")
+
+            await uplink.flush()
+            if uplink.cache is not None:
+                print(f"🔕 Dosud potlačeno nezměněných zařízení: {uplink.cache.stats['suppressed']}")
 
-            await asyncio.sleep(30)
+            await scheduler.rest()
 
         except Exception as e:
             print(f"❌ Chyba při skenování nebo zpracování: {e}", exc_info=True)
@@ -155,7 +142,8 @@ async def scan_and_send():
 
 if __name__ == "__main__":
     print("🚀 Spouštím BLE monitoring...")
-    print(f"🆔 UUID Raspberry Pi: {raspberry_uuid}")
-    print(f"👤 UUID Uživatele (pro MQTT a GATT): {uuid_uzivatele}")
     print("⏰ Pracovní doba: 7:00 - 19:00")
-    asyncio.run(scan_and_send())
\ No newline at end of file
+    if "--stream" in sys.argv:
+        asyncio.run(stream_and_send())
+    else:
+        asyncio.run(scan_and_send())
\ No newline at end of file
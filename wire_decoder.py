@@ -0,0 +1,207 @@
+#dekoder kompaktniho binarniho formatu zaznamu (strana konzumenta, bez zavislosti)
+"""Decoder for the compact binary device-record format (version 2).
+
+Message layout (big endian)::
+
+    "AT" | u8 version | u8 flags (1 = batch) | u64 base timestamp [us since 1970-01-01, wall clock]
+    u16 string count, strings: u8 length + utf-8
+    u8 uuid count, uuids: u8 kind (0 = 16-bit SIG, 1 = 128-bit, 2 = string index) + u16 | 16 bytes | u16
+    u16 record count, records:
+        u8 flags (RECORD_* bits)
+        mac: 6 bytes | u16 string index (RECORD_MAC_TEXT)
+        i8 rssi (-128 = None) | u16 name index | i32 timestamp offset [us]
+        u8 n + n * u8 uuid index
+        u8 n + n * u16 device type string index
+        u8 n + n * (u16 company id, u8 length, bytes)
+        u8 n + n * u16 manufacturer info string index
+        topic (RECORD_TOPIC): u16 prefix index, u16 suffix index (RECORD_TOPIC_SPLIT,
+            topic = prefix + mac + suffix) | u16 topic index
+        extras (RECORD_EXTRAS): u8 n + n * (u16 key index, u8 type, value)
+            type 0 = None, 1 = i32, 2 = f32, 3 = u16 string index, 4 = f64
+
+Timestamps are the naive ISO strings of the payload, so the base is
+their wall-clock time and decodes to the same string in any time zone.
+Version 1 stored the base as the producer's local epoch and the offsets
+in ms; it is still read.
+
+Anything that does not start with MAGIC is the JSON fallback.
+"""
+import json
+import struct
+import uuid
+from datetime import datetime, timedelta
+
+MAGIC = b"AT"
+VERSION = 2
+VERSIONS = (1, 2)
+
+MESSAGE_BATCH = 0x01
+
+RECORD_MAC_TEXT = 0x01
+RECORD_TOPIC = 0x02
+RECORD_TOPIC_SPLIT = 0x04
+RECORD_EXTRAS = 0x08
+
+UUID_SHORT, UUID_FULL, UUID_TEXT = 0, 1, 2
+EXTRA_NONE, EXTRA_INT, EXTRA_FLOAT, EXTRA_STR, EXTRA_DOUBLE = 0, 1, 2, 3, 4
+
+BASE_UUID_SUFFIX = "-0000-1000-8000-00805f9b34fb"
+RSSI_NONE = -128
+EPOCH = datetime(1970, 1, 1)
+
+HEADER = struct.Struct(">2sBBQ")
+RECORD_HEAD = struct.Struct(">bHi")
+U8 = struct.Struct(">B")
+U16 = struct.Struct(">H")
+COMPANY = struct.Struct(">HB")
+EXTRA_KEY = struct.Struct(">HB")
+I32 = struct.Struct(">i")
+F32 = struct.Struct(">f")
+F64 = struct.Struct(">d")
+
+
+def is_binary(data):
+    return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:2]) == MAGIC
+
+
+def _timestamp(micros, version=VERSION):
+    if version == 1:
+        return datetime.fromtimestamp(micros / 1e6).isoformat()
+    return (EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+def decode_payload(data):
+    """Decode an MQTT payload produced by wire_format.encode_payload."""
+    if not is_binary(data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data).decode("utf-8")
+        return json.loads(data)
+    return decode_message(data)
+
+
+def decode_message(data):
+    view = memoryview(data)
+    magic, version, flags, base = HEADER.unpack_from(view, 0)
+    if magic != MAGIC or version not in VERSIONS:
+        raise ValueError(f"unsupported wire format version {version}")
+    offset = HEADER.size
+
+    (count,) = U16.unpack_from(view, offset)
+    offset += 2
+    strings = []
+    for _ in range(count):
+        length = view[offset]
+        strings.append(str(view[offset + 1:offset + 1 + length], "utf-8"))
+        offset += 1 + length
+
+    count = view[offset]
+    offset += 1
+    uuids = []
+    for _ in range(count):
+        kind = view[offset]
+        offset += 1
+        if kind == UUID_SHORT:
+            uuids.append(f"0000{U16.unpack_from(view, offset)[0]:04x}{BASE_UUID_SUFFIX}")
+            offset += 2
+        elif kind == UUID_FULL:
+            uuids.append(str(uuid.UUID(bytes=bytes(view[offset:offset + 16]))))
+            offset += 16
+        else:
+            uuids.append(strings[U16.unpack_from(view, offset)[0]])
+            offset += 2
+
+    (count,) = U16.unpack_from(view, offset)
+    offset += 2
+    scale = 1000 if version == 1 else 1
+    records = []
+    for _ in range(count):
+        record, topic, delta, offset = _decode_record(view, offset, strings, uuids)
+        timestamp = _timestamp(base + delta * scale, version)
+        if flags & MESSAGE_BATCH:
+            records.append({"topic": topic, "data": record, "timestamp": timestamp})
+        else:
+            records.append({"data": record, "timestamp": timestamp})
+
+    if flags & MESSAGE_BATCH:
+        return {"timestamp": _timestamp(base, version), "records": records}
+    return records[0]
+
+
+def _decode_record(view, offset, strings, uuids):
+    flags = view[offset]
+    offset += 1
+    if flags & RECORD_MAC_TEXT:
+        mac = strings[U16.unpack_from(view, offset)[0]]
+        offset += 2
+    else:
+        mac = ":".join(f"{b:02X}" for b in view[offset:offset + 6])
+        offset += 6
+    rssi, name, delta = RECORD_HEAD.unpack_from(view, offset)
+    offset += RECORD_HEAD.size
+
+    n = view[offset]
+    record_uuids = [uuids[i] for i in view[offset + 1:offset + 1 + n]]
+    offset += 1 + n
+
+    n = view[offset]
+    offset += 1
+    device_types = [strings[i] for i in struct.unpack_from(f">{n}H", view, offset)]
+    offset += 2 * n
+
+    n = view[offset]
+    offset += 1
+    manufacturer_data = {}
+    for _ in range(n):
+        company, length = COMPANY.unpack_from(view, offset)
+        offset += COMPANY.size
+        manufacturer_data[str(company)] = view[offset:offset + length].hex()
+        offset += length
+
+    n = view[offset]
+    offset += 1
+    manufacturer_info = [strings[i] for i in struct.unpack_from(f">{n}H", view, offset)]
+    offset += 2 * n
+
+    record = {
+        "name": strings[name],
+        "mac": mac,
+        "rssi": None if rssi == RSSI_NONE else rssi,
+        "uuids": record_uuids,
+        "device_types": device_types,
+        "manufacturer_data": manufacturer_data,
+        "manufacturer_info": manufacturer_info,
+    }
+
+    topic = None
+    if flags & RECORD_TOPIC:
+        if flags & RECORD_TOPIC_SPLIT:
+            prefix, suffix = struct.unpack_from(">HH", view, offset)
+            topic = strings[prefix] + mac + strings[suffix]
+            offset += 4
+        else:
+            topic = strings[U16.unpack_from(view, offset)[0]]
+            offset += 2
+
+    if flags & RECORD_EXTRAS:
+        n = view[offset]
+        offset += 1
+        for _ in range(n):
+            key, kind = EXTRA_KEY.unpack_from(view, offset)
+            offset += EXTRA_KEY.size
+            if kind == EXTRA_INT:
+                value = I32.unpack_from(view, offset)[0]
+                offset += 4
+            elif kind == EXTRA_FLOAT:
+                value = F32.unpack_from(view, offset)[0]
+                offset += 4
+            elif kind == EXTRA_DOUBLE:
+                value = F64.unpack_from(view, offset)[0]
+                offset += 8
+            elif kind == EXTRA_STR:
+                value = strings[U16.unpack_from(view, offset)[0]]
+                offset += 2
+            else:
+                value = None
+            record[strings[key]] = value
+
+    return record, topic, delta, offset
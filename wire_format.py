@@ -0,0 +1,205 @@
+#serializace zprav pro MQTT: repr (puvodni), json, nebo kompaktni binarni format
+import json
+import re
+import struct
+import uuid
+from datetime import datetime, timedelta
+
+from wire_decoder import (
+    BASE_UUID_SUFFIX, COMPANY, EPOCH, EXTRA_DOUBLE, EXTRA_FLOAT, EXTRA_INT, EXTRA_KEY, EXTRA_NONE, EXTRA_STR,
+    F32, F64, HEADER, I32, MAGIC, MESSAGE_BATCH, RECORD_EXTRAS, RECORD_HEAD, RECORD_MAC_TEXT,
+    RECORD_TOPIC, RECORD_TOPIC_SPLIT, RSSI_NONE, U8, U16, UUID_FULL, UUID_SHORT, UUID_TEXT, VERSION,
+)
+
+FORMATS = ("repr", "json", "binary")
+
+RECORD_KEYS = ("name", "mac", "rssi", "uuids", "device_types", "manufacturer_data", "manufacturer_info")
+_RECORD_KEY_SET = frozenset(RECORD_KEYS)
+_CANONICAL_MAC = re.compile(r"^[0-9A-F]{2}(:[0-9A-F]{2}){5}$")
+
+
+class UnsupportedPayload(ValueError):
+    """The payload does not have the device-record shape the binary format covers."""
+
+
+def encode_payload(payload, fmt="repr"):
+    """Serialize an MQTT payload.
+
+    ``repr`` is the historical ``str(payload)``, ``json`` is plain JSON and
+    ``binary`` the compact format from wire_decoder; payloads the binary
+    format cannot represent exactly (an RSSI outside -127..127, a timestamp
+    with a time zone, ...) fall back to JSON, which wire_decoder also reads.
+    """
+    if fmt == "binary":
+        try:
+            return encode_message(payload)
+        except UnsupportedPayload:
+            fmt = "json"
+    if fmt == "json":
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+    return str(payload)
+
+
+def _micros(iso_timestamp):
+    value = datetime.fromisoformat(iso_timestamp)
+    if value.tzinfo is not None:
+        raise UnsupportedPayload("timestamp with a time zone")
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _rssi(value):
+    if value is None:
+        return RSSI_NONE
+    if isinstance(value, bool) or int(value) != value or not -127 <= value <= 127:
+        raise UnsupportedPayload(f"rssi {value!r} does not fit in int8")
+    return int(value)
+
+
+class _Interner:
+    def __init__(self):
+        self.items = []
+        self.index = {}
+
+    def __call__(self, item):
+        position = self.index.get(item)
+        if position is None:
+            position = self.index[item] = len(self.items)
+            self.items.append(item)
+        return position
+
+
+def encode_message(payload):
+    """Encode ``{"data", "timestamp"}`` or a batch ``{"timestamp", "records"}`` payload."""
+    if not isinstance(payload, dict):
+        raise UnsupportedPayload("payload is not a dict")
+    try:
+        if "records" in payload and payload.keys() == {"timestamp", "records"}:
+            flags = MESSAGE_BATCH
+            base = _micros(payload["timestamp"])
+            entries = payload["records"]
+            if any(entry.keys() != {"topic", "data", "timestamp"} for entry in entries):
+                raise UnsupportedPayload("unexpected batch entry keys")
+        elif payload.keys() == {"data", "timestamp"}:
+            flags = 0
+            base = _micros(payload["timestamp"])
+            entries = [payload]
+        else:
+            raise UnsupportedPayload("unexpected payload keys")
+        return _encode(flags, base, entries)
+    except (AttributeError, KeyError, TypeError, ValueError, struct.error) as e:
+        if isinstance(e, UnsupportedPayload):
+            raise
+        raise UnsupportedPayload(str(e)) from e
+
+
+def _encode(flags, base, entries):
+    strings = _Interner()
+    uuids = _Interner()
+    uuid_entries = []
+    body = bytearray(U16.pack(len(entries)))
+
+    for entry in entries:
+        record = entry["data"]
+        if not _RECORD_KEY_SET <= record.keys():
+            raise UnsupportedPayload("record is missing fields")
+        record_flags = 0
+        mac = record["mac"]
+        if _CANONICAL_MAC.match(mac):
+            mac_bytes = bytes.fromhex(mac.replace(":", ""))
+        else:
+            record_flags |= RECORD_MAC_TEXT
+            mac_bytes = U16.pack(strings(mac))
+
+        topic_bytes = b""
+        topic = entry.get("topic")
+        if topic is not None:
+            record_flags |= RECORD_TOPIC
+            prefix, found, suffix = topic.partition(mac)
+            if found and not record_flags & RECORD_MAC_TEXT:
+                record_flags |= RECORD_TOPIC_SPLIT
+                topic_bytes = struct.pack(">HH", strings(prefix), strings(suffix))
+            else:
+                topic_bytes = U16.pack(strings(topic))
+
+        extras = [key for key in record if key not in _RECORD_KEY_SET]
+        extra_bytes = b""
+        if extras:
+            record_flags |= RECORD_EXTRAS
+            extra_bytes = bytearray(U8.pack(len(extras)))
+            for key in extras:
+                extra_bytes += _encode_extra(strings(key), record[key], strings)
+
+        body += U8.pack(record_flags)
+        body += mac_bytes
+        body += RECORD_HEAD.pack(_rssi(record["rssi"]), strings(record["name"]),
+                                 _micros(entry["timestamp"]) - base)
+
+        record_uuids = []
+        for value in record["uuids"]:
+            if value not in uuids.index:
+                uuid_entries.append(_encode_uuid(value, strings))
+            record_uuids.append(uuids(value))
+        body += U8.pack(len(record_uuids)) + bytes(record_uuids)
+
+        types = [strings(t) for t in record["device_types"]]
+        body += U8.pack(len(types)) + struct.pack(f">{len(types)}H", *types)
+
+        manufacturer_data = record["manufacturer_data"]
+        body += U8.pack(len(manufacturer_data))
+        for company, value in manufacturer_data.items():
+            raw = bytes.fromhex(value) if isinstance(value, str) else bytes(value)
+            body += COMPANY.pack(int(company), len(raw)) + raw
+
+        info = [strings(i) for i in record["manufacturer_info"]]
+        body += U8.pack(len(info)) + struct.pack(f">{len(info)}H", *info)
+
+        body += topic_bytes
+        body += extra_bytes
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, flags, base))
+    out += U16.pack(len(strings.items))
+    for item in strings.items:
+        if not isinstance(item, str):
+            raise UnsupportedPayload("string field is not a str")
+        encoded = item.encode("utf-8")
+        out += U8.pack(len(encoded)) + encoded
+    out += U8.pack(len(uuid_entries))
+    out += b"".join(uuid_entries)
+    out += body
+    return bytes(out)
+
+
+def _encode_uuid(value, strings):
+    lowered = value.lower()
+    if lowered == value and len(value) == 36:
+        if value.startswith("0000") and value.endswith(BASE_UUID_SUFFIX):
+            return U8.pack(UUID_SHORT) + U16.pack(int(value[4:8], 16))
+        try:
+            parsed = uuid.UUID(value)
+        except ValueError:
+            parsed = None
+        if parsed is not None and str(parsed) == value:
+            return U8.pack(UUID_FULL) + parsed.bytes
+    return U8.pack(UUID_TEXT) + U16.pack(strings(value))
+
+
+def _encode_extra(key_index, value, strings):
+    if value is None:
+        return EXTRA_KEY.pack(key_index, EXTRA_NONE)
+    if isinstance(value, bool):
+        raise UnsupportedPayload("bool extra field")
+    if isinstance(value, int) and -2**31 <= value < 2**31:
+        return EXTRA_KEY.pack(key_index, EXTRA_INT) + I32.pack(value)
+    if isinstance(value, float):
+        # f32 jen kdyz hodnotu presne zachova (2.71 ne), jinak f64
+        try:
+            packed = F32.pack(value)
+        except OverflowError:
+            packed = None
+        if packed is not None and F32.unpack(packed)[0] == value:
+            return EXTRA_KEY.pack(key_index, EXTRA_FLOAT) + packed
+        return EXTRA_KEY.pack(key_index, EXTRA_DOUBLE) + F64.pack(value)
+    if isinstance(value, str):
+        return EXTRA_KEY.pack(key_index, EXTRA_STR) + U16.pack(strings(value))
+    raise UnsupportedPayload(f"unsupported extra field type {type(value).__name__}")
+
@@ -0,0 +1,90 @@
+#omezeny pool workeru se slucovanim duplicitnich uloh (napr. overeni uzivatele)
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class CoalescingWorkerPool:
+    """Runs ``await handler(*key)`` on a fixed number of worker tasks.
+
+    ``submit(*key)`` is synchronous and cheap, so it can be called straight
+    from a BLE detection callback. A key that is already queued, or that was
+    accepted less than ``window`` seconds ago, is merged into the earlier
+    job instead of creating a new one. At most ``max_queue`` jobs wait; when
+    the queue is full ``on_full`` decides between dropping the new job
+    (``"drop_new"``) and evicting the oldest waiting one (``"drop_oldest"``).
+    Concurrency, queue memory and the recent-key table all stay bounded, no
+    matter how fast advertisements arrive.
+    """
+
+    def __init__(self, handler, workers=4, max_queue=1000, window=0.5, on_full="drop_new"):
+        if on_full not in ("drop_new", "drop_oldest"):
+            raise ValueError(f"unknown on_full policy {on_full!r}")
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.window = window
+        self.on_full = on_full
+        self.stats = {"submitted": 0, "coalesced": 0, "dropped": 0, "processed": 0, "failed": 0}
+        self._pending = OrderedDict()
+        self._recent = {}
+        self._prune_at = 4 * max_queue
+        self._available = None
+        self._tasks = []
+
+    def start(self):
+        self._available = asyncio.Semaphore(0)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def __aenter__(self):
+        return self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def qsize(self):
+        return len(self._pending)
+
+    def submit(self, *key):
+        """Queue ``handler(*key)``; returns False if it was merged or dropped."""
+        self.stats["submitted"] += 1
+        now = time.monotonic()
+        if key in self._pending or now - self._recent.get(key, -self.window) < self.window:
+            self.stats["coalesced"] += 1
+            return False
+
+        if len(self._pending) >= self.max_queue:
+            self.stats["dropped"] += 1
+            if self.on_full == "drop_new":
+                return False
+            evicted, _ = self._pending.popitem(last=False)
+            self._recent.pop(evicted, None)  # may be retried right away
+            self._pending[key] = now
+        else:
+            self._pending[key] = now
+            self._available.release()
+
+        self._recent[key] = now
+        if len(self._recent) > self._prune_at:
+            horizon = now - self.window
+            self._recent = {k: t for k, t in self._recent.items() if t >= horizon}
+            self._prune_at = max(4 * self.max_queue, 2 * len(self._recent))
+        return True
+
+    async def _worker(self):
+        while True:
+            await self._available.acquire()
+            key, _ = self._pending.popitem(last=False)
+            try:
+                await self.handler(*key)
+                self.stats["processed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"Error processing message: {e}")